@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+asyncio interface to the SAMD21 + MAX485 bridge.
+
+Wraps the serial port so one event loop can stream commands, capture
+telemetry and log at the same time, without fixed sleeps:
+
+    async with AsyncRS485Interface('/dev/cu.usbmodem1101') as iface:
+        await iface.send(frame)
+        reply = await iface.request(frame, expect=0xA0D0, timeout=0.2)
+        async for telem in iface.frames(cmd=0xA0D0):
+            ...
+
+Reads happen on busreader.BusReader's thread and are handed to the loop
+with call_soon_threadsafe(). Writes go through a single worker thread,
+so they keep their order and never block the loop.
+"""
+
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import serial
+
+import crc16 as crc
+import hostlink
+from busreader import BusReader
+from frame import DJIFrame
+from interface import RS485Interface
+
+QUEUE_SIZE = 1000  # Per frames() iterator; the oldest frame is dropped when full
+RESET_WAIT = 2.0   # Seconds for the board to reset after the port opens
+
+_CLOSED = object()  # Queued to frames()/texts() iterators when the interface goes away
+
+
+def same_sequence(request: DJIFrame, response: DJIFrame) -> bool:
+    """Default request/response match: the response echoes the request sequence"""
+    return response.sequence == request.sequence
+
+
+class AsyncRS485Interface:
+    """Awaitable send / receive / request over the USB link"""
+
+    def __init__(self, port: Optional[str] = None, baudrate: int = 115200,
+                 link: str = hostlink.ASCII, validate: Optional[str] = None):
+        self.port = port
+        self.baudrate = baudrate
+        self.link = link
+        self.validate = validate
+        self.stats = crc.FrameStats()
+        self.ser: Optional[serial.Serial] = None
+        self.reader: Optional[BusReader] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tx: Optional[ThreadPoolExecutor] = None  # Write worker while open
+        self._queues: List[Tuple[Optional[int], asyncio.Queue]] = []
+        self._pending: Dict[int, List[Tuple[DJIFrame, Callable, asyncio.Future]]] = {}
+        self._texts: List[asyncio.Queue] = []
+        self._closed = True
+        self.error: Optional[BaseException] = None  # Why the reader stopped, if it failed
+
+        # Counters
+        self.sent = 0
+        self.dropped = 0      # Frames dropped from full frames() queues
+        self.timeouts = 0     # request() calls that timed out
+
+    # ---- Lifecycle -----------------------------------------------------
+
+    async def open(self):
+        """Open the port, negotiate the link mode and start the reader thread"""
+        self._loop = asyncio.get_running_loop()
+        if self._tx is None:
+            self._tx = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tx')
+        if not self.port:
+            self.port = RS485Interface().find_device()
+            if not self.port:
+                raise serial.SerialException("No serial device found")
+
+        def _open():
+            ser = serial.Serial(self.port, self.baudrate, timeout=1)
+            time.sleep(RESET_WAIT)  # Wait for Arduino reset, as interface.py does
+            ser.reset_input_buffer()  # Startup messages
+            link, _ = hostlink.negotiate(ser, self.link)
+            return ser, link
+
+        self.ser, self.link = await self._loop.run_in_executor(self._tx, _open)
+        self.error = None
+        self._closed = False
+        self.reader = BusReader(self.ser, self.link, self.validate,
+                                self.stats if self.validate else None)
+        self.reader.subscribe(self._from_reader, packets=True)
+        self.reader.on_error = self._from_reader_error
+        self.reader.start()
+        return self
+
+    async def close(self):
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader = None
+        if self.ser is not None and self.ser.is_open:
+            await self._loop.run_in_executor(self._tx, self.ser.close)
+        if self._tx is not None:
+            self._tx.shutdown(wait=False)
+            self._tx = None  # open() starts a new one
+        self._shut_down(None)
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # ---- Sending -------------------------------------------------------
+
+    def _write(self, data: bytes):
+        self.ser.write(data)
+        self.ser.flush()
+
+    async def send(self, frame: DJIFrame):
+        """Transmit a frame on the bus; returns once it is handed to the USB driver"""
+        await self.send_raw(frame.encode())
+
+    async def send_raw(self, data: bytes):
+        await self._loop.run_in_executor(self._tx, self._write, hostlink.tx_command(data, self.link))
+        self.sent += 1
+
+    async def command(self, text: str):
+        """Send a text command (STATS, MODE ASCII, ...) to the firmware"""
+        await self._loop.run_in_executor(self._tx, self._write, hostlink.text_command(text, self.link))
+
+    # ---- Receiving -----------------------------------------------------
+
+    async def frames(self, cmd: Optional[int] = None) -> AsyncIterator[DJIFrame]:
+        """Iterate over received frames (of one cmd_id, if given) from now on"""
+        entry = (cmd, asyncio.Queue(maxsize=QUEUE_SIZE))
+        self._queues.append(entry)
+        try:
+            while not self._closed:
+                frame = await entry[1].get()
+                if frame is _CLOSED:
+                    break
+                yield frame
+        finally:
+            self._queues.remove(entry)
+        self._raise_error()
+
+    async def texts(self) -> AsyncIterator[str]:
+        """Iterate over device text lines (status, errors, TX echoes)"""
+        q: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._texts.append(q)
+        try:
+            while not self._closed:
+                text = await q.get()
+                if text is _CLOSED:
+                    break
+                yield text
+        finally:
+            self._texts.remove(q)
+        self._raise_error()
+
+    async def request(self, frame: DJIFrame, expect: int, timeout: float = 1.0,
+                      match: Callable[[DJIFrame, DJIFrame], bool] = same_sequence) -> DJIFrame:
+        """
+        Send frame and wait for the response of cmd_id expect.
+
+        The response is matched by sequence number (or match(request,
+        response)). Raises asyncio.TimeoutError after timeout seconds.
+        """
+        future = self._loop.create_future()
+        waiter = (frame, match, future)
+        self._pending.setdefault(expect, []).append(waiter)
+        try:
+            await self.send(frame)
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waiters = self._pending.get(expect)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self._pending[expect]
+
+    # ---- Dispatch (event loop thread) ----------------------------------
+
+    def _from_reader(self, frame: Optional[DJIFrame], packet: hostlink.Packet):
+        """BusReader callback (reader thread): hand over to the event loop"""
+        try:
+            self._loop.call_soon_threadsafe(self._dispatch, frame, packet)
+        except RuntimeError:
+            pass  # Loop already closed
+
+    def _from_reader_error(self, error: BaseException):
+        """BusReader error hook (reader thread): the port failed"""
+        try:
+            self._loop.call_soon_threadsafe(self._shut_down, error)
+        except RuntimeError:
+            pass  # Loop already closed
+
+    def _shut_down(self, error: Optional[BaseException]):
+        """End every frames()/texts() iterator and pending request (close() or a reader error)"""
+        if self._closed:
+            return
+        self._closed = True
+        self.error = error
+        for q in [q for _, q in self._queues] + self._texts:
+            self._put(q, _CLOSED)
+        for _, futures in self._pending.items():
+            for _, _, future in futures:
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(serial.SerialException(f"reader stopped: {error}"))
+                else:
+                    future.cancel()
+        self._pending.clear()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise serial.SerialException(f"reader stopped: {self.error}") from self.error
+
+    def _dispatch(self, frame: Optional[DJIFrame], packet: hostlink.Packet):
+        if frame is None:
+            if packet.type != hostlink.FRAME:
+                text = hostlink.format_packet(packet)
+                for q in self._texts:
+                    self._put(q, text)
+            return
+
+        waiters = self._pending.get(frame.cmd_id)
+        if waiters:
+            for request, match, future in waiters:
+                if not future.done() and match(request, frame):
+                    future.set_result(frame)
+                    break
+
+        for cmd, q in self._queues:
+            if cmd is None or cmd == frame.cmd_id:
+                self._put(q, frame)
+
+    def _put(self, q: asyncio.Queue, item):
+        if q.full():
+            q.get_nowait()
+            self.dropped += 1
+        q.put_nowait(item)
+
+
+async def _run(args):
+    """Poll ESC telemetry at a fixed rate while printing replies and device text"""
+    payload = bytes.fromhex('AC 03 AC 03 AC 03 AC 03 AC 03 AC 03 AC 03 AC 03')
+
+    async with AsyncRS485Interface(args.port, args.baud, args.link, args.validate) as iface:
+        print(f"Connected to {iface.port} ({iface.link} link)")
+
+        async def show_texts():
+            async for line in iface.texts():
+                if not args.quiet:
+                    print(f"[DEVICE] {line}")
+
+        texts = asyncio.create_task(show_texts())
+        latencies = []
+        period = 1.0 / args.rate
+        next_tick = time.monotonic()
+        end = next_tick + args.duration
+
+        for seq in range(1 << 30):
+            now = time.monotonic()
+            if now >= end:
+                break
+            if next_tick > now:
+                await asyncio.sleep(next_tick - now)
+            next_tick += period
+
+            frame = DJIFrame(0xA0D0, reserved=0x0000, sequence=seq & 0xFF, payload=payload)
+            t0 = time.monotonic()
+            try:
+                reply = await iface.request(frame, expect=0xA0D0, timeout=args.timeout)
+            except asyncio.TimeoutError:
+                continue
+            latencies.append(time.monotonic() - t0)
+            if not args.quiet:
+                print(f"[RECV] {reply}")
+
+        texts.cancel()
+        print(f"Sent {iface.sent}, replies {len(latencies)}, timeouts {iface.timeouts}")
+        if latencies:
+            latencies.sort()
+            print(f"Round trip: median {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+                  f"max {latencies[-1] * 1000:.1f}ms")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='asyncio DJI ESC RS-485 interface (telemetry poll)')
+    parser.add_argument('-p', '--port', help='Serial port (auto-detect if not specified)')
+    parser.add_argument('-b', '--baud', type=int, default=115200, help='Baud rate')
+    parser.add_argument('--link', choices=hostlink.LINK_MODES, default=hostlink.ASCII,
+                        help='USB host link: ASCII hex lines or binary packets')
+    parser.add_argument('--validate', choices=crc.VALIDATE_MODES,
+                        help='Check frame CRCs: flag bad frames or drop them')
+    parser.add_argument('-r', '--rate', type=float, default=50.0, help='Requests per second')
+    parser.add_argument('-d', '--duration', type=float, default=5.0, help='Seconds to run')
+    parser.add_argument('-t', '--timeout', type=float, default=0.1, help='Reply timeout (s)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only print the summary')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(_run(args))
+    except KeyboardInterrupt:
+        print()
+    except serial.SerialException as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
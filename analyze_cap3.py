@@ -3,44 +3,47 @@
 Analyze capture 3 to decode throttle and arming commands.
 """
 
-import csv
-import struct
-from collections import defaultdict
-
-def parse_payload(hex_str):
-    """Parse hex payload string into bytes."""
-    return bytes.fromhex(hex_str.replace(' ', ''))
-
-def analyze_a021_payload(payload_bytes):
-    """
-    Analyze 0xA021 (FC->ESC) command payload.
-    Payload is 26 bytes according to the captures.
-    """
-    if len(payload_bytes) < 26:
-        return None
-
-    # Try to decode as little-endian values
-    result = {
-        'raw_hex': payload_bytes.hex(' '),
-        'byte_00_01': struct.unpack('<H', payload_bytes[0:2])[0],   # 0x154E, 0x1550, etc.
-        'byte_02': payload_bytes[2],                                 # 0x07
-        'byte_03': payload_bytes[3],                                 # 0x00
-        'byte_04': payload_bytes[4],                                 # 0x98
-        'byte_05_06': struct.unpack('<H', payload_bytes[5:7])[0],   # Usually 0x0000
-        'byte_07': payload_bytes[7],                                 # 0x00
-        'byte_08_09': struct.unpack('<H', payload_bytes[8:10])[0],  # Changes! 0x03B1, etc.
-        'byte_10_11': struct.unpack('<H', payload_bytes[10:12])[0], # 0x0000
-        'byte_12_13': struct.unpack('<H', payload_bytes[12:14])[0], # 0x0000
-        'byte_14': payload_bytes[14],                               # 0x00
-        'byte_15': payload_bytes[15],                               # 0x80
-        'byte_16_17': struct.unpack('<H', payload_bytes[16:18])[0], # Changes! 0x02BA, etc.
-        'byte_18_19': struct.unpack('<H', payload_bytes[18:20])[0], # 0x0000
-        'byte_20_21': struct.unpack('<H', payload_bytes[20:22])[0], # Changes! 0x0000, 0x0040, 0x0080, 0x00C0
-        'byte_22': payload_bytes[22],                               # Changes! 0x1B, 0x26, 0x27, etc.
-        'byte_23_24': struct.unpack('<H', payload_bytes[23:25])[0], # Usually 0x0000
-        'byte_25': payload_bytes[25] if len(payload_bytes) > 25 else 0,
-    }
-    return result
+import argparse
+
+import numpy as np
+
+import capload
+
+def percentiles(values_us):
+    """'mean / p50 / p99 / max' of a µs array, in ms."""
+    p50, p99 = np.percentile(values_us, [50, 99])
+    return (f"mean {values_us.mean() / 1000:.3f}  p50 {p50 / 1000:.3f}  "
+            f"p99 {p99 / 1000:.3f}  max {values_us.max() / 1000:.3f} ms")
+
+def print_timing(cap):
+    """Bus timing from the micros() stamps (firmware with µs timestamps only)."""
+    start = cap.start_us
+    # .djicap captures keep only the start stamp: gaps are then start-to-start
+    end = np.where(cap.end_us >= 0, cap.end_us, start)
+
+    print("\n" + "=" * 80)
+    print("Bus Timing (micros() stamps)")
+    print("=" * 80)
+
+    gaps = start[1:] - end[:-1]
+    print(f"  Idle gap between frames: {percentiles(gaps)}")
+    for cmd_id in cap.cmd_ids:
+        rows = np.flatnonzero(cap.cmd_id == cmd_id)
+        if len(rows) < 3:
+            continue
+        period = np.diff(start[rows])
+        jitter = np.abs(period - np.median(period))
+        print(f"  0x{cmd_id:04X} period: {percentiles(period)}")
+        print(f"  0x{cmd_id:04X} jitter: {percentiles(jitter)}")
+
+    # FC command -> first ESC frame after it (end of A021 to start of A0D0)
+    a021 = np.flatnonzero(cap.cmd_id == 0xA021)
+    a0d0 = np.flatnonzero(cap.cmd_id == 0xA0D0)
+    following = np.searchsorted(a0d0, a021, side='right')
+    replied = following < len(a0d0)
+    if replied.any():
+        latency = start[a0d0[following[replied]]] - end[a021[replied]]
+        print(f"  0xA021 -> next 0xA0D0:  {percentiles(latency)}")
 
 def main():
     # Key timestamps from user notes:
@@ -61,28 +64,35 @@ def main():
         ("takeoff2", 100000, 103000), # Second takeoff attempt
     ]
 
-    a021_frames_by_window = defaultdict(list)
-
-    with open('cap3.csv', 'r') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            cmd_id = row['cmd_id']
-            if cmd_id != '0xA021':
-                continue
-
-            timestamp = int(row['timestamp_ms'])
-            payload_hex = row['payload_hex']
-            payload = parse_payload(payload_hex)
-
-            # Categorize by time window
-            for window_name, start, end in time_windows:
-                if start <= timestamp < end:
-                    analysis = analyze_a021_payload(payload)
-                    if analysis:
-                        analysis['timestamp'] = timestamp
-                        analysis['elapsed'] = int(row['elapsed_ms'])
-                        a021_frames_by_window[window_name].append(analysis)
-                    break
+    parser = argparse.ArgumentParser(description='0xA021 analysis by flight phase')
+    parser.add_argument('capture', nargs='?', default='cap3.csv', help='Capture CSV or .djicap')
+    parser.add_argument('--phases', help='JSON file of named phase windows (may overlap)')
+    parser.add_argument('--section', help='Phase set to use from the --phases file')
+    args = parser.parse_args()
+    if args.phases:
+        try:
+            time_windows = capload.load_phases(args.phases, args.section)
+        except (OSError, ValueError, KeyError) as e:
+            parser.error(f"bad --phases file: {e}")
+
+    # Load once into columns; decode all 0xA021 payloads with one dtype view
+    cap = capload.load_capture(args.capture)
+    a021 = cap.command(0xA021)
+    a021 = a021[a021.complete]
+    fields = capload.a021_fields(a021)
+    elapsed = cap.elapsed_ms[a021.rows]
+
+    # Each window is a searchsorted span of the time index; windows may overlap
+    a021_frames_by_window = {}
+    for (window_name, _, _), sel in a021.index.select_many(time_windows):
+        a021_frames_by_window[window_name] = {
+            'timestamp': a021.timestamp_ms[sel],
+            'elapsed': elapsed[sel],
+            'byte_08_09': fields['throttle3'][sel],
+            'byte_16_17': fields['counter'][sel],
+            'byte_20_21': fields['word_20'][sel],
+            'byte_22': fields['state'][sel],
+        }
 
     # Print analysis
     print("=" * 80)
@@ -91,28 +101,30 @@ def main():
 
     for window_name, start, end in time_windows:
         frames = a021_frames_by_window[window_name]
-        if not frames:
+        count = len(frames['timestamp'])
+        if not count:
             continue
 
-        print(f"\n{window_name.upper()}: {start}ms - {end}ms ({len(frames)} frames)")
+        print(f"\n{window_name.upper()}: {start}ms - {end}ms ({count} frames)")
         print("-" * 80)
 
         # Show first few frames
-        for i, frame in enumerate(frames[:3]):
+        for i in range(min(count, 3)):
+            frame = {key: int(col[i]) for key, col in frames.items()}
             print(f"  Frame {i+1} @ {frame['timestamp']}ms (+{frame['elapsed']}ms):")
             print(f"    Bytes [08:09] (16-bit LE): 0x{frame['byte_08_09']:04X} = {frame['byte_08_09']}")
             print(f"    Bytes [16:17] (16-bit LE): 0x{frame['byte_16_17']:04X} = {frame['byte_16_17']}")
             print(f"    Bytes [20:21] (16-bit LE): 0x{frame['byte_20_21']:04X} = {frame['byte_20_21']}")
             print(f"    Byte  [22]    (uint8):     0x{frame['byte_22']:02X} = {frame['byte_22']}")
 
-        if len(frames) > 3:
-            print(f"  ... ({len(frames) - 3} more frames)")
+        if count > 3:
+            print(f"  ... ({count - 3} more frames)")
 
         # Look for unique values in key fields
-        unique_08_09 = set(f['byte_08_09'] for f in frames)
-        unique_16_17 = set(f['byte_16_17'] for f in frames)
-        unique_20_21 = set(f['byte_20_21'] for f in frames)
-        unique_22 = set(f['byte_22'] for f in frames)
+        unique_08_09 = np.unique(frames['byte_08_09']).tolist()
+        unique_16_17 = np.unique(frames['byte_16_17']).tolist()
+        unique_20_21 = np.unique(frames['byte_20_21']).tolist()
+        unique_22 = np.unique(frames['byte_22']).tolist()
 
         print(f"\n  Unique values in this window:")
         print(f"    Bytes [08:09]: {sorted(unique_08_09)}")
@@ -132,5 +144,8 @@ def main():
     print("\nByte [22] also changes - could be related to motor control state.")
     print("Bytes [08:09] and [16:17] change over time - likely counters or status values.")
 
+    if cap.has_micros:
+        print_timing(cap)
+
 if __name__ == '__main__':
     main()
@@ -1,7 +1,10 @@
-import csv
 import struct
 import sys
 
+import numpy as np
+
+import capload
+
 def analyze_0xa0d0(frame):
     """Analyze ESC telemetry frame (0xA0D0)."""
     if len(frame) < 26:
@@ -52,37 +55,62 @@ def analyze_0xa021(frame):
 
     return result
 
+def a0d0_analyses(frames, size):
+    """Vectorized analyze_0xa0d0() over all 0xA0D0 frames; yields (row, result)."""
+    values = capload.a0d0_words(frames)
+    ok = size[frames.rows] >= 26
+    for row, seq, v in zip(frames.rows[ok].tolist(), frames.sequence[ok].tolist(),
+                           values[ok].tolist()):
+        yield row, {
+            'type': '0xA0D0 (ESC Telemetry)',
+            'sequence': seq,
+            'voltage_v': v[0] / 100.0,
+            'current_a': v[1] / 100.0,
+            'rpm': v[2] * 10,
+            'temp_c': v[3] / 10.0,
+            'value_4': v[4],
+            'value_5': v[5],
+            'value_6': v[6],
+            'value_7': v[7],
+        }
+
+def a021_analyses(frames, size):
+    """Vectorized analyze_0xa021() over all 0xA021 frames; yields (row, result)."""
+    fields = capload.a021_fields(frames)
+    ok = size[frames.rows] >= 36
+    fields = fields[ok]
+    timestamp = fields['unknown_a'].astype(np.uint32) | (fields['throttle1'].astype(np.uint32) << 16)
+    for row, ts, value, reserved, voltage in zip(
+            frames.rows[ok].tolist(), timestamp.tolist(), fields['unknown_b'].tolist(),
+            fields['throttle2'].tolist(), fields['throttle3'].tolist()):
+        yield row, {
+            'type': '0xA021 (FC Status)',
+            'timestamp': ts,
+            'value_u16': value,
+            'reserved': reserved,
+            'voltage_v': voltage / 100.0,
+        }
+
 def main():
     input_file = sys.argv[1] if len(sys.argv) > 1 else "decoded_frames.csv"
 
-    with open(input_file, 'r', newline='') as f:
-        reader = csv.DictReader(f)
-
-        print("Frame Analysis")
-        print("=" * 80)
-
-        for row in reader:
-            # Reconstruct frame from raw_hex
-            raw_hex = row['raw_hex']
-            frame = [int(b, 16) for b in raw_hex.split()]
-
-            cmd_id = int(row['cmd_id'])
-
-            if cmd_id == 41168:  # 0xA0D0
-                analysis = analyze_0xa0d0(frame)
-            elif cmd_id == 40993:  # 0xA021
-                analysis = analyze_0xa021(frame)
-            else:
-                continue
-
-            if analysis:
-                print(f"\nFrame {row['frame_num']}: {analysis['type']}")
-                for key, val in analysis.items():
-                    if key != 'type':
-                        if isinstance(val, float):
-                            print(f"  {key:15s}: {val:.3f}")
-                        else:
-                            print(f"  {key:15s}: {val}")
+    cap = capload.load_capture(input_file)
+    analyses = dict(a0d0_analyses(cap.command(0xA0D0), cap.size))
+    analyses.update(a021_analyses(cap.command(0xA021), cap.size))
+
+    print("Frame Analysis")
+    print("=" * 80)
+
+    frame_num = cap.frame_num.tolist()
+    for row in sorted(analyses):
+        analysis = analyses[row]
+        print(f"\nFrame {frame_num[row]}: {analysis['type']}")
+        for key, val in analysis.items():
+            if key != 'type':
+                if isinstance(val, float):
+                    print(f"  {key:15s}: {val:.3f}")
+                else:
+                    print(f"  {key:15s}: {val}")
 
 if __name__ == "__main__":
     main()
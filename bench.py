@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the framing, decoding, CRC and logging hot paths.
+
+Each benchmark runs over the frames of a real capture (default
+captures/cap3.csv), tiled with shifted timestamps up to --frames, so
+1M+ frame captures can be synthesized from the recorded traffic. For
+every benchmark the best of --repeat runs is reported as frames/s and
+bytes/s, plus the peak traced memory of a separate tracemalloc run.
+
+    python3 bench.py                                  # cap3.csv as recorded
+    python3 bench.py --frames 1000000 -o base.json
+    python3 bench.py --frames 1000000 -o new.json --compare base.json
+    python3 bench.py --only crc16 frame_decode
+
+Results are written as JSON (-o) with the git commit, Python version and
+workload size, so two runs can be diffed or compared with --compare.
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import capload
+import crc16 as crc
+import decode
+import framing
+import hostlink
+import parse_hex_log
+from buslog import FrameLogger
+from frame import DJIFrame, A021Template
+from test_throttle import DJIThrottleController
+
+DEFAULT_CAPTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'captures', 'cap3.csv')
+SCOPE_FRAMES = 100000  # decode.py reads one CSV row per byte; cap its input
+CHUNK = 4096           # Serial read size fed to the incremental parsers
+MAX_SLOWDOWN = 0.9     # --compare flags benchmarks below this fraction of the baseline
+
+
+class Workload:
+    """Frames of a capture tiled to a target count, in every input format"""
+
+    def __init__(self, cap, frames=None):
+        base = [cap.raw[i, :cap.size[i]].tobytes() for i in range(len(cap))]
+        stamps = [int(t) for t in cap.timestamp_ms]
+        span = stamps[-1] - stamps[0] + 1 if stamps else 0
+        count = frames or len(base)
+
+        self.frames = []
+        self.timestamp_ms = []
+        lap = 0
+        while len(self.frames) < count:
+            take = min(len(base), count - len(self.frames))
+            self.frames.extend(base[:take])
+            self.timestamp_ms.extend(t + lap * span for t in stamps[:take])
+            lap += 1
+
+        self.stream = b''.join(self.frames)
+        self.hex_lines = [f.hex(' ').upper() for f in self.frames]
+        self._tmp = tempfile.TemporaryDirectory(prefix='djiesc-bench-')
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def bytes(self):
+        return len(self.stream)
+
+    def path(self, name):
+        return os.path.join(self._tmp.name, name)
+
+    def scope_csv(self, limit=SCOPE_FRAMES):
+        """Write the first limit frames as a scope export (one Rx byte per row)."""
+        path = self.path('scope.csv')
+        frames = self.frames[:limit]
+        with open(path, 'w') as f:
+            f.write("UART,Time,Rx,Rx Err\n")
+            for frame, ms in zip(frames, self.timestamp_ms):
+                for b in frame:
+                    f.write(f"1,{ms}ms,0x{b:02X},\n")
+        return path, len(frames), sum(len(f) for f in frames)
+
+    def buslog_csv(self):
+        """Write the frames as a buslog.py CSV."""
+        path = self.path('buslog.csv')
+        if not os.path.exists(path):
+            first = self.timestamp_ms[0] if self.timestamp_ms else 0
+            with open(path, 'w') as f:
+                f.write("frame_num,timestamp_ms,elapsed_ms,cmd_id,sequence,length,payload_hex,raw_hex\n")
+                for n, (frame, ms, line) in enumerate(zip(self.frames, self.timestamp_ms,
+                                                          self.hex_lines), 1):
+                    cmd_id = frame[3] | frame[4] << 8 if len(frame) > 4 else 0
+                    f.write(f"{n},{ms},{ms - first},0x{cmd_id:04X},{frame[7] if len(frame) > 7 else 0},"
+                            f"{len(frame)},{line[24:-6]},{line}\n")
+        return path
+
+    def packets(self):
+        """The frames as binary-link FRAME packets."""
+        return b''.join(hostlink.encode_packet(hostlink.FRAME, f[:hostlink.MAX_PAYLOAD - 4], ms)
+                        for f, ms in zip(self.frames, self.timestamp_ms))
+
+    def close(self):
+        self._tmp.cleanup()
+
+
+# ---- Benchmarks ----------------------------------------------------------
+#
+# Each setup(workload) returns (run, frames, bytes): run() is the timed
+# callable, frames/bytes the amount of input one run() processes.
+
+def bench_crc16(w):
+    frames = w.frames
+    calc = crc.crc16
+
+    def run():
+        for f in frames:
+            calc(f)
+    return run, len(w), w.bytes
+
+
+def bench_crc16_sliced(w):
+    frames = w.frames
+    calc = crc.crc16_sliced
+
+    def run():
+        for f in frames:
+            calc(f)
+    return run, len(w), w.bytes
+
+
+def bench_calculate_crc16(w):
+    frames = w.frames
+    calc = DJIThrottleController(None).calculate_crc16  # Never connected
+
+    def run():
+        for f in frames:
+            calc(f)
+    return run, len(w), w.bytes
+
+
+def bench_check_batch(w):
+    packed = crc.pack_frames(w.frames)
+
+    def run():
+        crc.check_batch(packed)
+    return run, len(w), w.bytes
+
+
+def bench_frame_decode(w):
+    frames = w.frames
+    stats = crc.FrameStats()
+
+    def run():
+        for f in frames:
+            DJIFrame.decode(f, 'flag', stats)
+    return run, len(w), w.bytes
+
+
+def bench_frame_encode(w):
+    frames = []
+    for data in w.frames:
+        frame = DJIFrame.decode(data)
+        if frame is not None:
+            frames.append(DJIFrame(frame.cmd_id, frame.reserved, frame.sequence,
+                                   bytes(frame.payload)))
+    size = sum(f.length for f in frames)
+
+    def run():
+        for frame in frames:
+            frame.encode()
+    return run, len(frames), size
+
+
+def bench_a021_template(w):
+    template = A021Template()
+    count = len(w)
+
+    def run():
+        update = template.update
+        for i in range(count):
+            update(True, i & 0x7FF, 944, 944, 944)
+    return run, count, count * len(template.buf)
+
+
+def bench_frame_parser(w):
+    stream = w.stream
+    chunks = [stream[i:i + CHUNK] for i in range(0, len(stream), CHUNK)]
+
+    def run():
+        parser = framing.FrameParser()
+        for chunk in chunks:
+            for _ in parser.feed(chunk):
+                pass
+    return run, len(w), w.bytes
+
+
+def bench_parse_hex_log(w):
+    stream = w.stream
+
+    def run():
+        parse_hex_log.extract_frames(stream)
+    return run, len(w), w.bytes
+
+
+def bench_decode_scope_csv(w):
+    path, frames, size = w.scope_csv()
+
+    def run():
+        decode.extract_frames(path)
+    return run, frames, size
+
+
+def bench_buslog_log_frame(w):
+    stamps = w.timestamp_ms
+    lines = w.hex_lines
+    base = w.path('logged')
+
+    def run():
+        logger = FrameLogger()
+        with contextlib.redirect_stdout(io.StringIO()):
+            logger.open_log_files(base)
+            log = logger.log_frame
+            for ms, line in zip(stamps, lines):
+                log(ms, line)
+            logger.close()
+    return run, len(w), w.bytes
+
+
+def bench_buslog_ascii(w):
+    stream = ''.join(f"FRAME,{ms},{line}\r\n" for ms, line in zip(w.timestamp_ms, w.hex_lines)).encode()
+    chunks = [stream[i:i + CHUNK] for i in range(0, len(stream), CHUNK)]
+    base = w.path('ascii')
+
+    def run():
+        logger = FrameLogger()
+        lines = hostlink.LineDecoder()
+        with contextlib.redirect_stdout(io.StringIO()):
+            logger.open_log_files(base)
+            handle = logger.handle_line
+            for chunk in chunks:
+                for line in lines.lines(chunk):
+                    handle(line)
+            logger.close()
+    return run, len(w), len(stream)
+
+
+def bench_hostlink_decoder(w):
+    stream = w.packets()
+    chunks = [stream[i:i + CHUNK] for i in range(0, len(stream), CHUNK)]
+
+    def run():
+        decoder = hostlink.PacketDecoder()
+        for chunk in chunks:
+            for _ in decoder.feed(chunk):
+                pass
+    return run, len(w), len(stream)
+
+
+def bench_capload_csv(w):
+    path = w.buslog_csv()
+
+    def run():
+        capload.load_csv(path)
+    return run, len(w), w.bytes
+
+
+BENCHMARKS = {
+    'crc16': bench_crc16,
+    'crc16_sliced': bench_crc16_sliced,
+    'calculate_crc16': bench_calculate_crc16,
+    'check_batch': bench_check_batch,
+    'frame_decode': bench_frame_decode,
+    'frame_encode': bench_frame_encode,
+    'a021_template': bench_a021_template,
+    'frame_parser': bench_frame_parser,
+    'parse_hex_log': bench_parse_hex_log,
+    'decode_scope_csv': bench_decode_scope_csv,
+    'buslog_log_frame': bench_buslog_log_frame,
+    'buslog_ascii': bench_buslog_ascii,
+    'hostlink_decoder': bench_hostlink_decoder,
+    'capload_csv': bench_capload_csv,
+}
+
+
+def measure(setup, workload, repeat=3, memory=True):
+    """Best-of-repeat timing plus peak traced memory of one run."""
+    run, frames, size = setup(workload)
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    best = max(best, 1e-9)
+    return {
+        'frames': frames,
+        'bytes': size,
+        'seconds': round(best, 6),
+        'frames_per_s': round(frames / best, 1),
+        'bytes_per_s': round(size / best, 1),
+        'peak_mb': round(peak / 1e6, 3) if peak is not None else None,
+    }
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                             text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(results, baseline):
+    """Return lines comparing frames/s against a baseline results dict."""
+    lines = [f"  vs {baseline['meta'].get('commit') or 'baseline'} "
+             f"({baseline['meta'].get('frames')} frames):"]
+    for name, r in results['results'].items():
+        old = baseline['results'].get(name)
+        if not old or not old.get('frames_per_s'):
+            lines.append(f"    {name:18s}  (new)")
+            continue
+        ratio = r['frames_per_s'] / old['frames_per_s']
+        flag = "  SLOWER" if ratio < MAX_SLOWDOWN else ""
+        lines.append(f"    {name:18s} {ratio:6.2f}x{flag}")
+    return lines
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the framing/decoding/CRC/logging hot paths')
+    parser.add_argument('-c', '--capture', default=DEFAULT_CAPTURE,
+                        help='Capture whose frames are tiled into the workload (.csv or .djicap)')
+    parser.add_argument('-n', '--frames', type=int,
+                        help='Synthesize this many frames (default: the capture as recorded)')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Runs per benchmark (best is kept)')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), metavar='NAME',
+                        help=f"Benchmarks to run: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc pass')
+    parser.add_argument('-o', '--output', help='Write results as JSON')
+    parser.add_argument('--compare', help='Baseline JSON to compare frames/s against')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    try:
+        cap = capload.load_capture(args.capture)
+    except (OSError, KeyError, ValueError) as e:
+        parser.error(f"cannot load {args.capture}: {e}")
+
+    t = time.perf_counter()
+    workload = Workload(cap, args.frames)
+    print(f"{args.capture}: {len(cap)} frames -> {len(workload)} frames, "
+          f"{workload.bytes / 1e6:.1f} MB ({time.perf_counter() - t:.1f}s to build)")
+
+    results = {
+        'meta': {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'capture': os.path.basename(args.capture),
+            'frames': len(workload),
+            'bytes': workload.bytes,
+            'repeat': args.repeat,
+        },
+        'results': {},
+    }
+
+    print(f"\n  {'benchmark':18s} {'frames':>9s} {'frames/s':>12s} {'MB/s':>8s} {'peak MB':>8s}")
+    try:
+        for name in args.only or BENCHMARKS:
+            r = measure(BENCHMARKS[name], workload, args.repeat, not args.no_memory)
+            results['results'][name] = r
+            peak = f"{r['peak_mb']:8.1f}" if r['peak_mb'] is not None else f"{'-':>8s}"
+            print(f"  {name:18s} {r['frames']:9d} {r['frames_per_s']:12.0f} "
+                  f"{r['bytes_per_s'] / 1e6:8.2f} {peak}", flush=True)
+    except KeyboardInterrupt:
+        print("\n  Interrupted")
+    finally:
+        workload.close()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Results: {args.output}")
+    if baseline:
+        print()
+        print("\n".join(compare(results, baseline)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
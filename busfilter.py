@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+On-device cmd_id filter and decimation (FILTER command).
+
+busprint.ino and interface.ino can drop frames before they reach the USB
+link, so a host that only cares about 0xA021 does not have to receive and
+decode every 0xA0D0 broadcast. The filter is set with one text command
+(an ASCII line, or a TEXT packet in binary mode):
+
+    FILTER OFF                  forward every frame (power-up default)
+    FILTER ALLOW A021           only 0xA021
+    FILTER ALLOW A021 A0D0/10   0xA021, and every 10th 0xA0D0
+    FILTER DENY A0D0            everything except 0xA0D0
+    FILTER DENY 0303/C          everything; 0x0303 only when its payload changes
+    FILTER                      report the active filter
+
+A bare ID is forwarded in ALLOW mode and dropped in DENY mode. An ID with
+/N is forwarded every Nth frame (the first, N+1th, ...) and with /C only
+when its payload differs from the last one forwarded, in either mode.
+Unlisted IDs are dropped in ALLOW mode and forwarded in DENY mode.
+Partial frames are always forwarded. Setting a filter restarts the
+decimation counters.
+
+The device answers "FILTER,<active filter>" (e.g. "FILTER,ALLOW A021 A0D0/10")
+or "ERROR,BAD_FILTER", and counts dropped frames in STATS (FILTERED=).
+FrameFilter parses and formats that spec, and accept() applies the same
+rules on the host (simbus.py).
+
+    python3 busfilter.py "ALLOW A021 A0D0/10" captures/cap3.csv   # what would pass
+"""
+
+import sys
+
+import hostlink
+from framing import HEADER_SIZE
+
+ALLOW = 'ALLOW'
+DENY = 'DENY'
+OFF = 'OFF'
+MODES = (ALLOW, DENY)
+
+CHANGED = 'C'     # Rate of an ID forwarded only when its payload changes
+MAX_RULES = 16    # MAX_FILTER_RULES in mcu/busfilter.h
+MAX_EVERY = 65534  # 0xFFFF marks /C on the device
+
+
+class FrameFilter:
+    """An ALLOW/DENY list of command IDs with optional per-ID decimation"""
+
+    def __init__(self, mode=None, rules=None):
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"filter mode must be one of {MODES}")
+        rules = dict(rules or {})
+        if mode is None and rules:
+            raise ValueError("rules need an ALLOW or DENY mode")
+        if len(rules) > MAX_RULES:
+            raise ValueError(f"at most {MAX_RULES} IDs per filter")
+        for cmd_id, rate in rules.items():
+            if not 0 <= cmd_id <= 0xFFFF:
+                raise ValueError(f"bad command ID 0x{cmd_id:X}")
+            if rate not in (None, CHANGED) and not (isinstance(rate, int) and 1 <= rate <= MAX_EVERY):
+                raise ValueError(f"bad rate {rate!r} for 0x{cmd_id:04X}")
+        self.mode = mode    # None = off
+        self.rules = rules  # cmd_id -> None (bare), N (every Nth) or CHANGED
+        self.reset()
+
+    @classmethod
+    def parse(cls, spec):
+        """FrameFilter from "ALLOW A021 A0D0/10", "OFF" or "" (also with a FILTER prefix)."""
+        words = spec.replace(',', ' ').upper().split()
+        if words and words[0] == 'FILTER':
+            words = words[1:]
+        if not words or words == [OFF]:
+            return cls()
+        mode, rules = words[0], {}
+        for word in words[1:]:
+            cmd, _, rate = word.partition('/')
+            try:
+                cmd_id = int(cmd, 16)
+                rules[cmd_id] = None if not rate else CHANGED if rate == CHANGED else int(rate)
+            except ValueError:
+                raise ValueError(f"bad filter entry {word!r}") from None
+        return cls(mode, rules)
+
+    def __str__(self):
+        if self.mode is None:
+            return OFF
+        entries = [f"{cmd_id:04X}" + ("" if rate is None else f"/{rate}")
+                   for cmd_id, rate in self.rules.items()]
+        return " ".join([self.mode] + entries)
+
+    def __repr__(self):
+        return f"FrameFilter({str(self)!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, FrameFilter) and (self.mode, self.rules) == (other.mode, other.rules)
+
+    def __bool__(self):
+        return self.mode is not None
+
+    def command(self):
+        """Text command that sets this filter on the device."""
+        return f"FILTER {self}"
+
+    def reset(self):
+        """Restart the decimation counters (the device does this on every FILTER)."""
+        self._count = {}
+        self._last = {}
+
+    def accept(self, data):
+        """True if the device forwards this frame (bytes of one complete frame)."""
+        if self.mode is None or len(data) < HEADER_SIZE:
+            return True
+        cmd_id = data[3] | (data[4] << 8)
+        if cmd_id not in self.rules:
+            return self.mode == DENY
+        rate = self.rules[cmd_id]
+        if rate is None:
+            return self.mode == ALLOW
+        if rate == CHANGED:
+            payload = bytes(data[HEADER_SIZE:-2])
+            if self._last.get(cmd_id) == payload:
+                return False
+            self._last[cmd_id] = payload
+            return True
+        n = self._count.get(cmd_id, 0)
+        self._count[cmd_id] = n + 1
+        return n % rate == 0
+
+
+def parse_reply(text):
+    """FrameFilter from a "FILTER,<spec>" reply; ValueError on ERROR,BAD_FILTER; None for other lines."""
+    text = text.strip()
+    if text.startswith('FILTER,'):
+        return FrameFilter.parse(text[7:])
+    if text == 'ERROR,BAD_FILTER':
+        raise ValueError("device rejected the filter")
+    return None
+
+
+def configure(ser, link, flt, timeout=1.0):
+    """
+    Set flt on the device (None just queries it) and return the filter it reports.
+
+    Returns None if the device did not answer (firmware without FILTER).
+    Call it while no reader thread is running (see hostlink.request).
+    """
+    command = flt.command() if flt is not None else 'FILTER'
+    reply = hostlink.request(ser, command, link, lambda text: text.startswith('FILTER,') or
+                             text == 'ERROR,BAD_FILTER', timeout)
+    return None if reply is None else parse_reply(reply)
+
+
+def main():
+    """Show what a filter would forward from a recorded capture."""
+    if len(sys.argv) < 3:
+        print('Usage: python3 busfilter.py "<ALLOW|DENY ids...>" <capture.csv|capture.djicap>')
+        return 1
+
+    import capload
+
+    try:
+        flt = FrameFilter.parse(sys.argv[1])
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+    cap = capload.load_capture(sys.argv[2])
+
+    forwarded = {}
+    for raw, size, cmd_id in zip(cap.raw, cap.size, cap.cmd_id):
+        passed, total = forwarded.get(int(cmd_id), (0, 0))
+        forwarded[int(cmd_id)] = (passed + flt.accept(raw[:size].tobytes()), total + 1)
+
+    print(f"{flt.command()}: {sum(p for p, _ in forwarded.values())}/{len(cap)} frames forwarded")
+    for cmd_id, (passed, total) in sorted(forwarded.items()):
+        print(f"  0x{cmd_id:04X}: {passed:6d}/{total:<6d}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,23 +7,58 @@ Logs frames from power-up with timestamps for later analysis
 import serial
 import serial.tools.list_ports
 import sys
+import threading
 import time
 import struct
 from datetime import datetime
 from pathlib import Path
 
+import busfilter
+import busstats
+import capfile
+import dashboard
+import crc16 as crc
+import hostlink
+import logwriter
+import metrics
+import segments
+from frame import DJIFrame
+
+# 0xA021 fields shown in the log: u32 at [0:4], u16 at [8:10]
+FC_QUERY = struct.Struct('<I4xH')
+
+# start_us/end_us: device micros() of the first/last byte (unwrapped), empty from older firmware
+CSV_HEADER = "frame_num,timestamp_ms,elapsed_ms,cmd_id,sequence,length,payload_hex,raw_hex,start_us,end_us\n"
+
 
 class FrameLogger:
     """Log RS-485 frames with timestamps"""
 
-    def __init__(self, port=None, baudrate=115200):
+    def __init__(self, port=None, baudrate=115200, validate=None, link=hostlink.ASCII,
+                 background=True, frame_filter=None, stats_interval=None, show_dashboard=False,
+                 metrics_port=None):
         self.port = port
         self.baudrate = baudrate
         self.ser = None
         self.log_file = None
         self.csv_file = None
+        self.capture = None  # capfile.CaptureWriter in binary mode
+        self.segments = None  # segments.SegmentWriter when rotating/compressing
         self.frame_count = 0
         self.start_time = None
+        self.validate = validate  # None, 'flag' or 'drop'
+        self.stats = crc.FrameStats()
+        self.link = link  # USB host link mode, negotiated on connect
+        self.frame_filter = frame_filter  # Device-side filter to set on connect (busfilter.py)
+        self.filter = busfilter.FrameFilter()  # Filter the device reported (off at power-up)
+        self.stats_interval = stats_interval  # Seconds between device bus statistics records
+        self.bus_stats = busstats.StatsSeries()  # Records received (busstats.py)
+        self.show_dashboard = show_dashboard  # Live dashboard instead of progress lines
+        self.dashboard = None  # dashboard.BusState while run() draws one
+        self.metrics_port = metrics_port  # Serve metrics.REGISTRY here while running
+        self._stop = threading.Event()
+        # Files are written and flushed on a writer thread, not the serial reader
+        self.writer = logwriter.BatchWriter(flush=self._flush_files) if background else None
 
     def find_device(self):
         """Auto-detect SAMD21 device"""
@@ -61,29 +96,122 @@ class FrameLogger:
                     line = self.ser.readline().decode('utf-8', errors='ignore').strip()
                     if line == 'LOGGER_READY':
                         print(f"✓ Connected to {self.port}")
-                        return True
+                        return self.negotiate_link() and self._configure_device()
 
             print(f"✓ Connected to {self.port} (no ready signal)")
-            return True
+            return self.negotiate_link() and self._configure_device()
 
         except serial.SerialException as e:
             print(f"ERROR: Cannot open {self.port}: {e}")
             return False
 
-    def open_log_files(self, base_name=None):
-        """Open log files for writing"""
+    def negotiate_link(self):
+        """Switch the device to the requested USB link mode (falls back to ASCII)"""
+        requested = self.link
+        self.link, _ = hostlink.negotiate(self.ser, requested)
+        if self.link != requested:
+            print(f"! Device did not accept {requested} link, using {self.link}")
+        elif self.link == hostlink.BINARY:
+            print("✓ Binary USB link")
+        return True
+
+    def _configure_device(self):
+        if self.frame_filter is not None:
+            self.set_filter(self.frame_filter)
+        if self.stats_interval:
+            self.set_stats_interval(self.stats_interval)
+        return True
+
+    def set_filter(self, frame_filter):
+        """
+        Set the device-side frame filter (a busfilter.FrameFilter, a spec
+        such as "ALLOW A021 A0D0/10", or None for off) before run().
+
+        The filter the device reports is kept in self.filter and written
+        to the .log. Returns False if the device rejected it or did not
+        answer (firmware without FILTER); every frame is then logged.
+        """
+        try:
+            if not isinstance(frame_filter, busfilter.FrameFilter):
+                frame_filter = busfilter.FrameFilter.parse(frame_filter or busfilter.OFF)
+            reported = busfilter.configure(self.ser, self.link, frame_filter)
+        except ValueError as e:
+            print(f"! {e}: {frame_filter}")
+            return False
+        if reported is None:
+            print("! Device did not answer FILTER, logging every frame")
+            return False
+        self.filter = reported
+        print(f"✓ Device filter: {self.filter}")
+        return True
+
+    def set_stats_interval(self, seconds):
+        """
+        Ask the device for bus statistics records every `seconds` (0 stops
+        them) before run(). The records are logged as [STATUS] lines and
+        collected in self.bus_stats. Returns False if the device did not
+        answer (firmware without STATS <ms>).
+        """
+        try:
+            ms = busstats.configure(self.ser, self.link, seconds)
+        except ValueError as e:
+            print(f"! {e}")
+            return False
+        if ms is None:
+            print("! Device did not answer STATS, no bus statistics")
+            return False
+        print(f"✓ Bus statistics every {ms / 1000:g}s" if ms else "✓ Bus statistics off")
+        return True
+
+    def open_log_files(self, base_name=None, binary=False, rotate_mb=None, rotate_s=None,
+                       compress=None):
+        """
+        Open log files for writing
+
+        Text mode writes a .log line and a .csv row per frame. Binary mode
+        stores frames once in a .djicap capture (see capfile.py); the .log
+        file then only receives ERROR/STATUS lines.
+
+        With rotate_mb, rotate_s or compress the session is written as
+        numbered (compressed) segments plus a manifest (see segments.py).
+        """
         if not base_name:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             base_name = f"capture_{timestamp}"
 
-        log_path = Path(base_name + ".log")
-        csv_path = Path(base_name + ".csv")
+        if rotate_mb or rotate_s or compress:
+            self.segments = segments.SegmentWriter(
+                base_name, CSV_HEADER, binary=binary, compress=compress,
+                max_bytes=int(rotate_mb * 1e6) if rotate_mb else None, max_seconds=rotate_s,
+                log_header=self._filter_line())
+            self.log_file, self.csv_file, self.capture = self.segments.files()
+            if self.writer is not None:
+                self.writer.start()
+            limits = [f"{rotate_mb:g} MB" if rotate_mb else None, f"{rotate_s:g}s" if rotate_s else None]
+            limits = " or ".join(l for l in limits if l) or "never"
+            print(f"✓ Logging to: {self.segments.current['log']} ... "
+                  f"({compress or 'uncompressed'}, rotating at {limits})")
+            print(f"✓ Manifest: {self.segments.manifest_path}")
+            return True
 
+        log_path = Path(base_name + ".log")
         self.log_file = open(log_path, 'w')
+        self.log_file.write(self._filter_line())
+        if self.writer is not None:
+            self.writer.start()
+
+        if binary:
+            cap_path = Path(base_name + capfile.EXTENSION)
+            self.capture = capfile.CaptureWriter(cap_path, capfile.TICK_US)
+            print(f"✓ Logging to: {log_path}")
+            print(f"✓ Binary capture: {cap_path}")
+            return True
+
+        csv_path = Path(base_name + ".csv")
         self.csv_file = open(csv_path, 'w')
 
         # Write CSV header
-        self.csv_file.write("frame_num,timestamp_ms,elapsed_ms,cmd_id,sequence,length,payload_hex,raw_hex\n")
+        self.csv_file.write(CSV_HEADER)
         self.csv_file.flush()
 
         print(f"✓ Logging to: {log_path}")
@@ -91,93 +219,190 @@ class FrameLogger:
 
         return True
 
+    def _filter_line(self):
+        """.log line recording the device-side filter in effect"""
+        return f"[FILTER] {self.filter}\n"
+
     def decode_frame(self, hex_str):
-        """Decode frame from hex string"""
+        """
+        Decode frame from hex string into a DJIFrame
+
+        With self.validate set, the frame is checked against its length
+        byte and CRC and the result counted in self.stats. 'flag' sets
+        frame.status, 'drop' returns None for bad frames.
+        """
         try:
-            bytes_list = [int(b, 16) for b in hex_str.split()]
-            if len(bytes_list) < 8:
-                return None
-
-            frame = {
-                'sync': bytes_list[0],
-                'length': bytes_list[1],
-                'flags': bytes_list[2],
-                'cmd_id': bytes_list[3] | (bytes_list[4] << 8),
-                'reserved': bytes_list[5] | (bytes_list[6] << 8),
-                'sequence': bytes_list[7],
-                'payload': bytes_list[8:-2] if len(bytes_list) > 10 else [],
-                'checksum': bytes_list[-2] | (bytes_list[-1] << 8) if len(bytes_list) >= 2 else 0,
-                'raw': bytes_list
-            }
-            return frame
-
-        except (ValueError, IndexError):
+            data = bytes.fromhex(hex_str)
+        except ValueError:
             return None
 
+        if self.validate:
+            return DJIFrame.decode(data, self.validate, self.stats)
+        return DJIFrame.decode(data)
+
     def analyze_frame(self, frame):
         """Analyze frame and return description"""
-        cmd_id = frame['cmd_id']
+        cmd_id = frame.cmd_id
 
         if cmd_id == 0xA0D0:
             # ESC Telemetry
-            payload = frame['payload']
-            if len(payload) >= 16:
-                values = []
-                for i in range(0, 16, 2):
-                    val = payload[i] | (payload[i+1] << 8)
-                    values.append(val)
-
+            values = frame.telemetry
+            if values:
                 voltage = values[0] * 0.051
-                return f"ESC_TELEM seq={frame['sequence']} V={voltage:.2f}V"
+                return f"ESC_TELEM seq={frame.sequence} V={voltage:.2f}V"
 
         elif cmd_id == 0xA021:
             # FC Query
-            payload = frame['payload']
-            if len(payload) >= 10:
-                timestamp = payload[0] | (payload[1] << 8) | (payload[2] << 16) | (payload[3] << 24)
-                voltage_raw = payload[8] | (payload[9] << 8)
+            payload = frame.payload
+            if len(payload) >= FC_QUERY.size:
+                timestamp, voltage_raw = FC_QUERY.unpack_from(payload)
                 voltage = voltage_raw * 0.051
                 return f"FC_QUERY timestamp={timestamp} V={voltage:.2f}V"
 
         return f"CMD_0x{cmd_id:04X}"
 
-    def log_frame(self, timestamp_ms, hex_str):
-        """Log a frame"""
+    def _next_frame(self, timestamp_ms):
+        """Count a frame and return its time since the first one"""
         self.frame_count += 1
 
         if self.start_time is None:
             self.start_time = timestamp_ms
 
-        elapsed = timestamp_ms - self.start_time
+        return timestamp_ms - self.start_time
+
+    def _submit(self, fn, *args):
+        """Run a write on the writer thread (or right away without one)"""
+        if self.writer is not None and self.writer.running:
+            self.writer.put(fn, *args)
+        else:
+            fn(*args)
+
+    def log_line(self, line):
+        """Write a line to the .log file (in order with the frames)"""
+        self._submit(self._write_log_line, line)
+
+    def _write_log_line(self, line):
+        # self.log_file is looked up here, on the writer thread: a rotation
+        # may have replaced it since the line was submitted
+        self.log_file.write(line)
+
+    def log_frame(self, timestamp_ms, hex_str, start_us=None, end_us=None):
+        """Log a frame (start_us/end_us: unwrapped micros() stamps, if the firmware sends them)"""
+        elapsed = self._next_frame(timestamp_ms)
+        self._submit(self._write_frame, timestamp_ms, elapsed, self.frame_count, hex_str,
+                     start_us, end_us)
+
+    def _write_frame(self, timestamp_ms, elapsed, frame_num, hex_str, start_us=None, end_us=None):
+        """Decode and write one frame to the .log/.csv files"""
+        if self.capture is not None:
+            try:
+                data = bytes.fromhex(hex_str)
+            except ValueError:
+                metrics.DECODE_FAILURES.labels('hex').inc()
+                self.log_file.write(f"[{timestamp_ms:010d}ms +{elapsed:06d}ms] #{frame_num:05d} DECODE_ERROR\n")
+                return
+            self._write_binary(timestamp_ms, elapsed, frame_num, data, start_us)
+            return
 
         # Decode frame
         frame = self.decode_frame(hex_str)
+        if frame:
+            metrics.count_frame(frame.cmd_id)
+        else:
+            metrics.DECODE_FAILURES.labels('frame').inc()
+        dash = self.dashboard  # Read once: run() may clear it meanwhile
+        if dash is not None:
+            if frame:
+                dash.update(frame)
+            else:
+                dash.decode_error()
 
         if frame:
             description = self.analyze_frame(frame)
+            if frame.crc_ok is False:
+                description += f" {frame.status.upper()}"
 
             # Write to log file with timestamp
-            log_line = f"[{timestamp_ms:010d}ms +{elapsed:06d}ms] #{self.frame_count:05d} {description}\n"
+            log_line = f"[{timestamp_ms:010d}ms +{elapsed:06d}ms] #{frame_num:05d} {description}\n"
             self.log_file.write(log_line)
 
             # Write to CSV
-            payload_hex = ' '.join(f'{b:02X}' for b in frame['payload'])
-            csv_line = f"{self.frame_count},{timestamp_ms},{elapsed},0x{frame['cmd_id']:04X},{frame['sequence']},{frame['length']},{payload_hex},{hex_str}\n"
+            payload_hex = frame.payload.hex(' ').upper()
+            micros = f"{start_us},{end_us}" if start_us is not None else ","
+            csv_line = f"{frame_num},{timestamp_ms},{elapsed},0x{frame.cmd_id:04X},{frame.sequence},{frame.length},{payload_hex},{hex_str},{micros}\n"
             self.csv_file.write(csv_line)
 
             # Console output (rate-limited to not spam)
-            if self.frame_count % 50 == 0:
-                print(f"  Logged {self.frame_count} frames... [{elapsed/1000:.1f}s] {description}")
+            if frame_num % 50 == 0 and dash is None:
+                print(f"  Logged {frame_num} frames... [{elapsed/1000:.1f}s] {description}")
 
         else:
             # Log raw data even if decode failed
-            log_line = f"[{timestamp_ms:010d}ms +{elapsed:06d}ms] #{self.frame_count:05d} DECODE_ERROR\n"
+            log_line = f"[{timestamp_ms:010d}ms +{elapsed:06d}ms] #{frame_num:05d} DECODE_ERROR\n"
             self.log_file.write(log_line)
 
-        # Flush periodically
-        if self.frame_count % 100 == 0:
-            self.log_file.flush()
-            self.csv_file.flush()
+        self._segment_frame(timestamp_ms)
+
+        # Flush periodically (the writer thread has its own flush policy)
+        if self.writer is None and frame_num % 100 == 0:
+            self._flush_files()
+
+    def _segment_frame(self, timestamp_ms):
+        """Count a written frame in the current segment and rotate when it is full"""
+        if self.segments is not None and self.segments.record(timestamp_ms):
+            self.log_file, self.csv_file, self.capture = self.segments.files()
+
+    def log_frame_bytes(self, timestamp_ms, data, start_us=None, end_us=None):
+        """Log a frame received as bytes over the binary USB link"""
+        if self.capture is not None:
+            self.log_binary(timestamp_ms, self._next_frame(timestamp_ms), data, start_us)
+        else:
+            self.log_frame(timestamp_ms, data.hex(' ').upper(), start_us, end_us)
+
+    def log_binary(self, timestamp_ms, elapsed, data, start_us=None):
+        """Store a frame in the binary capture"""
+        self._submit(self._write_binary, timestamp_ms, elapsed, self.frame_count, bytes(data),
+                     start_us)
+
+    def _write_binary(self, timestamp_ms, elapsed, frame_num, data, start_us=None):
+        """Store a frame in the binary capture (decoded only when needed)"""
+        if self.validate and DJIFrame.decode(data, self.validate, self.stats) is None:
+            metrics.DECODE_FAILURES.labels('frame').inc()
+            return  # Dropped by validation
+        if len(data) >= 5:
+            metrics.count_frame(data[3] | (data[4] << 8))
+
+        # Microsecond ticks: the micros() stamp, or millis() * 1000 from older firmware
+        self.capture.write(start_us if start_us is not None else timestamp_ms * 1000, data)
+        self._segment_frame(timestamp_ms)
+
+        dash = self.dashboard  # Read once: run() may clear it meanwhile
+        if dash is not None:
+            dash.update_bytes(data)
+            return
+
+        # Console output (rate-limited to not spam)
+        if frame_num % 50 == 0:
+            frame = DJIFrame.decode(data)
+            description = self.analyze_frame(frame) if frame else "DECODE_ERROR"
+            print(f"  Logged {frame_num} frames... [{elapsed/1000:.1f}s] {description}")
+
+    def flush(self):
+        """Write out everything logged so far and flush the files"""
+        if self.writer is not None and self.writer.running:
+            self.writer.flush()
+        else:
+            self._flush_files()
+
+    def _flush_files(self):
+        """Flush all open output files"""
+        with metrics.LOG_FLUSH_SECONDS.time():
+            if self.segments is not None:
+                self.segments.flush()  # Also rewrites the manifest for readers
+                return
+            for f in (self.log_file, self.csv_file, self.capture):
+                if f is not None:  # CaptureWriter has __len__: empty means falsy
+                    f.flush()
 
     def run(self, duration=None):
         """Run logger"""
@@ -193,60 +418,191 @@ class FrameLogger:
         print("="*60 + "\n")
 
         start = time.time()
+        decoder = hostlink.make_decoder(self.link)
+        binary = self.link == hostlink.BINARY
+
+        server = metrics.serve_or_warn(self.metrics_port)
+
+        usb_errors = 0
+        view = None
+        if self.show_dashboard:
+            self.dashboard = dashboard.BusState()
+            view = dashboard.Dashboard(self.dashboard, title=f"logging from {self.port}").start()
 
         try:
             while True:
                 if duration and (time.time() - start > duration):
                     break
+                if self._stop.is_set() and not self.ser.in_waiting:
+                    break  # stop() requested and everything received is logged
+
+                # Bulk read of everything buffered; blocks up to the port timeout when idle
+                waiting = self.ser.in_waiting
+                data = self.ser.read(waiting or 1)
+                metrics.read_done(len(data), waiting)
+                if binary:
+                    for packet in decoder.feed(data):
+                        self.handle_packet(packet)
+                    if decoder.errors != usb_errors:
+                        metrics.USB_ERRORS.inc(decoder.errors - usb_errors)
+                        usb_errors = decoder.errors
+                else:
+                    for line in decoder.lines(data):
+                        self.handle_line(line)
 
-                if self.ser.in_waiting:
-                    line = self.ser.readline().decode('utf-8', errors='ignore').strip()
-
-                    if line.startswith('FRAME,'):
-                        # Parse: FRAME,<timestamp>,<hex_bytes>
-                        parts = line.split(',', 2)
-                        if len(parts) == 3:
-                            try:
-                                timestamp_ms = int(parts[1])
-                                hex_str = parts[2]
-                                self.log_frame(timestamp_ms, hex_str)
-                            except ValueError:
-                                pass
-
-                    elif line.startswith('ERROR,'):
-                        # Log errors
-                        self.log_file.write(f"[ERROR] {line}\n")
-                        print(f"! {line}")
-
-                    elif line.startswith('STATUS,'):
-                        # Log status
-                        self.log_file.write(f"[STATUS] {line}\n")
+        except KeyboardInterrupt:
+            if view is None:
+                print("\n\nStopping logger...")
 
-                time.sleep(0.001)  # Small delay to prevent CPU spin
+        if view is not None:
+            view.stop()
+            print("\nStopping logger...")
 
+        # Final flush (waits for the writer thread to drain)
+        try:
+            self.flush()
         except KeyboardInterrupt:
-            print("\n\nStopping logger...")
+            pass  # close() still drains the writer
 
-        # Final flush
-        self.log_file.flush()
-        self.csv_file.flush()
+        if view is not None:
+            snap = self.dashboard.snapshot()
+            print(view.summary(snap, view.rates(snap)))
+            self.dashboard = None  # Only after the drain: the writer thread updates it
+
+        if decoder.errors:
+            print(f"! {decoder.errors} corrupt USB packets dropped")
 
         print(f"\n✓ Logged {self.frame_count} frames")
         print(f"✓ Duration: {(time.time() - start):.1f}s")
 
+        if self.validate:
+            print(f"✓ Frame validation ({self.stats.total(crc.OK)}/{self.stats.total()} ok):")
+            print("\n".join(self.stats.report()))
+
+        if self.writer is not None:
+            print("\n".join(self.writer.report()))
+
+        if self.filter:
+            print(f"✓ Device filter: {self.filter} (dropped frames never reached the logger)")
+
+        if self.bus_stats:
+            print("✓ Bus statistics (device counts, before the filter):")
+            print("\n".join(self.bus_stats.report()))
+
+        if server is not None:
+            server.shutdown()
+
         return True
 
+    def stop(self):
+        """Make run() return once the data already received is logged (any thread)"""
+        self._stop.set()
+
+    def handle_line(self, line):
+        """Log one line from the ASCII USB link"""
+        line = line.strip()
+        if line.startswith('FRAME,'):
+            # FRAME,<timestamp>,<hex_bytes>[,<start_us>,<end_us>]: the hex is
+            # decoded on the writer thread
+            comma = line.find(',', 6)
+            if comma < 0:
+                return
+            try:
+                timestamp_ms = int(line[6:comma])
+                hex_str, start_us, end_us = hostlink.split_micros(line[comma + 1:])
+            except ValueError:
+                return
+            if start_us is not None:
+                start_us = hostlink.unwrap_micros(timestamp_ms, start_us)
+                end_us = hostlink.unwrap_micros(timestamp_ms, end_us)
+            self.log_frame(timestamp_ms, hex_str, start_us, end_us)
+
+        elif line.startswith('ERROR,'):
+            self.log_line(f"[ERROR] {line}\n")
+            if ',TIMEOUT,' in line:
+                metrics.PARTIALS.inc()
+                dash = self.dashboard
+                if dash is not None:
+                    dash.partial()
+            self._notice(f"! {line}")
+
+        elif line.startswith('STATUS,'):
+            self._status(line)
+
+        elif line.startswith('FILTER,'):
+            self._filter_changed(line[7:])
+
+    def handle_packet(self, packet):
+        """Log one packet from the binary USB link"""
+        if packet.type == hostlink.FRAME:
+            self.log_frame_bytes(packet.timestamp, packet.data, packet.start_us, packet.end_us)
+        elif packet.type == hostlink.PARTIAL:
+            line = hostlink.format_packet(packet)
+            self.log_line(f"[ERROR] {line}\n")
+            metrics.PARTIALS.inc()
+            dash = self.dashboard
+            if dash is not None:
+                dash.partial()
+            self._notice(f"! {line}")
+        elif packet.type == hostlink.TEXT and packet.data.startswith('STATUS,'):
+            self._status(packet.data)
+        elif packet.type == hostlink.TEXT and packet.data.startswith('ERROR,'):
+            self.log_line(f"[ERROR] {packet.data}\n")
+            self._notice(f"! {packet.data}")
+        elif packet.type == hostlink.TEXT and packet.data.startswith('FILTER,'):
+            self._filter_changed(packet.data[7:])
+
+    def _status(self, line):
+        """Log a STATUS line; bus statistics records also go to self.bus_stats"""
+        self.log_line(f"[STATUS] {line}\n")
+        rec = self.bus_stats.feed_line(line)
+        if rec is not None and rec.cmd_id is busstats.ANY:
+            self._notice(self.bus_stats.status_line())
+
+    def _filter_changed(self, spec):
+        """The device reported a new filter during the session"""
+        try:
+            self.filter = busfilter.FrameFilter.parse(spec)
+        except ValueError:
+            return
+        self._submit(self._write_filter_line, self._filter_line())
+        self._notice(f"! Device filter changed: {self.filter}")
+
+    def _write_filter_line(self, line):
+        # On the writer thread, like _write_log_line; later segments start with it too
+        if self.segments is not None:
+            self.segments.log_header = line
+        self.log_file.write(line)
+
+    def _notice(self, text):
+        """Console message, shown on the dashboard instead while one is drawn"""
+        dash = self.dashboard
+        if dash is not None:
+            dash.message(text)
+        else:
+            print(text)
+
     def close(self):
         """Close connections and files"""
         if self.ser and self.ser.is_open:
             self.ser.close()
 
-        if self.log_file:
+        if self.writer is not None:
+            self.writer.close()  # Everything queued reaches the files first
+
+        if self.segments is not None:
+            self.segments.close()  # Closes the last segment and finalizes the manifest
+            self.log_file = self.csv_file = self.capture = None
+
+        if self.log_file is not None:
             self.log_file.close()
 
-        if self.csv_file:
+        if self.csv_file is not None:
             self.csv_file.close()
 
+        if self.capture is not None:
+            self.capture.close()  # Writes the capture index
+
         print("✓ Closed")
 
 
@@ -258,16 +614,55 @@ def main():
     parser.add_argument('-b', '--baud', type=int, default=115200, help='Baud rate')
     parser.add_argument('-o', '--output', help='Output file base name (default: capture_TIMESTAMP)')
     parser.add_argument('-d', '--duration', type=float, help='Duration in seconds (default: unlimited)')
+    parser.add_argument('--validate', choices=crc.VALIDATE_MODES,
+                        help='Check frame CRCs: flag bad frames or drop them')
+    parser.add_argument('--binary', action='store_true',
+                        help='Write a compact .djicap capture instead of .log/.csv text')
+    parser.add_argument('--link', choices=hostlink.LINK_MODES, default=hostlink.ASCII,
+                        help='USB link to the logger: ASCII lines or binary packets')
+    parser.add_argument('--rotate-mb', type=float,
+                        help='Start a new segment when the current one reaches this size on disk')
+    parser.add_argument('--rotate-min', type=float,
+                        help='Start a new segment every N minutes')
+    parser.add_argument('--compress', choices=segments.COMPRESSION,
+                        help='Compress the .log/.csv segments (zstd needs the zstandard package)')
+    parser.add_argument('--sync-writes', action='store_true',
+                        help='Write files on the reader thread instead of a background writer')
+    parser.add_argument('--filter', metavar='SPEC',
+                        help='Device-side cmd_id filter, e.g. "ALLOW A021 A0D0/10" (see busfilter.py)')
+    parser.add_argument('--dashboard', action='store_true',
+                        help='Show a live dashboard of the bus instead of progress lines')
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help='Serve Prometheus metrics on http://127.0.0.1:PORT/metrics (see metrics.py)')
+    parser.add_argument('--stats-interval', type=float, metavar='SEC',
+                        help='Device bus statistics records every SEC seconds (see busstats.py)')
 
     args = parser.parse_args()
 
-    logger = FrameLogger(port=args.port, baudrate=args.baud)
+    frame_filter = None
+    if args.filter:
+        try:
+            frame_filter = busfilter.FrameFilter.parse(args.filter)
+        except ValueError as e:
+            parser.error(f"--filter: {e}")
+    if args.stats_interval:
+        try:
+            busstats.interval_command(args.stats_interval)
+        except ValueError as e:
+            parser.error(f"--stats-interval: {e}")
+
+    logger = FrameLogger(port=args.port, baudrate=args.baud, validate=args.validate,
+                         link=args.link, background=not args.sync_writes,
+                         frame_filter=frame_filter, stats_interval=args.stats_interval,
+                         show_dashboard=args.dashboard, metrics_port=args.metrics_port)
 
     try:
         if not logger.connect():
             return 1
 
-        if not logger.open_log_files(args.output):
+        rotate_s = args.rotate_min * 60 if args.rotate_min else None
+        if not logger.open_log_files(args.output, binary=args.binary, rotate_mb=args.rotate_mb,
+                                     rotate_s=rotate_s, compress=args.compress):
             return 1
 
         if not logger.run(duration=args.duration):
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Background reader for the SAMD21 USB link.
+
+One thread does blocking bulk reads from the serial port, decodes the
+stream (ASCII lines or binary packets, see hostlink.py) and hands frames
+out two ways:
+
+    reader = BusReader(ser, link)
+    reader.start()
+
+    frame = reader.get(timeout=1.0)                  # thread-safe queue
+    token = reader.subscribe(on_telem, cmd_ids={0xA0D0})   # callbacks
+    ...
+    reader.unsubscribe(token)
+    reader.stop()
+
+Receive latency is bounded by the USB transfer, not by a poll interval.
+Callbacks run on the reader thread and must return quickly.
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+import crc16 as crc
+import hostlink
+import metrics
+from frame import DJIFrame
+
+READ_TIMEOUT = 0.05   # Serial read timeout; bounds how long stop() waits
+QUEUE_SIZE = 10000    # Frames buffered for get() before new ones are dropped
+
+
+class Subscription:
+    """A callback plus the command IDs it wants (None = all)"""
+
+    __slots__ = ('callback', 'cmd_ids', 'packets')
+
+    def __init__(self, callback, cmd_ids=None, packets=False):
+        self.callback = callback
+        self.cmd_ids = None if cmd_ids is None else frozenset(cmd_ids)
+        self.packets = packets  # Also receive non-frame packets (device text, TX echoes)
+
+    def wants(self, cmd_id):
+        return self.cmd_ids is None or cmd_id in self.cmd_ids
+
+
+class BusReader:
+    """Reader thread feeding a frame queue and cmd_id-filtered subscriptions"""
+
+    def __init__(self, ser, link: str = hostlink.ASCII, validate: Optional[str] = None,
+                 stats: Optional[crc.FrameStats] = None, queue_size: int = QUEUE_SIZE):
+        self.ser = ser
+        self.link = link
+        self.validate = validate
+        self.stats = stats
+        self.frames: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._decoder = hostlink.make_decoder(link)
+        self._subs = {}
+        self._next_token = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._saved_timeout = None  # The caller's ser.timeout while the reader runs
+
+        # Counters
+        self.bytes_read = 0
+        self.frame_count = 0
+        self.dropped = 0          # Frames discarded because the queue was full
+        self.callback_errors = 0
+        self.error: Optional[BaseException] = None  # Set if the port failed
+        self.on_error: Optional[Callable[[BaseException], None]] = None  # Then called on the reader thread
+
+    # ---- Lifecycle -----------------------------------------------------
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._saved_timeout = self.ser.timeout
+        self.ser.timeout = READ_TIMEOUT
+        self._thread = threading.Thread(target=self._run, name='BusReader', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+            try:
+                self.ser.timeout = self._saved_timeout  # Blocking reads work as before again
+            except Exception:
+                pass  # Port already closed or gone
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def set_link(self, link: str):
+        """Switch decoders after the link mode changed (call while stopped)."""
+        self.link = link
+        self._decoder = hostlink.make_decoder(link)
+
+    # ---- Consumers -----------------------------------------------------
+
+    def subscribe(self, callback: Callable, cmd_ids: Optional[Iterable[int]] = None,
+                  packets: bool = False) -> int:
+        """
+        Call callback(frame, packet) for every frame whose cmd_id is in cmd_ids.
+
+        With packets=True the callback also gets callback(None, packet) for
+        non-frame traffic. Returns a token for unsubscribe().
+        """
+        with self._lock:
+            token = self._next_token
+            self._next_token += 1
+            subs = dict(self._subs)
+            subs[token] = Subscription(callback, cmd_ids, packets)
+            self._subs = subs  # Swap, so the reader iterates without the lock
+        return token
+
+    def unsubscribe(self, token: int):
+        with self._lock:
+            subs = dict(self._subs)
+            subs.pop(token, None)
+            self._subs = subs
+
+    def get(self, timeout: Optional[float] = None) -> Optional[DJIFrame]:
+        """Next queued frame, or None after timeout."""
+        try:
+            return self.frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self):
+        """Discard queued frames."""
+        while True:
+            try:
+                self.frames.get_nowait()
+            except queue.Empty:
+                return
+
+    # ---- Reader thread -------------------------------------------------
+
+    def _run(self):
+        ser = self.ser
+        usb_errors = self._decoder.errors
+        while not self._stop.is_set():
+            try:
+                # Blocks until data or READ_TIMEOUT; takes everything already buffered
+                waiting = ser.in_waiting
+                data = ser.read(waiting or 1)
+            except Exception as e:  # Port closed or device unplugged
+                if not self._stop.is_set():
+                    self.error = e
+                    if self.on_error is not None:
+                        self.on_error(e)
+                return
+            metrics.read_done(len(data), waiting)
+            if data:
+                self.bytes_read += len(data)
+                for packet in self._decoder.feed(data):
+                    self._dispatch(packet)
+                errors = self._decoder.errors
+                if errors != usb_errors:  # Lower after set_link() replaced the decoder
+                    if errors > usb_errors:
+                        metrics.USB_ERRORS.inc(errors - usb_errors)
+                    usb_errors = errors
+
+    def _dispatch(self, packet):
+        subs = self._subs
+        frame = None
+        if packet.type == hostlink.FRAME:
+            frame = DJIFrame.decode(packet.data, self.validate, self.stats)
+            if frame is None:
+                metrics.DECODE_FAILURES.labels('frame').inc()
+                return
+            self.frame_count += 1
+            metrics.count_frame(frame.cmd_id)
+            try:
+                self.frames.put_nowait(frame)
+            except queue.Full:
+                self.dropped += 1
+        elif packet.type == hostlink.PARTIAL:
+            metrics.PARTIALS.inc()
+
+        for sub in subs.values():
+            if frame is not None:
+                if not sub.wants(frame.cmd_id):
+                    continue
+            elif not sub.packets:
+                continue
+            try:
+                sub.callback(frame, packet)
+            except Exception:
+                self.callback_errors += 1
+
+    def wait(self, duration: Optional[float] = None):
+        """Block the caller for duration seconds (or until the reader stops)."""
+        end = None if duration is None else time.monotonic() + duration
+        while self.running:
+            remaining = None if end is None else end - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return
+            self._stop.wait(0.2 if remaining is None else min(0.2, remaining))
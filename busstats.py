@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Periodic on-device bus statistics (STATS <ms>) and their time series.
+
+busprint.ino counts every frame it sees on the bus per cmd_id, before
+the FILTER command drops any. With "STATS <ms>" it sends one record per
+active command ID every <ms> milliseconds, and ends each interval with a
+'*' record:
+
+    STATUS,<ms>,BUS,<interval_ms>,<cmd>,<frames>,<bytes>,<bad_crc>,<truncated>,<over_length>,<min_gap_us>,<max_gap_us>
+
+    STATUS,120000,BUS,10000,A0D0,1150,29900,1150,0,0,8452,8790
+    STATUS,120000,BUS,10000,A021,125,4500,125,0,0,79800,80200
+    STATUS,120000,BUS,10000,*,0,12,0,1,0,0,0
+
+Counts are for that interval only. Gaps are start-to-start times between
+consecutive frames of the same ID, in micros(); 0 means fewer than two
+frames. The '*' record counts what could not be attributed to an ID:
+partial frames too short to carry one, and IDs beyond the firmware's
+16-entry table. "STATS 0" stops the records. "STATS" on its own still
+answers the one-line STATUS summary.
+
+The records start with STATUS, so buslog.py logs them to the .log
+without changes. The logger also collects them into a StatsSeries.
+Together with a FILTER that drops most frames (e.g. "FILTER ALLOW"),
+long soak tests can be monitored without logging every frame:
+
+    python3 buslog.py -o soak --filter ALLOW --stats-interval 10
+    python3 busstats.py soak.log                  # per-command rates and errors
+    python3 busstats.py soak.log --csv soak_stats.csv
+    python3 busstats.py soak.log --follow         # while the logger runs
+
+BusCounters is the firmware's counting logic, used by simbus.py.
+"""
+
+import csv
+import sys
+import time
+from collections import namedtuple
+
+import crc16 as crc
+import hostlink
+from framing import MAX_LENGTH, MIN_LENGTH
+
+PREFIX = 'STATUS,'
+TAG = 'BUS'
+ANY = None           # cmd_id of the '*' record
+MAX_IDS = 16         # MAX_STAT_IDS in busprint.ino
+MIN_INTERVAL_MS = 100
+
+FIELDS = ('frames', 'bytes', 'bad_crc', 'truncated', 'over_length', 'min_gap_us', 'max_gap_us')
+ERRORS = ('bad_crc', 'truncated', 'over_length')
+
+BusStats = namedtuple('BusStats', ('timestamp_ms', 'interval_ms', 'cmd_id') + FIELDS)
+
+
+def parse_record(text):
+    """BusStats from a STATUS,<ms>,BUS,... line (also a .log [STATUS] line), else None."""
+    start = text.find(PREFIX)
+    if start < 0:
+        return None
+    parts = text[start:].strip().split(',')
+    if len(parts) != 5 + len(FIELDS) or parts[2] != TAG:
+        return None
+    try:
+        cmd_id = ANY if parts[4] == '*' else int(parts[4], 16)
+        values = [int(v) for v in parts[5:]]
+        return BusStats(int(parts[1]), int(parts[3]), cmd_id, *values)
+    except ValueError:
+        return None
+
+
+def format_record(rec):
+    """STATUS line for a BusStats (as the firmware sends it)."""
+    cmd = '*' if rec.cmd_id is ANY else f"{rec.cmd_id:04X}"
+    values = ','.join(str(getattr(rec, name)) for name in FIELDS)
+    return f"{PREFIX}{rec.timestamp_ms},{TAG},{rec.interval_ms},{cmd},{values}"
+
+
+def interval_command(seconds):
+    """STATS command for an interval in seconds (0 or None stops the records)."""
+    ms = int(round((seconds or 0) * 1000))
+    if ms and ms < MIN_INTERVAL_MS:
+        raise ValueError(f"stats interval must be at least {MIN_INTERVAL_MS / 1000:g}s")
+    return f"STATS {ms}"
+
+
+def configure(ser, link, seconds, timeout=1.0):
+    """
+    Set the record interval on the device. Returns the interval in ms the
+    device confirmed, or None if it did not answer (older firmware).
+    Call it while no reader thread is running (see hostlink.request).
+    """
+    reply = hostlink.request(ser, interval_command(seconds), link,
+                             lambda text: 'STATS_INTERVAL=' in text, timeout)
+    if reply is None:
+        return None
+    return int(reply.rsplit('=', 1)[1])
+
+
+# ---- Device side (firmware model) ---------------------------------------
+
+
+class _Counter:
+    __slots__ = FIELDS + ('last_start_us',)
+
+    def __init__(self):
+        self.last_start_us = None
+        self.clear()
+
+    def clear(self):
+        for name in FIELDS:
+            setattr(self, name, 0)
+
+    def gap(self, start_us):
+        if self.last_start_us is not None:
+            gap = start_us - self.last_start_us
+            if not self.min_gap_us or gap < self.min_gap_us:
+                self.min_gap_us = gap
+            if gap > self.max_gap_us:
+                self.max_gap_us = gap
+        self.last_start_us = start_us
+
+
+class BusCounters:
+    """Per-cmd_id counters as kept by busprint.ino (16 IDs plus '*')"""
+
+    def __init__(self):
+        self._ids = {}
+        self._other = _Counter()
+
+    def _counter(self, data):
+        cmd_id = crc.frame_cmd_id(data)
+        if cmd_id is None:
+            return self._other
+        counter = self._ids.get(cmd_id)
+        if counter is None:
+            if len(self._ids) >= MAX_IDS:
+                return self._other
+            counter = self._ids[cmd_id] = _Counter()
+        return counter
+
+    def frame(self, data, start_us):
+        """A frame completed at its length byte."""
+        counter = self._counter(data)
+        counter.frames += 1
+        counter.bytes += len(data)
+        if not crc.check_frame(data):
+            counter.bad_crc += 1
+        counter.gap(start_us)
+
+    def partial(self, data):
+        """A frame cut off by the idle gap (or abandoned for an impossible length byte)."""
+        counter = self._counter(data)
+        counter.bytes += len(data)
+        if len(data) >= 2 and not MIN_LENGTH <= data[1] <= MAX_LENGTH:
+            counter.over_length += 1
+        else:
+            counter.truncated += 1
+
+    def records(self, timestamp_ms, interval_ms):
+        """BusStats for the interval that just ended (then start a new one)."""
+        out = []
+        for cmd_id, counter in self._ids.items():
+            if counter.frames or counter.bytes:
+                out.append(BusStats(timestamp_ms, interval_ms, cmd_id,
+                                    *(getattr(counter, name) for name in FIELDS)))
+                counter.clear()
+        other = self._other
+        out.append(BusStats(timestamp_ms, interval_ms, ANY, *(getattr(other, name) for name in FIELDS)))
+        other.clear()
+        return out
+
+
+# ---- Host side ------------------------------------------------------------
+
+
+class StatsSeries:
+    """BusStats records collected over a session, per cmd_id"""
+
+    def __init__(self):
+        self.records = []
+        self.intervals = 0  # Completed intervals ('*' records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, rec):
+        """Add a record; returns True when it completes an interval."""
+        self.records.append(rec)
+        if rec.cmd_id is ANY:
+            self.intervals += 1
+            return True
+        return False
+
+    def feed_line(self, text):
+        """Add the record in a device line, if it is one; returns it (or None)."""
+        rec = parse_record(text)
+        if rec is not None:
+            self.add(rec)
+        return rec
+
+    @property
+    def cmd_ids(self):
+        ids = {r.cmd_id for r in self.records if r.cmd_id is not ANY}
+        return sorted(ids)
+
+    def series(self, cmd_id):
+        """Records of one cmd_id (ANY for the '*' records), in time order."""
+        return [r for r in self.records if r.cmd_id == cmd_id]
+
+    def rates(self, cmd_id):
+        """(timestamp_ms, frames/s) per interval for cmd_id."""
+        return [(r.timestamp_ms, r.frames * 1000.0 / r.interval_ms)
+                for r in self.series(cmd_id) if r.interval_ms]
+
+    def last_interval(self):
+        """Records of the latest complete interval."""
+        for i in range(len(self.records) - 1, -1, -1):
+            if self.records[i].cmd_id is ANY:
+                ms = self.records[i].timestamp_ms
+                j = i
+                while j > 0 and self.records[j - 1].timestamp_ms == ms and \
+                        self.records[j - 1].cmd_id is not ANY:
+                    j -= 1
+                return self.records[j:i + 1]
+        return []
+
+    def status_line(self):
+        """One console line for the latest interval."""
+        recs = self.last_interval()
+        if not recs:
+            return ""
+        rates = [f"{_name(r.cmd_id)} {r.frames * 1000.0 / r.interval_ms:.1f}/s"
+                 for r in recs if r.cmd_id is not ANY and r.interval_ms]
+        errors = sum(getattr(r, name) for r in recs for name in ERRORS)
+        return f"  Bus @{recs[-1].timestamp_ms / 1000:.1f}s: {'  '.join(rates) or 'idle'}  errors {errors}"
+
+    def report(self):
+        """Summary lines: per cmd_id rates, errors and gaps over the whole series."""
+        if not self.records:
+            return ["  No bus statistics records"]
+        span = (self.records[-1].timestamp_ms - self.records[0].timestamp_ms
+                + self.records[0].interval_ms) / 1000.0
+        lines = [f"  {self.intervals} intervals over {span:.1f}s",
+                 f"  {'CMD':6s} {'frames':>9s} {'mean/s':>8s} {'min/s':>8s} {'max/s':>8s} "
+                 f"{'bad_crc':>8s} {'trunc':>7s} {'overlen':>7s} {'gap min':>9s} {'gap max':>9s}"]
+        for cmd_id in self.cmd_ids + [ANY]:
+            recs = self.series(cmd_id)
+            if not recs:
+                continue
+            rates = [r.frames * 1000.0 / r.interval_ms for r in recs if r.interval_ms]
+            total = {name: sum(getattr(r, name) for r in recs) for name in FIELDS[:5]}
+            if cmd_id is ANY and not any(total.values()):
+                continue
+            gaps_min = [r.min_gap_us for r in recs if r.min_gap_us]
+            gaps_max = [r.max_gap_us for r in recs if r.max_gap_us]
+            gap_min = f"{min(gaps_min) / 1000:.3f}ms" if gaps_min else "-"
+            gap_max = f"{max(gaps_max) / 1000:.3f}ms" if gaps_max else "-"
+            mean = total['frames'] / span if span else 0.0
+            lines.append(
+                f"  {_name(cmd_id):6s} {total['frames']:9d} {mean:8.1f} "
+                f"{min(rates, default=0):8.1f} {max(rates, default=0):8.1f} "
+                f"{total['bad_crc']:8d} {total['truncated']:7d} {total['over_length']:7d} "
+                f"{gap_min:>9s} {gap_max:>9s}")
+        return lines
+
+    def write_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(BusStats._fields)
+            for r in self.records:
+                cmd = '*' if r.cmd_id is ANY else f"0x{r.cmd_id:04X}"
+                writer.writerow([r.timestamp_ms, r.interval_ms, cmd] +
+                                [getattr(r, name) for name in FIELDS])
+
+
+def _name(cmd_id):
+    return '*' if cmd_id is ANY else f"{cmd_id:04X}"
+
+
+def load_log(path):
+    """StatsSeries from the [STATUS] lines of a buslog .log (also .log.gz / .zst)."""
+    import segments
+
+    series = StatsSeries()
+    with segments.open_text(path) as f:
+        for line in f:
+            if line.startswith('[STATUS]'):
+                series.feed_line(line)
+    return series
+
+
+def follow(path, poll=1.0):
+    """Print each interval of a growing .log as the logger writes it."""
+    series = StatsSeries()
+    with open(path) as f:
+        while True:
+            line = f.readline()
+            if not line:
+                time.sleep(poll)
+                continue
+            if line.startswith('[STATUS]'):
+                rec = series.feed_line(line)
+                if rec is not None and rec.cmd_id is ANY:
+                    print(series.status_line(), flush=True)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Bus statistics records from a buslog .log')
+    parser.add_argument('log', help='.log written by buslog.py (STATS records as [STATUS] lines)')
+    parser.add_argument('--csv', help='Write the records as a CSV time series')
+    parser.add_argument('--follow', action='store_true',
+                        help='Keep reading the log and print every new interval')
+    args = parser.parse_args()
+
+    if args.follow:
+        try:
+            follow(args.log)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    series = load_log(args.log)
+    print(f"{args.log}: {len(series)} bus statistics records")
+    print("\n".join(series.report()))
+    if args.csv:
+        series.write_csv(args.csv)
+        print(f"✓ {args.csv}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of decoded captures.
+
+capload.load_capture() stores the columnar form of every capture it
+parses as an .npz file in a cache directory, keyed by the SHA-256 of the
+capture file contents and capload.DECODER_VERSION. Editing a capture
+changes its hash and bumping DECODER_VERSION changes every key, so stale
+entries are never read; they simply age out. The directory is capped in
+size and the least recently used entries are evicted first.
+
+Environment:
+    DJIESC_CACHE_DIR     cache directory (default: .capcache next to this file)
+    DJIESC_CACHE_MAX_MB  size cap in MB (default: 512)
+    DJIESC_CACHE=0       disable the cache
+
+Usage:
+    python3 capcache.py info
+    python3 capcache.py clear
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_DIR = Path(__file__).resolve().parent / '.capcache'
+DEFAULT_MAX_MB = 512
+SUFFIX = '.npz'
+
+
+def enabled():
+    """False when DJIESC_CACHE=0 is set."""
+    return os.environ.get('DJIESC_CACHE', '1') not in ('0', 'no', 'off')
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 hex digest of a file's contents."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DecodeCache:
+    """Directory of .npz column sets with a total size cap and LRU eviction"""
+
+    def __init__(self, directory=None, max_bytes=None):
+        if directory is None:
+            directory = os.environ.get('DJIESC_CACHE_DIR', DEFAULT_DIR)
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get('DJIESC_CACHE_MAX_MB', DEFAULT_MAX_MB)) * 1024 * 1024)
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(digest, version):
+        return f"{digest}-v{version}"
+
+    def path_for(self, key):
+        return self.directory / (key + SUFFIX)
+
+    def get(self, key):
+        """Return the cached dict of arrays for key, or None on a miss."""
+        path = self.path_for(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                columns = {name: data[name] for name in data.files}
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile):
+            # Truncated or corrupt: treat as a miss and drop it so it is rebuilt
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(path)  # mtime records last use for LRU
+        except OSError:
+            pass
+        return columns
+
+    def put(self, key, columns):
+        """Store a dict of arrays under key, then evict down to the size cap."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix=SUFFIX, dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **columns)
+            os.replace(tmp, self.path_for(key))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        self.evict()
+
+    def entries(self):
+        """Cache files as (path, size, last_used), least recently used first."""
+        if not self.directory.is_dir():
+            return []
+        entries = []
+        for path in self.directory.glob('*' + SUFFIX):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((path, st.st_size, st.st_mtime))
+        entries.sort(key=lambda e: e[2])
+        return entries
+
+    def size(self):
+        return sum(e[1] for e in self.entries())
+
+    def evict(self, max_bytes=None):
+        """Delete least recently used entries until the total fits max_bytes."""
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        return self.evict(0)
+
+
+def main():
+    """Show or clear the decode cache."""
+    if len(sys.argv) < 2 or sys.argv[1] not in ('info', 'clear'):
+        print("Usage: python3 capcache.py info|clear")
+        return 1
+
+    cache = DecodeCache()
+    if sys.argv[1] == 'clear':
+        print(f"Removed {cache.clear()} entries from {cache.directory}")
+        return 0
+
+    entries = cache.entries()
+    total = sum(e[1] for e in entries)
+    print(f"{cache.directory}: {len(entries)} entries, "
+          f"{total / 1024 / 1024:.1f} / {cache.max_bytes / 1024 / 1024:.0f} MB")
+    for path, size, _ in reversed(entries):
+        print(f"  {path.name}  {size / 1024:.0f} KB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
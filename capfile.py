@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Binary capture container for DJI ESC bus logs (.djicap).
+
+Compact replacement for the .log/.csv pair written by buslog.py. Frames
+are stored once as raw bytes with their device timestamp, followed by a
+footer index that a memory-mapped reader can binary-search by time and
+command ID.
+
+Layout (all little-endian):
+
+    Header   magic 'DJICAP01', version u16, flags u16, tick_us u32
+    Records  timestamp u64 (ticks), length u8, raw frame bytes
+    Index    one entry per record, sorted by timestamp:
+                 timestamp u64, cmd_id u16, record offset u64
+    Cmd dir  cmd_id u16, first u32, count u32   (one per command ID)
+    Cmd idx  u32 entry numbers into the index, grouped per command ID
+    Trailer  index offset u64, record count u32, cmd count u32,
+             cmd dir offset u64, magic 'DJICAPIX'
+
+tick_us is the timestamp unit in microseconds (1000 = milliseconds, as
+sent by busprint.ino). A file without a trailer (logger killed before
+close) is still readable: the reader rebuilds the index by scanning the
+records.
+
+Usage:
+    python3 capfile.py convert captures/cap3.csv       # -> captures/cap3.djicap
+    python3 capfile.py info captures/cap3.djicap
+    python3 capfile.py dump captures/cap3.djicap --start 69000 --end 69500 --cmd 0xA021
+"""
+
+import csv
+import io
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from pathlib import Path
+
+from frame import DJIFrame
+
+MAGIC = b'DJICAP01'
+INDEX_MAGIC = b'DJICAPIX'
+VERSION = 1
+EXTENSION = '.djicap'
+
+HEADER = struct.Struct('<8sHHI')
+RECORD = struct.Struct('<QB')
+INDEX_ENTRY = struct.Struct('<QHQ')
+CMD_DIR_ENTRY = struct.Struct('<HII')
+CMD_ENTRY = struct.Struct('<I')
+TRAILER = struct.Struct('<QIIQ8s')
+
+TICK_MS = 1000  # tick_us for millisecond timestamps
+TICK_US = 1     # tick_us for microsecond timestamps (buslog.py)
+
+Record = namedtuple('Record', ['timestamp', 'frame'])
+
+
+class CaptureWriter:
+    """Append frames to a .djicap file; the index is written on close()"""
+
+    def __init__(self, path, tick_us=TICK_MS):
+        self.path = Path(path)
+        self.tick_us = tick_us
+        self.file = open(self.path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, 0, tick_us))
+        self.offset = HEADER.size
+
+        # In-memory index (compact typed arrays)
+        self.timestamps = array('Q')
+        self.cmd_ids = array('H')
+        self.offsets = array('Q')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def write(self, timestamp, raw):
+        """Append one frame (raw bytes as received) with its device timestamp."""
+        n = len(raw)
+        if n > 255:
+            raise ValueError(f"frame too long for capture record ({n} bytes)")
+
+        self.file.write(RECORD.pack(timestamp, n))
+        self.file.write(raw)
+
+        self.timestamps.append(timestamp)
+        self.cmd_ids.append(raw[3] | (raw[4] << 8) if n >= 5 else 0)
+        self.offsets.append(self.offset)
+        self.offset += RECORD.size + n
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        """Write the footer index and close the file."""
+        if self.file is None:
+            return
+        write_index(self.file, self.offset, self.timestamps, self.cmd_ids, self.offsets)
+        self.file.close()
+        self.file = None
+
+
+def write_index(f, index_offset, timestamps, cmd_ids, offsets):
+    """Write index, command directory and trailer at index_offset."""
+    order = sorted(range(len(offsets)), key=timestamps.__getitem__)
+
+    f.seek(index_offset)
+    by_cmd = {}
+    for entry, i in enumerate(order):
+        f.write(INDEX_ENTRY.pack(timestamps[i], cmd_ids[i], offsets[i]))
+        by_cmd.setdefault(cmd_ids[i], array('I')).append(entry)
+
+    cmd_dir_offset = index_offset + len(order) * INDEX_ENTRY.size
+    first = 0
+    for cmd_id in sorted(by_cmd):
+        f.write(CMD_DIR_ENTRY.pack(cmd_id, first, len(by_cmd[cmd_id])))
+        first += len(by_cmd[cmd_id])
+    for cmd_id in sorted(by_cmd):
+        f.write(by_cmd[cmd_id].tobytes() if sys.byteorder == 'little'
+                else b''.join(CMD_ENTRY.pack(e) for e in by_cmd[cmd_id]))
+
+    f.write(TRAILER.pack(index_offset, len(order), len(by_cmd), cmd_dir_offset, INDEX_MAGIC))
+    f.truncate()
+
+
+class CaptureReader:
+    """
+    Memory-mapped .djicap reader.
+
+    Frames are DJIFrame objects referencing the mapped file, so nothing is
+    copied until a field is used. Time-window queries binary-search the
+    footer index: O(log n) to find the window, then O(k) to walk it.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.file = open(self.path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, self.tick_us = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a {EXTENSION} capture")
+        if version > VERSION:
+            raise ValueError(f"{path}: unsupported capture version {version}")
+
+        self.index = None
+        if len(self.mm) >= HEADER.size + TRAILER.size:
+            trailer = TRAILER.unpack_from(self.mm, len(self.mm) - TRAILER.size)
+            if trailer[4] == INDEX_MAGIC:
+                self._attach_index(self.mm, *trailer[:4])
+                self.records_end = trailer[0]
+
+        if self.index is None:
+            self._rebuild_index()
+
+    def _attach_index(self, buf, index_offset, count, cmd_count, cmd_dir_offset):
+        """Map the index and per-command entry lists stored in buf."""
+        view = memoryview(buf)
+        self.count = count
+        self.index = view[index_offset:cmd_dir_offset]
+        self.cmd_entries = {}
+        entries_base = cmd_dir_offset + cmd_count * CMD_DIR_ENTRY.size
+        for i in range(cmd_count):
+            cmd_id, first, n = CMD_DIR_ENTRY.unpack_from(buf, cmd_dir_offset + i * CMD_DIR_ENTRY.size)
+            start = entries_base + first * CMD_ENTRY.size
+            self.cmd_entries[cmd_id] = view[start:start + n * CMD_ENTRY.size].cast('I')
+
+    def _rebuild_index(self):
+        """Scan records of an unterminated file and build the index in memory."""
+        timestamps, cmd_ids, offsets = array('Q'), array('H'), array('Q')
+        pos, end = HEADER.size, len(self.mm)
+        while pos + RECORD.size <= end:
+            timestamp, n = RECORD.unpack_from(self.mm, pos)
+            if pos + RECORD.size + n > end:
+                break  # Partial last record
+            raw = pos + RECORD.size
+            timestamps.append(timestamp)
+            cmd_ids.append(self.mm[raw + 3] | (self.mm[raw + 4] << 8) if n >= 5 else 0)
+            offsets.append(pos)
+            pos = raw + n
+        self.records_end = pos
+
+        buf = io.BytesIO()
+        write_index(buf, 0, timestamps, cmd_ids, offsets)
+        data = buf.getvalue()
+        self._attach_index(data, *TRAILER.unpack_from(data, len(data) - TRAILER.size)[:4])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.index = None
+        self.cmd_entries = {}
+        try:
+            self.mm.close()
+        except BufferError:
+            pass  # Frames still reference the map; it closes when they are gone
+        self.file.close()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def cmd_ids(self):
+        """Command IDs present in the capture."""
+        return sorted(self.cmd_entries)
+
+    def entry(self, i):
+        """Index entry i (timestamp order): (timestamp, cmd_id, record offset)."""
+        return INDEX_ENTRY.unpack_from(self.index, i * INDEX_ENTRY.size)
+
+    def timestamp(self, i):
+        return INDEX_ENTRY.unpack_from(self.index, i * INDEX_ENTRY.size)[0]
+
+    def record_at(self, offset):
+        """Record stored at a file offset."""
+        timestamp, n = RECORD.unpack_from(self.mm, offset)
+        start = offset + RECORD.size
+        return Record(timestamp, DJIFrame.from_buffer(self.mm, start, start + n))
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return self.record_at(self.entry(i)[2])
+
+    def __iter__(self):
+        """All records in timestamp order."""
+        for i in range(self.count):
+            yield self.record_at(self.entry(i)[2])
+
+    def bisect(self, timestamp):
+        """First index entry with timestamp >= the given one (O(log n))."""
+        return bisect_left(_TimestampView(self), timestamp)
+
+    def window(self, start, end, cmd_id=None):
+        """Yield records with start <= timestamp < end, optionally of one command."""
+        if cmd_id is None:
+            i = self.bisect(start)
+            while i < self.count:
+                timestamp, _, offset = self.entry(i)
+                if timestamp >= end:
+                    break
+                yield self.record_at(offset)
+                i += 1
+            return
+
+        entries = self.cmd_entries.get(cmd_id)
+        if entries is None:
+            return
+        keyed = _CmdTimestampView(self, entries)
+        j = bisect_left(keyed, start)
+        while j < len(entries):
+            timestamp, _, offset = self.entry(entries[j])
+            if timestamp >= end:
+                break
+            yield self.record_at(offset)
+            j += 1
+
+    def count_cmd(self, cmd_id):
+        entries = self.cmd_entries.get(cmd_id)
+        return 0 if entries is None else len(entries)
+
+
+class _TimestampView:
+    """Sequence view of index timestamps, for bisect"""
+
+    def __init__(self, reader):
+        self.reader = reader
+
+    def __len__(self):
+        return self.reader.count
+
+    def __getitem__(self, i):
+        return self.reader.timestamp(i)
+
+
+class _CmdTimestampView:
+    """Sequence view of one command's timestamps, for bisect"""
+
+    def __init__(self, reader, entries):
+        self.reader = reader
+        self.entries = entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, j):
+        return self.reader.timestamp(self.entries[j])
+
+
+def convert_csv(csv_path, out_path=None):
+    """Convert a buslog.py capture CSV to .djicap. Returns the output path."""
+    csv_path = Path(csv_path)
+    out_path = Path(out_path) if out_path else csv_path.with_suffix(EXTENSION)
+
+    with open(csv_path, newline='') as f, CaptureWriter(out_path, TICK_MS) as writer:
+        for row in csv.DictReader(f):
+            try:
+                raw = bytes.fromhex(row['raw_hex'])
+                timestamp = int(row['timestamp_ms'])
+            except (KeyError, ValueError):
+                continue
+            writer.write(timestamp, raw)
+
+    return out_path
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='DJI ESC binary capture tool')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('convert', help='Convert capture CSV files to .djicap')
+    p.add_argument('csv_files', nargs='+')
+    p.add_argument('-o', '--output', help='Output path (single input only)')
+
+    p = sub.add_parser('info', help='Show capture summary')
+    p.add_argument('capture')
+
+    p = sub.add_parser('dump', help='Print frames in a time window')
+    p.add_argument('capture')
+    p.add_argument('--start', type=int, default=0, help='Start timestamp (ticks)')
+    p.add_argument('--end', type=int, default=2**64 - 1, help='End timestamp (ticks, exclusive)')
+    p.add_argument('--cmd', type=lambda s: int(s, 0), help='Command ID filter (e.g. 0xA021)')
+
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        if args.output and len(args.csv_files) > 1:
+            print("ERROR: -o only works with a single input file")
+            return 1
+        for csv_path in args.csv_files:
+            out_path = convert_csv(csv_path, args.output)
+            ratio = os.path.getsize(csv_path) / max(os.path.getsize(out_path), 1)
+            print(f"✓ {csv_path} -> {out_path} ({ratio:.1f}x smaller)")
+
+    elif args.command == 'info':
+        with CaptureReader(args.capture) as reader:
+            print(f"{args.capture}: {len(reader)} frames, tick={reader.tick_us}us")
+            if len(reader):
+                print(f"  Time range: {reader.timestamp(0)} - {reader.timestamp(len(reader) - 1)}")
+            for cmd_id in reader.cmd_ids:
+                print(f"  0x{cmd_id:04X}: {reader.count_cmd(cmd_id)} frames")
+
+    elif args.command == 'dump':
+        with CaptureReader(args.capture) as reader:
+            for timestamp, frame in reader.window(args.start, args.end, args.cmd):
+                print(f"[{timestamp:010d}] {bytes(frame.raw).hex(' ').upper()}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Columnar NumPy loader for DJI ESC captures.
+
+Parses a capture once into flat arrays (timestamp_ms, cmd_id, sequence,
+length, and start_us/end_us where the firmware stamped them) plus a zero-padded uint8 matrix of raw frames, and splits it per
+command into fixed-width payload matrices. Payload fields are decoded
+with structured dtype views instead of per-row struct.unpack:
+
+    cap = load_capture('captures/cap3.csv')
+    a021 = cap.command(0xA021)
+    fields = a021_fields(a021)          # fields['arm_flag'], fields['state'], ...
+    words = a0d0_words(cap.command(0xA0D0))   # (n, 8) uint16
+
+Accepts buslog.py CSVs (also .csv.gz / .csv.zst), decode.py CSVs (raw_hex
+column), .djicap files and the manifest of a rotated buslog.py session.
+Decoded captures are kept in an on-disk cache (see capcache.py), so
+repeated runs over the same file skip parsing entirely.
+"""
+
+import csv
+import json
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+import capcache
+import capfile
+import framing
+import segments
+
+HEADER_SIZE = framing.HEADER_SIZE
+
+# Bump whenever parsing or the Capture columns change; invalidates the cache
+DECODER_VERSION = 2
+
+# 0xA0D0 payload: eight u16 words
+A0D0_DTYPE = np.dtype([('words', '<u2', (8,))])
+
+# 0xA021 payload (26 bytes), see THROTTLE_PROTOCOL.md
+A021_DTYPE = np.dtype([
+    ('unknown_a', '<u2'),
+    ('throttle1', '<u2'),
+    ('unknown_b', '<u2'),
+    ('throttle2', '<u2'),
+    ('throttle3', '<u2'),
+    ('throttle4', '<u2'),
+    ('zeros_12', 'V3'),
+    ('arm_flag', 'u1'),
+    ('counter', '<u2'),
+    ('zeros_18', 'V2'),
+    ('word_20', '<u2'),
+    ('state', 'u1'),
+    ('unknown_c', 'V3'),
+])
+
+# Named time window [start_ms, end_ms); windows may overlap
+Phase = namedtuple('Phase', ['name', 'start_ms', 'end_ms'])
+
+
+class TimeIndex:
+    """
+    Sorted-timestamp index: positions with start <= t < end in O(log n + k).
+
+    Timestamps that are already in order (the normal case) are used as-is;
+    otherwise a stable argsort is kept and positions are mapped back through it.
+    """
+
+    def __init__(self, timestamp_ms):
+        ts = np.asarray(timestamp_ms)
+        self.order = None
+        if len(ts) > 1 and np.any(ts[1:] < ts[:-1]):
+            self.order = np.argsort(ts, kind='stable')
+            ts = ts[self.order]
+        self.sorted = ts
+
+    def __len__(self):
+        return len(self.sorted)
+
+    def span(self, start_ms, end_ms):
+        """(lo, hi) bounds of [start_ms, end_ms) in sorted order."""
+        lo, hi = np.searchsorted(self.sorted, [start_ms, end_ms], side='left')
+        return int(lo), int(max(lo, hi))
+
+    def count(self, start_ms, end_ms):
+        lo, hi = self.span(start_ms, end_ms)
+        return hi - lo
+
+    def select(self, start_ms, end_ms):
+        """Positions (into the indexed array) of timestamps in [start_ms, end_ms), in time order."""
+        lo, hi = self.span(start_ms, end_ms)
+        if self.order is None:
+            return slice(lo, hi)
+        return self.order[lo:hi]
+
+    def select_many(self, phases):
+        """[(phase, positions)] for many possibly overlapping windows, one searchsorted call."""
+        phases = [Phase(*p) for p in phases]
+        if not phases:
+            return []
+        bounds = np.searchsorted(self.sorted, [t for p in phases for t in (p.start_ms, p.end_ms)],
+                                 side='left').reshape(-1, 2)
+        result = []
+        for phase, (lo, hi) in zip(phases, bounds.tolist()):
+            hi = max(lo, hi)
+            result.append((phase, slice(lo, hi) if self.order is None else self.order[lo:hi]))
+        return result
+
+
+def load_phases(path, section=None):
+    """
+    Load named phase windows from a JSON file.
+
+    The file holds a list of {"name", "start_ms", "end_ms"} objects (or
+    [name, start_ms, end_ms] lists), or an object mapping section names to
+    such lists, in which case section picks one.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        if section is None:
+            if len(data) != 1:
+                raise ValueError(f"{path}: choose a phase section: {', '.join(data)}")
+            section = next(iter(data))
+        if section not in data:
+            raise ValueError(f"{path}: no phase section '{section}'")
+        data = data[section]
+
+    phases = []
+    for entry in data:
+        if isinstance(entry, dict):
+            phase = Phase(entry['name'], entry['start_ms'], entry['end_ms'])
+        else:
+            phase = Phase(*entry)
+        if phase.end_ms < phase.start_ms:
+            raise ValueError(f"{path}: phase '{phase.name}' ends before it starts")
+        phases.append(phase)
+    return phases
+
+
+class CommandFrames:
+    """Frames of one command ID: per-row columns + fixed-width payload matrix"""
+
+    def __init__(self, cmd_id, rows, timestamp_ms, sequence, payload, complete):
+        self.cmd_id = cmd_id
+        self.rows = rows                  # Row numbers in the full capture
+        self.timestamp_ms = timestamp_ms
+        self.sequence = sequence
+        self.payload = payload            # (n, width) uint8, C-contiguous
+        self.complete = complete          # True where the frame had the full width
+        self._index = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, mask):
+        """Subset by boolean mask or index array."""
+        return CommandFrames(self.cmd_id, self.rows[mask], self.timestamp_ms[mask],
+                             self.sequence[mask], np.ascontiguousarray(self.payload[mask]),
+                             self.complete[mask])
+
+    @property
+    def index(self):
+        """TimeIndex over timestamp_ms (built on first use)."""
+        if self._index is None:
+            self._index = TimeIndex(self.timestamp_ms)
+        return self._index
+
+    def window(self, start_ms, end_ms):
+        """Frames with start_ms <= timestamp_ms < end_ms."""
+        return self[self.index.select(start_ms, end_ms)]
+
+    def windows(self, phases):
+        """[(phase, frames)] for possibly overlapping phase windows."""
+        return [(phase, self[sel]) for phase, sel in self.index.select_many(phases)]
+
+    def view(self, dtype):
+        """Reinterpret each payload row as one record of a structured dtype."""
+        width = dtype.itemsize
+        payload = self.payload
+        if payload.shape[1] < width:
+            padded = np.zeros((len(payload), width), dtype=np.uint8)
+            padded[:, :payload.shape[1]] = payload
+            payload = padded
+        elif payload.shape[1] > width:
+            payload = np.ascontiguousarray(payload[:, :width])
+        return payload.view(dtype)[:, 0]
+
+
+class Capture:
+    """A whole capture as flat NumPy columns"""
+
+    def __init__(self, timestamp_ms, cmd_id, sequence, length, size, raw,
+                 elapsed_ms=None, frame_num=None, start_us=None, end_us=None):
+        self.timestamp_ms = timestamp_ms  # int64
+        self.cmd_id = cmd_id              # uint16
+        self.sequence = sequence          # uint8
+        self.length = length              # uint8, length byte of each frame
+        self.size = size                  # int64, bytes actually captured
+        self.raw = raw                    # (n, width) uint8, zero padded
+        if elapsed_ms is None:
+            elapsed_ms = timestamp_ms - (timestamp_ms[0] if len(timestamp_ms) else 0)
+        self.elapsed_ms = elapsed_ms
+        if frame_num is None:
+            frame_num = np.arange(1, len(timestamp_ms) + 1)
+        self.frame_num = frame_num
+        # int64 device micros() of the first/last byte, -1 where not recorded
+        if start_us is None:
+            start_us = np.full(len(timestamp_ms), -1, dtype=np.int64)
+        if end_us is None:
+            end_us = np.full(len(timestamp_ms), -1, dtype=np.int64)
+        self.start_us = start_us
+        self.end_us = end_us
+        self._commands = {}
+        self._index = None
+
+    COLUMNS = ('timestamp_ms', 'cmd_id', 'sequence', 'length', 'size', 'raw',
+               'elapsed_ms', 'frame_num', 'start_us', 'end_us')
+
+    def __len__(self):
+        return len(self.timestamp_ms)
+
+    def columns(self):
+        """Dict of the capture's arrays (what the decode cache stores)."""
+        return {name: getattr(self, name) for name in self.COLUMNS}
+
+    @classmethod
+    def from_columns(cls, columns):
+        return cls(*(columns[name] for name in cls.COLUMNS))
+
+    @property
+    def has_micros(self):
+        """True if every frame has a start_us stamp."""
+        return len(self) > 0 and bool((self.start_us >= 0).all())
+
+    @property
+    def index(self):
+        """TimeIndex over all frames (built on first use)."""
+        if self._index is None:
+            self._index = TimeIndex(self.timestamp_ms)
+        return self._index
+
+    def select(self, start_ms, end_ms, cmd_id=None):
+        """Row numbers of frames (of cmd_id, if given) in [start_ms, end_ms), in time order."""
+        if cmd_id is None:
+            return np.arange(len(self))[self.index.select(start_ms, end_ms)]
+        frames = self.command(cmd_id)
+        return frames.rows[frames.index.select(start_ms, end_ms)]
+
+    @property
+    def cmd_ids(self):
+        return [int(c) for c in np.unique(self.cmd_id)]
+
+    def command(self, cmd_id, width=None):
+        """
+        Frames of one command with a fixed-width payload matrix.
+
+        width defaults to the most common payload length for the command.
+        Shorter payloads are zero padded and marked in .complete.
+        """
+        key = (cmd_id, width)
+        if key in self._commands:
+            return self._commands[key]
+
+        rows = np.flatnonzero(self.cmd_id == cmd_id)
+        payload_len = np.minimum(self.length[rows], self.size[rows]).astype(np.int64) - HEADER_SIZE - 2
+        payload_len = np.maximum(payload_len, 0)
+        if width is None:
+            width = int(np.bincount(payload_len).argmax()) if len(rows) else 0
+
+        cols = HEADER_SIZE + np.arange(width)
+        payload = self.raw[rows[:, None], cols[None, :]] if width else \
+            np.zeros((len(rows), 0), dtype=np.uint8)
+        payload = np.ascontiguousarray(payload)
+        # Zero out bytes beyond each frame's payload (checksum / padding)
+        payload[np.arange(width)[None, :] >= payload_len[:, None]] = 0
+
+        frames = CommandFrames(cmd_id, rows, self.timestamp_ms[rows], self.sequence[rows],
+                               payload, payload_len >= width)
+        self._commands[key] = frames
+        return frames
+
+
+def a0d0_words(frames):
+    """(n, 8) uint16 telemetry words of 0xA0D0 frames."""
+    return frames.view(A0D0_DTYPE)['words']
+
+
+def a021_fields(frames):
+    """Structured array of 0xA021 payload fields (arm_flag, counter, state, ...)."""
+    return frames.view(A021_DTYPE)
+
+
+def from_raw_frames(raw_frames, timestamp_ms, elapsed_ms=None):
+    """Build a Capture from a list of raw frames (bytes-like) and timestamps."""
+    size = np.fromiter((len(r) for r in raw_frames), dtype=np.int64, count=len(raw_frames))
+    flat = np.frombuffer(b''.join(raw_frames), dtype=np.uint8)
+    return _from_flat(flat, size, np.asarray(timestamp_ms, dtype=np.int64), elapsed_ms)
+
+
+def _from_flat(flat, size, timestamp_ms, elapsed_ms=None, frame_num=None,
+               start_us=None, end_us=None):
+    """Scatter concatenated frame bytes into a padded matrix and header columns."""
+    n = len(size)
+    width = max(int(size.max(initial=0)), HEADER_SIZE + 2)
+    raw = np.zeros((n, width), dtype=np.uint8)
+    starts = np.cumsum(size) - size
+    row = np.repeat(np.arange(n), size)
+    col = np.arange(len(flat)) - np.repeat(starts, size)
+    raw[row, col] = flat
+
+    cmd_id = raw[:, 3].astype(np.uint16) | (raw[:, 4].astype(np.uint16) << 8)
+    return Capture(timestamp_ms, cmd_id, raw[:, 7].copy(), raw[:, 1].copy(), size, raw,
+                   elapsed_ms, frame_num, start_us, end_us)
+
+
+def load_csv(path):
+    """Load a buslog.py or decode.py capture CSV (optionally .gz / .zst)."""
+    with segments.open_text(path) as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = [r for r in reader if r]
+
+    col = {name: i for i, name in enumerate(header)}
+    raw_i = col['raw_hex']
+    hex_rows = [r[raw_i] for r in rows]
+
+    # One fromhex call for the whole capture; sizes from the text lengths
+    flat = np.frombuffer(bytes.fromhex(' '.join(hex_rows)), dtype=np.uint8)
+    size = np.fromiter(((len(h) + 1) // 3 for h in hex_rows), dtype=np.int64, count=len(hex_rows))
+
+    def column(name, missing=None):
+        if name not in col:
+            return None
+        i = col[name]
+        if missing is not None:  # Optional values (empty from older firmware)
+            return np.array([r[i] or missing for r in rows], dtype=np.int64)
+        return np.array([r[i] for r in rows], dtype=np.int64)
+
+    frame_num = column('frame_num')
+    timestamp_ms = column('timestamp_ms')
+    if timestamp_ms is None:  # decode.py output has no timestamps
+        timestamp_ms = frame_num if frame_num is not None else np.arange(len(rows), dtype=np.int64)
+
+    return _from_flat(flat, size, timestamp_ms, column('elapsed_ms'), frame_num,
+                      column('start_us', -1), column('end_us', -1))
+
+
+def load_djicap(path):
+    """Load a .djicap binary capture (vectorized over the footer index)."""
+    with capfile.CaptureReader(path) as reader:
+        index = np.frombuffer(reader.index, dtype=np.dtype([
+            ('timestamp', '<u8'), ('cmd_id', '<u2'), ('offset', '<u8')]))
+        data = np.frombuffer(reader.mm, dtype=np.uint8)
+
+        starts = index['offset'].astype(np.int64) + capfile.RECORD.size
+        size = data[starts - 1].astype(np.int64)
+        gather = np.repeat(starts - (np.cumsum(size) - size), size) + np.arange(int(size.sum()))
+        flat = data[gather]
+
+        timestamp = index['timestamp'].astype(np.int64)
+        start_us = None
+        if reader.tick_us < capfile.TICK_MS:  # Sub-millisecond stamps (frame start)
+            start_us = timestamp * reader.tick_us
+        if reader.tick_us != capfile.TICK_MS:
+            timestamp = timestamp * reader.tick_us // capfile.TICK_MS
+
+        del index, data
+    return _from_flat(flat, size, timestamp, start_us=start_us)
+
+
+def concat(captures):
+    """Join captures (e.g. consecutive segments) into one."""
+    captures = [c for c in captures if len(c)]
+    if not captures:
+        return _from_flat(np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.int64),
+                          np.zeros(0, dtype=np.int64))
+    if len(captures) == 1:
+        return captures[0]
+    width = max(c.raw.shape[1] for c in captures)
+    columns = {name: np.concatenate([getattr(c, name) for c in captures])
+               for name in Capture.COLUMNS if name != 'raw'}
+    columns['raw'] = np.concatenate([np.pad(c.raw, ((0, 0), (0, width - c.raw.shape[1])))
+                                     for c in captures])
+    return Capture.from_columns(columns)
+
+
+def load_segments(manifest_path, start_ms=None, end_ms=None, cache=None):
+    """
+    Load the segments of a rotated capture that cover [start_ms, end_ms).
+
+    Only the covering segment files are opened (each one goes through the
+    decode cache on its own); frames outside the window are trimmed.
+    """
+    manifest = segments.load_manifest(manifest_path)
+    entries = segments.covering(manifest, start_ms, end_ms)
+    cap = concat([load_capture(p, cache) for p in segments.segment_paths(manifest_path, entries)])
+    if start_ms is None and end_ms is None:
+        return cap
+    rows = cap.select(-np.inf if start_ms is None else start_ms,
+                      np.inf if end_ms is None else end_ms)
+    return Capture.from_columns({name: value[rows] for name, value in cap.columns().items()})
+
+
+def _load_uncached(path):
+    if Path(path).suffix == capfile.EXTENSION:
+        return load_djicap(path)
+    return load_csv(path)
+
+
+def load_capture(path, cache=None):
+    """
+    Load a capture (.csv, .csv.gz, .djicap or a segment manifest) into a columnar Capture.
+
+    cache: a capcache.DecodeCache, False to bypass it, or None for the
+           default cache (unless disabled with DJIESC_CACHE=0)
+    """
+    if str(path).endswith(segments.MANIFEST_SUFFIX):
+        return load_segments(path, cache=cache)
+    if cache is None:
+        cache = capcache.DecodeCache() if capcache.enabled() else False
+    if cache is False:
+        return _load_uncached(path)
+
+    key = cache.key(capcache.file_hash(path), DECODER_VERSION)
+    columns = cache.get(key)
+    if columns is not None and set(Capture.COLUMNS) <= set(columns):
+        return Capture.from_columns(columns)
+
+    cap = _load_uncached(path)
+    try:
+        cache.put(key, cap.columns())
+    except OSError as e:
+        print(f"Warning: could not write decode cache: {e}", file=sys.stderr)
+    return cap
+
+
+def main():
+    """Print a per-command summary of a capture."""
+    if len(sys.argv) < 2:
+        print("Usage: python3 capload.py <capture.csv|capture.djicap>")
+        return 1
+
+    import time
+    t = time.perf_counter()
+    cap = load_capture(sys.argv[1])
+    elapsed = time.perf_counter() - t
+
+    print(f"{sys.argv[1]}: {len(cap)} frames loaded in {elapsed * 1000:.1f}ms")
+    for cmd_id in cap.cmd_ids:
+        frames = cap.command(cmd_id)
+        print(f"  0x{cmd_id:04X}: {len(frames):6d} frames, payload width {frames.payload.shape[1]}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
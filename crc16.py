@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+CRC-16 engine for the DJI ESC protocol.
+
+Same algorithm as the original bit loop in test_throttle.py
+(seed 0x3692, poly 0x8005, LSB-first shift), computed from a
+precomputed 256-entry table. Also provides a slicing-by-N path for
+long buffers and a NumPy batch mode that checks a whole capture in one call.
+"""
+
+import struct
+import sys
+
+try:
+    import numpy as np
+except ImportError:  # batch mode is optional
+    np = None
+
+SEED = 0x3692
+POLY = 0x8005
+SLICES = 8
+
+MIN_FRAME = 10  # sync + length + flags + cmd(2) + reserved(2) + seq + crc(2)
+
+# verify_frame() results
+OK = 'ok'
+BAD_CRC = 'bad_crc'
+TRUNCATED = 'truncated'
+OVER_LENGTH = 'over_length'
+
+# Validation modes accepted by the frame decoders
+VALIDATE_MODES = ('flag', 'drop')
+
+
+def crc16_bitwise(data, crc=SEED):
+    """Reference bit-at-a-time implementation (slow, used to build tables)."""
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ POLY
+            else:
+                crc >>= 1
+    return crc & 0xFFFF
+
+
+def _build_tables(count):
+    """Build slicing tables: TABLES[k][i] is byte i followed by k zero bytes."""
+    t0 = [crc16_bitwise((i,), 0) for i in range(256)]
+    tables = [t0]
+    for _ in range(1, count):
+        prev = tables[-1]
+        tables.append([(v >> 8) ^ t0[v & 0xFF] for v in prev])
+    return tables
+
+
+TABLES = _build_tables(SLICES)
+TABLE = TABLES[0]
+
+
+def crc16(data, crc=SEED):
+    """Calculate CRC-16 over data (bytes, bytearray, memoryview or list of ints)."""
+    table = TABLE
+    for b in data:
+        crc = table[(crc ^ b) & 0xFF] ^ (crc >> 8)
+    return crc
+
+
+def crc16_sliced(data, crc=SEED):
+    """
+    Calculate CRC-16 using slicing-by-8.
+
+    Processes 8 bytes per iteration with independent table lookups;
+    faster than crc16() for buffers longer than a few dozen bytes.
+    """
+    t7, t6, t5, t4, t3, t2, t1, t0 = TABLES[::-1]
+    view = data if isinstance(data, (bytes, bytearray, memoryview)) else bytes(data)
+    n = len(view)
+    end = n - n % SLICES
+    for i in range(0, end, SLICES):
+        b0, b1, b2, b3, b4, b5, b6, b7 = view[i:i + SLICES]
+        crc = (t7[(crc ^ b0) & 0xFF] ^ t6[((crc >> 8) ^ b1) & 0xFF] ^
+               t5[b2] ^ t4[b3] ^ t3[b4] ^ t2[b5] ^ t1[b6] ^ t0[b7])
+    table = t0
+    for i in range(end, n):
+        crc = table[(crc ^ view[i]) & 0xFF] ^ (crc >> 8)
+    return crc
+
+
+def frame_crc(frame):
+    """Return the little-endian CRC stored in the last 2 bytes of a frame."""
+    return frame[-2] | (frame[-1] << 8)
+
+
+def check_frame(frame):
+    """True if the trailing CRC of a complete frame matches its contents."""
+    if len(frame) < 3:
+        return False
+    return crc16(frame[:-2]) == frame_crc(frame)
+
+
+def append_crc(frame):
+    """Append the CRC of a bytearray frame in place and return it."""
+    frame.extend(struct.pack('<H', crc16(frame)))
+    return frame
+
+
+def verify_frame(frame):
+    """
+    Classify a frame by its length byte and trailing CRC.
+
+    Returns one of OK, BAD_CRC, TRUNCATED (fewer bytes than the length
+    field says) or OVER_LENGTH (more bytes than the length field says).
+    """
+    n = len(frame)
+    if n < MIN_FRAME or n < frame[1]:
+        return TRUNCATED
+    if n > frame[1]:
+        return OVER_LENGTH
+    if crc16(frame[:-2]) != frame_crc(frame):
+        return BAD_CRC
+    return OK
+
+
+def frame_cmd_id(frame):
+    """Command ID of a (possibly short) frame, or None if not present."""
+    if len(frame) < 5:
+        return None
+    return frame[3] | (frame[4] << 8)
+
+
+class FrameStats:
+    """Running per-command counters of frame validation results"""
+
+    COUNTERS = (OK, BAD_CRC, TRUNCATED, OVER_LENGTH)
+
+    def __init__(self):
+        self.by_cmd = {}
+
+    def record(self, cmd_id, status):
+        """Count one frame result for cmd_id (None for unknown)."""
+        counts = self.by_cmd.get(cmd_id)
+        if counts is None:
+            counts = self.by_cmd[cmd_id] = dict.fromkeys(self.COUNTERS, 0)
+        counts[status] += 1
+
+    def check(self, frame):
+        """Verify a frame, record the result and return the status."""
+        status = verify_frame(frame)
+        self.record(frame_cmd_id(frame), status)
+        return status
+
+    def total(self, status=None):
+        """Total frames recorded, or total with the given status."""
+        if status is None:
+            return sum(sum(c.values()) for c in self.by_cmd.values())
+        return sum(c[status] for c in self.by_cmd.values())
+
+    def report(self):
+        """Return summary lines, one per command ID."""
+        lines = [f"  {'CMD':8s} {'ok':>8s} {'bad_crc':>8s} {'trunc':>8s} {'overlen':>8s}"]
+        for cmd_id in sorted(self.by_cmd, key=lambda c: -1 if c is None else c):
+            c = self.by_cmd[cmd_id]
+            name = '?' if cmd_id is None else f"0x{cmd_id:04X}"
+            lines.append(f"  {name:8s} {c[OK]:8d} {c[BAD_CRC]:8d} "
+                         f"{c[TRUNCATED]:8d} {c[OVER_LENGTH]:8d}")
+        return lines
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("NumPy is required for batch CRC (pip install numpy)")
+
+
+def crc16_batch(matrix, lengths=None, crc=SEED):
+    """
+    Vectorized CRC-16 over many frames at once.
+
+    Args:
+        matrix: uint8 array of shape (n_frames, width), frames left-aligned
+        lengths: number of bytes of each row to include (default: full width)
+        crc: seed value
+
+    Returns:
+        uint16 array of n_frames CRCs
+    """
+    _require_numpy()
+    matrix = np.asarray(matrix, dtype=np.uint8)
+    n, width = matrix.shape
+    table = np.asarray(TABLE, dtype=np.uint16)
+    state = np.full(n, crc, dtype=np.uint16)
+
+    if lengths is None:
+        for col in range(width):
+            state = table[(state ^ matrix[:, col]) & 0xFF] ^ (state >> 8)
+        return state
+
+    lengths = np.asarray(lengths)
+    for col in range(int(lengths.max(initial=0))):
+        active = lengths > col
+        new = table[(state ^ matrix[:, col]) & 0xFF] ^ (state >> 8)
+        state = np.where(active, new, state)
+    return state
+
+
+def pack_frames(frames, width=None):
+    """Pack a sequence of byte frames into a zero-padded uint8 matrix + lengths."""
+    _require_numpy()
+    lengths = np.fromiter((len(f) for f in frames), dtype=np.int64, count=len(frames))
+    if width is None:
+        width = int(lengths.max(initial=0))
+    matrix = np.zeros((len(frames), width), dtype=np.uint8)
+    for i, f in enumerate(frames):
+        matrix[i, :len(f)] = np.frombuffer(bytes(f[:width]), dtype=np.uint8)
+    return matrix, lengths
+
+
+def check_batch(frames):
+    """
+    Check the trailing CRC of many frames in one call.
+
+    Args:
+        frames: sequence of complete frames (bytes-like), or a
+                (matrix, lengths) tuple from pack_frames()
+
+    Returns:
+        bool array, True where the frame CRC is valid
+    """
+    _require_numpy()
+    if isinstance(frames, tuple):
+        matrix, lengths = frames
+    else:
+        matrix, lengths = pack_frames(frames)
+
+    lengths = np.asarray(lengths)
+    rows = np.arange(len(lengths))
+    ok = lengths >= 3
+    last = np.maximum(lengths - 1, 1)
+    stored = matrix[rows, last - 1].astype(np.uint16) | (matrix[rows, last].astype(np.uint16) << 8)
+    computed = crc16_batch(matrix, lengths - 2)
+    return ok & (computed == stored)
+
+
+def main():
+    """Print the CRC of hex bytes given on the command line."""
+    if len(sys.argv) < 2:
+        print("Usage: python3 crc16.py <hex_bytes>")
+        print("Example: python3 crc16.py 55 1A 00 D0 A0 00 40 00")
+        return 1
+
+    data = bytes.fromhex(''.join(sys.argv[1:]))
+    print(f"CRC-16 (seed 0x{SEED:04X}): 0x{crc16(data):04X}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
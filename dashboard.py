@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Live terminal dashboard of the bus, drawn on its own thread.
+
+The capture side only records the latest decoded state in a BusState
+(a few assignments under a lock per frame). A Dashboard thread takes a
+snapshot of that state at a fixed UI rate and draws it, so drawing costs
+the same at 10 or 10000 frames/s and never holds up the serial reader:
+
+    state = BusState()
+    reader.subscribe(state.on_packet, packets=True)   # or state.update(frame)
+    with Dashboard(state, title='monitor'):
+        reader.wait()
+
+The screen shows the eight 0xA0D0 channels as raw words, in the pairs
+seen in flight captures (THROTTLE_PROTOCOL.md). While the motors are idle
+the ESC fills every channel with the battery voltage (protocol.md), and
+only then is it also shown in volts (0.051 V/count). It also shows the
+0xA021 arm flag, throttle slots and state byte, frame rates per
+cmd_id, and the latest device messages. It uses curses when stdout is
+a terminal and curses is available. Otherwise it prints a one-line
+summary every few seconds.
+
+Used by `interface.py -m --dashboard` and `buslog.py --dashboard`.
+Try it without hardware:
+
+    python3 dashboard.py --sim 10      # 10 s of a simulated busprint.ino
+"""
+
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+
+import hostlink
+from frame import CMD_ESC_TELEMETRY, CMD_FC_COMMAND, DJIFrame
+
+try:
+    import curses
+except ImportError:  # optional: Windows Python has no curses
+    curses = None
+
+UI_HZ = 4.0           # Screen refreshes per second
+PLAIN_INTERVAL = 5.0  # Seconds between summary lines without curses
+RATE_WINDOW = 2.0     # Seconds of history behind the frame rates
+VOLTS_PER_COUNT = 0.051
+VOLTAGE_FILL_SPREAD = 8  # Counts between channels that still count as the idle voltage fill
+MAX_MESSAGES = 6
+
+Snapshot = namedtuple('Snapshot', [
+    'time', 'frames', 'counts', 'partials', 'decode_errors',
+    'telemetry', 'telemetry_seq', 'telemetry_time',
+    'a021', 'a021_time', 'messages',
+])
+
+
+def battery_volts(words):
+    """Battery voltage of an idle 0xA0D0 frame (every channel carries it), else None."""
+    if words and max(words) - min(words) <= VOLTAGE_FILL_SPREAD:
+        return words[0] * VOLTS_PER_COUNT
+    return None
+
+
+class BusState:
+    """Latest decoded bus state; updated per frame, read as snapshots"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.counts = {}         # cmd_id -> frames
+        self.partials = 0
+        self.decode_errors = 0
+        self.telemetry = None    # Latest 0xA0D0 words
+        self.telemetry_seq = None
+        self.telemetry_time = None
+        self.a021 = None         # Latest frame.A021Fields
+        self.a021_time = None
+        self.messages = deque(maxlen=MAX_MESSAGES)
+
+    def update(self, frame):
+        """Record a decoded DJIFrame (any thread)."""
+        cmd_id = frame.cmd_id
+        words = fields = None  # Decoded before taking the lock
+        if cmd_id == CMD_ESC_TELEMETRY:
+            words = frame.telemetry
+        elif cmd_id == CMD_FC_COMMAND:
+            fields = frame.a021
+        now = time.monotonic()
+        with self._lock:
+            self.frames += 1
+            self.counts[cmd_id] = self.counts.get(cmd_id, 0) + 1
+            if words is not None:
+                self.telemetry = words
+                self.telemetry_seq = frame.sequence
+                self.telemetry_time = now
+            elif fields is not None:
+                self.a021 = fields
+                self.a021_time = now
+
+    def update_bytes(self, data):
+        """Record a frame received as bytes; counts a decode error if it is not one."""
+        frame = DJIFrame.decode(bytes(data))
+        if frame is None:
+            self.decode_error()
+        else:
+            self.update(frame)
+
+    def partial(self):
+        with self._lock:
+            self.partials += 1
+
+    def decode_error(self):
+        with self._lock:
+            self.decode_errors += 1
+
+    def message(self, text):
+        """A device or logger message to show under the state."""
+        with self._lock:
+            self.messages.append((time.monotonic(), text))
+
+    def on_packet(self, frame, packet):
+        """BusReader callback (subscribe with packets=True)."""
+        if frame is not None:
+            self.update(frame)
+        elif packet.type == hostlink.PARTIAL:
+            self.partial()
+            self.message(hostlink.format_packet(packet))
+        elif packet.type == hostlink.TEXT:
+            self.message(packet.data)
+
+    def snapshot(self):
+        with self._lock:
+            return Snapshot(time.monotonic(), self.frames, dict(self.counts), self.partials,
+                            self.decode_errors, self.telemetry, self.telemetry_seq,
+                            self.telemetry_time, self.a021, self.a021_time,
+                            list(self.messages))
+
+
+class Dashboard:
+    """Draws BusState snapshots at a fixed rate on a background thread"""
+
+    def __init__(self, state, title='', hz=UI_HZ, use_curses=None, stream=None):
+        self.state = state
+        self.title = title
+        self.period = 1.0 / hz
+        self.stream = stream or sys.stdout
+        if use_curses is None:
+            use_curses = curses is not None and self.stream.isatty()
+        self.use_curses = use_curses
+        self._history = deque()  # (time, counts, frames) for the rates
+        self._stop = threading.Event()
+        self._thread = None
+        self._start = None
+        self.error = None        # Exception that ended the drawing thread
+        self.draws = 0
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._start = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name='Dashboard', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(2.0)
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---- Drawing thread -------------------------------------------------
+
+    def _run(self):
+        try:
+            if self.use_curses:
+                self._run_curses()
+            else:
+                self._run_plain()
+        except Exception as e:  # A broken terminal must not stop the capture
+            self.error = e
+
+    def _run_curses(self):
+        screen = curses.initscr()
+        try:
+            curses.noecho()
+            curses.cbreak()
+            try:
+                curses.curs_set(0)
+            except curses.error:
+                pass
+            while True:
+                height, width = screen.getmaxyx()
+                screen.erase()
+                for row, line in enumerate(self.render()[:height]):
+                    try:
+                        screen.addnstr(row, 0, line, width - 1)
+                    except curses.error:
+                        pass
+                screen.refresh()
+                self.draws += 1
+                if self._stop.wait(self.period):
+                    break
+        finally:
+            curses.nocbreak()
+            curses.echo()
+            curses.endwin()
+
+    def _run_plain(self):
+        next_line = time.monotonic() + PLAIN_INTERVAL
+        while not self._stop.wait(self.period):
+            snap = self.state.snapshot()
+            rates = self.rates(snap)  # Keeps the rate history current
+            if snap.time >= next_line:
+                next_line += PLAIN_INTERVAL
+                print(self.summary(snap, rates), file=self.stream, flush=True)
+                self.draws += 1
+
+    # ---- Content --------------------------------------------------------
+
+    def rates(self, snap):
+        """Frames/s per cmd_id (and None for the total) over the last RATE_WINDOW."""
+        history = self._history
+        history.append((snap.time, snap.counts, snap.frames))
+        while len(history) > 2 and snap.time - history[1][0] >= RATE_WINDOW:
+            history.popleft()
+        t0, counts0, frames0 = history[0]
+        dt = snap.time - t0
+        if dt <= 0:
+            return {}
+        rates = {cmd_id: (n - counts0.get(cmd_id, 0)) / dt for cmd_id, n in snap.counts.items()}
+        rates[None] = (snap.frames - frames0) / dt
+        return rates
+
+    def summary(self, snap, rates):
+        """One line: rates, arm state and the first slot voltage."""
+        parts = [f"{self._elapsed(snap):7.1f}s", f"{rates.get(None, 0):7.1f} frames/s"]
+        for cmd_id in (CMD_ESC_TELEMETRY, CMD_FC_COMMAND):
+            if cmd_id in rates:
+                parts.append(f"{cmd_id:04X} {rates[cmd_id]:.1f}/s")
+        if snap.a021 is not None:
+            parts.append(("ARMED" if snap.a021.armed else "disarmed") +
+                         f" thr {'/'.join(str(t) for t in snap.a021.throttles)}"
+                         f" state 0x{snap.a021.state:02X}")
+        volts = battery_volts(snap.telemetry)
+        if volts is not None:
+            parts.append(f"battery {volts:.2f}V")
+        if snap.partials or snap.decode_errors:
+            parts.append(f"{snap.partials} partial {snap.decode_errors} bad")
+        return "  ".join(parts)
+
+    def render(self, snap=None):
+        """The dashboard as a list of lines."""
+        snap = snap or self.state.snapshot()
+        rates = self.rates(snap)
+        lines = [
+            f"DJI ESC bus {self.title}".rstrip() +
+            f"    {self._elapsed(snap):.1f}s    (Ctrl+C to stop)",
+            f"Frames {snap.frames}   partials {snap.partials}   decode errors {snap.decode_errors}",
+            "Rates  " + "   ".join(
+                [f"{cmd_id:04X} {rate:7.1f}/s" for cmd_id, rate in sorted(
+                    (k, v) for k, v in rates.items() if k is not None)] +
+                [f"total {rates.get(None, 0):7.1f}/s"]),
+            "",
+        ]
+
+        if snap.telemetry is None:
+            lines.append("0xA0D0 telemetry: none yet")
+        else:
+            words = snap.telemetry
+            lines.append(f"0xA0D0 telemetry  seq {snap.telemetry_seq:3d}  "
+                         f"({snap.time - snap.telemetry_time:.2f}s ago)")
+            volts = battery_volts(words)
+            lines.append("  battery " + ("-" if volts is None else f"{volts:.2f}V (idle voltage fill)"))
+            lines.append("  channels " + "   ".join(
+                f"{words[i]:5d} {words[i + 1]:5d}" for i in range(0, len(words) - 1, 2)))
+        lines.append("")
+
+        if snap.a021 is None:
+            lines.append("0xA021 FC command: none yet")
+        else:
+            fields = snap.a021
+            lines.append(f"0xA021 FC command  ({snap.time - snap.a021_time:.2f}s ago)")
+            lines.append(f"  {'ARMED' if fields.armed else 'disarmed':8s}  arm flag 0x{fields.arm_flag:02X}"
+                         f"   state 0x{fields.state:02X}   counter {fields.counter}")
+            lines.append("  throttle  " + "   ".join(
+                f"{i + 1}: {t:5d}" for i, t in enumerate(fields.throttles)))
+        lines.append("")
+
+        if snap.messages:
+            lines.append("Messages")
+            for t, text in snap.messages:
+                lines.append(f"  [{self._elapsed(snap, t):7.1f}s] {text}")
+        return lines
+
+    def _elapsed(self, snap, t=None):
+        return (snap.time if t is None else t) - (self._start or snap.time)
+
+
+def main():
+    """Run the dashboard against a simulated busprint.ino."""
+    import argparse
+
+    import simbus
+    from busreader import BusReader
+
+    parser = argparse.ArgumentParser(description='Bus dashboard on a simulated bus')
+    parser.add_argument('--sim', type=float, default=10.0, metavar='SEC',
+                        help='Seconds to run (default: 10)')
+    parser.add_argument('--speed', type=float, default=1.0, help='Bus rate multiplier')
+    parser.add_argument('--plain', action='store_true', help='Summary lines instead of curses')
+    args = parser.parse_args()
+
+    sim = simbus.SimDevice(simbus.BUSPRINT, transport=simbus.LoopbackTransport(),
+                           speed=args.speed, corrupt=0.001)
+    sim.start()
+    reader = BusReader(sim.serial)
+    state = BusState()
+    reader.subscribe(state.on_packet, packets=True)
+    reader.start()
+    dashboard = Dashboard(state, title='(simulated)', use_curses=False if args.plain else None)
+    try:
+        with dashboard:
+            reader.wait(args.sim)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.stop()
+        sim.close()
+    print(dashboard.summary(state.snapshot(), dashboard.rates(state.snapshot())))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
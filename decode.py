@@ -1,9 +1,10 @@
 import csv
-import sys
+
+import crc16 as crc
+import framing
 
 def extract_frames(path):
-    frames = []
-    current = []
+    data = bytearray()
 
     with open(path, newline="") as f:
         rdr = csv.reader(f)
@@ -19,51 +20,64 @@ def extract_frames(path):
                 continue
 
             try:
-                b = int(rx_value, 0)  # handles 0x prefix
+                data.append(int(rx_value, 0))  # handles 0x prefix
             except ValueError:
                 continue
 
-            if b == 0x55:
-                if current:
-                    frames.append(current)
-                current = [b]
-            else:
-                current.append(b)
-        if current:
-            frames.append(current)
-    return frames
+    # Frame by sync + length field (0x55 may also appear inside payloads)
+    return list(framing.iter_frames(data))
+
+
+def decode_frame(frame, validate=None, stats=None):
+    """
+    Decode RS-485 frame according to protocol spec.
 
+    validate: None, 'flag' (adds a 'status' column) or 'drop' (bad frames -> None)
+    stats: optional crc.FrameStats counting validation results
+    """
+    status = None
+    if validate or stats is not None:
+        status = crc.verify_frame(frame)
+        if stats is not None:
+            stats.record(crc.frame_cmd_id(frame), status)
+        if validate == 'drop' and status != crc.OK:
+            return None
 
-def decode_frame(frame):
-    """Decode RS-485 frame according to protocol spec."""
-    if len(frame) < 8:
+    fields = framing.split_frame(frame)
+    if fields is None:
         return None
 
+    length, flags, cmd_id, reserved, sequence, payload, checksum = fields
+
     result = {
         'sync': frame[0],
-        'length': frame[1] if len(frame) > 1 else None,
-        'flags': frame[2] if len(frame) > 2 else None,
-        'cmd_id': (frame[4] << 8 | frame[3]) if len(frame) > 4 else None,
-        'reserved': (frame[6] << 8 | frame[5]) if len(frame) > 6 else None,
-        'sequence': frame[7] if len(frame) > 7 else None,
-        'payload_hex': ' '.join(f'{b:02X}' for b in frame[8:-2]) if len(frame) > 10 else '',
-        'checksum': (frame[-1] << 8 | frame[-2]) if len(frame) >= 2 else None,
-        'raw_hex': ' '.join(f'{b:02X}' for b in frame)
+        'length': length,
+        'flags': flags,
+        'cmd_id': cmd_id,
+        'reserved': reserved,
+        'sequence': sequence,
+        'payload_hex': payload.hex(' ').upper(),
+        'checksum': checksum,
+        'raw_hex': bytes(frame).hex(' ').upper()
     }
+    if validate == 'flag':
+        result['status'] = status
     return result
 
 
-def write_frames_csv(frames, output_path):
+def write_frames_csv(frames, output_path, validate=None, stats=None):
     """Write decoded frames to CSV."""
     with open(output_path, 'w', newline='') as f:
         fieldnames = ['frame_num', 'total_bytes', 'sync', 'length', 'flags',
                       'cmd_id', 'reserved', 'sequence', 'payload_hex',
                       'checksum', 'raw_hex']
+        if validate == 'flag':
+            fieldnames.append('status')
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
 
         for i, frame in enumerate(frames):
-            decoded = decode_frame(frame)
+            decoded = decode_frame(frame, validate, stats)
             if decoded:
                 row = {
                     'frame_num': i,
@@ -74,13 +88,24 @@ def write_frames_csv(frames, output_path):
 
 
 if __name__ == "__main__":
-    input_file = sys.argv[1] if len(sys.argv) > 1 else "t40esc.csv"
-    output_file = sys.argv[2] if len(sys.argv) > 2 else "decoded_frames.csv"
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Decode scope CSV captures to frame CSV")
+    parser.add_argument("input_file", nargs="?", default="t40esc.csv")
+    parser.add_argument("output_file", nargs="?", default="decoded_frames.csv")
+    parser.add_argument("--validate", choices=crc.VALIDATE_MODES,
+                        help="Check frame CRCs: flag bad frames or drop them")
+    args = parser.parse_args()
+
+    stats = crc.FrameStats() if args.validate else None
 
-    print(f"Reading from: {input_file}")
-    frames = extract_frames(input_file)
+    print(f"Reading from: {args.input_file}")
+    frames = extract_frames(args.input_file)
     print(f"Extracted {len(frames)} frames")
 
-    print(f"Writing to: {output_file}")
-    write_frames_csv(frames, output_file)
+    print(f"Writing to: {args.output_file}")
+    write_frames_csv(frames, args.output_file, args.validate, stats)
+    if stats is not None:
+        print("Frame validation:")
+        print("\n".join(stats.report()))
     print("Done!")
@@ -1,53 +1,32 @@
 #!/usr/bin/env python3
 """
 Decode 0xA021 (FC→ESC) command frames to understand throttle and arming.
+
+Frame structure observed:
+[0:1]   - Unknown (varies: 0x154E, 0x1550, etc.)
+[2]     - 0x07 (constant)
+[3]     - 0x00 (constant)
+[4]     - 0x98 or 0x99 (varies slightly)
+[5:7]   - 0x00 00 00 (constant)
+[8:9]   - Voltage feedback? (0x0000 when disarmed, 0x03B0-0x03B2 when armed = ~944-946 = 48.2V)
+[10:14] - 0x00 00 00 00 00 (constant)
+[15]    - ARM FLAG: 0x00 = disarmed, 0x80 = armed
+[16:17] - Counter (increments over time)
+[18:19] - 0x00 00 (constant)
+[20:21] - Unknown field (changes with byte 22)
+[22]    - State byte (changes during arming/motor control)
+[23:25] - 0x00 00 00 (constant)
+
+The fields come from capload.a021_fields(), which decodes every payload
+of the capture with one dtype view (and reads the decoded columns from
+the capcache when the capture was loaded before).
 """
 
-import csv
-import struct
-
-def decode_a021(payload_hex):
-    """
-    Decode 0xA021 payload (26 bytes).
-
-    Frame structure observed:
-    [0:1]   - Unknown (varies: 0x154E, 0x1550, etc.)
-    [2]     - 0x07 (constant)
-    [3]     - 0x00 (constant)
-    [4]     - 0x98 or 0x99 (varies slightly)
-    [5:7]   - 0x00 00 00 (constant)
-    [8:9]   - Voltage feedback? (0x0000 when disarmed, 0x03B0-0x03B2 when armed = ~944-946 = 48.2V)
-    [10:14] - 0x00 00 00 00 00 (constant)
-    [15]    - ARM FLAG: 0x00 = disarmed, 0x80 = armed
-    [16:17] - Counter (increments over time)
-    [18:19] - 0x00 00 (constant)
-    [20:21] - Unknown field (changes with byte 22)
-    [22]    - State byte (changes during arming/motor control)
-    [23:25] - 0x00 00 00 (constant)
-    """
-    payload = bytes.fromhex(payload_hex.replace(' ', ''))
-
-    if len(payload) < 26:
-        return None
-
-    result = {
-        'unknown_0_1': struct.unpack('<H', payload[0:2])[0],
-        'const_2': payload[2],
-        'const_3': payload[3],
-        'byte_4': payload[4],
-        'voltage_8_9': struct.unpack('<H', payload[8:10])[0],
-        'arm_flag_15': payload[15],
-        'counter_16_17': struct.unpack('<H', payload[16:18])[0],
-        'unknown_20_21': struct.unpack('<H', payload[20:22])[0],
-        'state_22': payload[22],
-        'raw_hex': payload.hex(' ').upper(),
-    }
-
-    # Interpret fields
-    result['armed'] = (result['arm_flag_15'] == 0x80)
-    result['voltage_volts'] = result['voltage_8_9'] * 0.051 if result['voltage_8_9'] > 0 else 0.0
-
-    return result
+import argparse
+
+import numpy as np
+
+import capload
 
 def main():
     print("=" * 100)
@@ -64,46 +43,62 @@ def main():
         ("TAKEOFF2 (101s)", 101000, 101500),
     ]
 
-    with open('cap3.csv', 'r') as f:
-        reader = csv.DictReader(f)
-        data = [row for row in reader if row['cmd_id'] == '0xA021']
-
-    for name, start_ms, end_ms in time_ranges:
+    parser = argparse.ArgumentParser(description='Decode 0xA021 frames by time range')
+    parser.add_argument('capture', nargs='?', default='cap3.csv', help='Capture CSV or .djicap')
+    parser.add_argument('--phases', help='JSON file of named time ranges (may overlap)')
+    parser.add_argument('--section', help='Phase set to use from the --phases file')
+    args = parser.parse_args()
+    if args.phases:
+        try:
+            time_ranges = capload.load_phases(args.phases, args.section)
+        except (OSError, ValueError, KeyError) as e:
+            parser.error(f"bad --phases file: {e}")
+
+    # Load once into columns; decode all 0xA021 payloads with one dtype view
+    cap = capload.load_capture(args.capture)
+    data = cap.command(0xA021)
+    fields = capload.a021_fields(data)
+    positions = np.arange(len(data))
+
+    for (name, start_ms, end_ms), span in data.index.select_many(time_ranges):
         print(f"\n{name}")
         print("-" * 100)
 
-        frames = [row for row in data if start_ms <= int(row['timestamp_ms']) < end_ms]
+        sel = positions[span]
 
-        if not frames:
+        if not len(sel):
             print("  No frames in this range")
             continue
 
-        # Show first 3 frames
-        for i, row in enumerate(frames[:3]):
-            decoded = decode_a021(row['payload_hex'])
-            if not decoded:
-                continue
+        # Frames with a full 26-byte payload decode; short ones are skipped
+        decoded = fields[sel][data.complete[sel]]
+        timestamps = data.timestamp_ms[sel][data.complete[sel]]
 
-            timestamp = int(row['timestamp_ms'])
-            armed_str = "ARMED" if decoded['armed'] else "DISARMED"
-            voltage_str = f"{decoded['voltage_volts']:.2f}V" if decoded['voltage_volts'] > 0 else "0.00V"
+        # Show first 3 frames
+        shown = int(data.complete[sel[:3]].sum())
+        for timestamp, d in zip(timestamps[:shown].tolist(), decoded[:shown]):
+            armed = d['arm_flag'] == 0x80
+            volts = d['throttle3'] * 0.051
+            armed_str = "ARMED" if armed else "DISARMED"
+            voltage_str = f"{volts:.2f}V" if volts > 0 else "0.00V"
 
             print(f"  [{timestamp:6d}ms] {armed_str:9s} | Voltage: {voltage_str:7s} | "
-                  f"State: 0x{decoded['state_22']:02X} | Counter: {decoded['counter_16_17']:4d} | "
-                  f"Unk20-21: 0x{decoded['unknown_20_21']:04X}")
+                  f"State: 0x{d['state']:02X} | Counter: {d['counter']:4d} | "
+                  f"Unk20-21: 0x{d['word_20']:04X}")
 
-        if len(frames) > 3:
-            print(f"  ... ({len(frames) - 3} more frames)")
+        if len(sel) > 3:
+            print(f"  ... ({len(sel) - 3} more frames)")
 
         # Summary
-        decoded_frames = [decode_a021(row['payload_hex']) for row in frames]
-        decoded_frames = [d for d in decoded_frames if d is not None]
-        armed_count = sum(1 for d in decoded_frames if d['armed'])
-        voltages = [d['voltage_8_9'] for d in decoded_frames]
-        states = set(d['state_22'] for d in decoded_frames)
-
-        print(f"\n  Summary: {armed_count}/{len(frames)} frames armed | "
-              f"Voltage raw range: {min(voltages)}-{max(voltages)} | "
+        armed_count = int((decoded['arm_flag'] == 0x80).sum())
+        voltages = decoded['throttle3']
+        states = np.unique(decoded['state']).tolist()
+
+        # A window with only short payloads decodes nothing
+        voltage_range = f"{voltages.min()}-{voltages.max()}" if len(voltages) else "-"
+
+        print(f"\n  Summary: {armed_count}/{len(sel)} frames armed | "
+              f"Voltage raw range: {voltage_range} | "
               f"State bytes: {sorted([hex(s) for s in states])}")
 
     print("\n" + "=" * 100)
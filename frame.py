@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+DJI ESC protocol frame type.
+
+DJIFrame is a slotted object that either holds its own fields (frames built
+to be sent) or references a span of a shared capture buffer (frames that
+were received or loaded). Buffer-backed frames decode the header, the
+0xA0D0 telemetry words and the 0xA021 command fields only when first
+accessed, and cache them.
+"""
+
+import struct
+from collections import namedtuple
+from typing import Iterator, Optional
+
+import crc16 as crc
+import framing
+
+CMD_ESC_TELEMETRY = 0xA0D0
+CMD_FC_COMMAND = 0xA021
+
+# 0xA0D0 payload: eight little-endian u16 words
+A0D0_WORDS = struct.Struct('<8H')
+
+# 0xA021 payload (26 bytes), see THROTTLE_PROTOCOL.md
+A021_PAYLOAD = struct.Struct('<HHHHHH3xBH4xB3s')
+A021_SIZE = A021_PAYLOAD.size
+
+A021Fields = namedtuple('A021Fields', [
+    'unknown_a', 'throttle1', 'unknown_b', 'throttle2', 'throttle3', 'throttle4',
+    'arm_flag', 'counter', 'state', 'unknown_c',
+])
+A021Fields.armed = property(lambda self: self.arm_flag == 0x80)
+A021Fields.throttles = property(
+    lambda self: (self.throttle1, self.throttle2, self.throttle3, self.throttle4))
+
+# The per-tick fields of an 0xA021 payload, from payload offset 2:
+# throttle1, unknown_b, throttle2-4, (3 zeros), arm_flag, counter, (4 zeros), state
+A021_LIVE = struct.Struct('<HHHHH3xBH4xB')
+A021_LIVE_OFFSET = 2
+A021_FRAME_SIZE = framing.HEADER_SIZE + A021_SIZE + 2
+
+# One 0xA021 command in A021Template.update() order: what a streamer sends every tick
+Setpoint = namedtuple('Setpoint', ['armed', 'throttle1', 'throttle2', 'throttle3', 'throttle4',
+                                   'state_byte'])
+IDLE = Setpoint(True, 7, 0, 944, 0, 0x40)
+DISARMED = Setpoint(False, 0, 0, 0, 0, 0x40)
+
+# Upper-case hex pair for every byte value, for patching ASCII TX lines
+_HEX_PAIRS = [f'{i:02X}'.encode('ascii') for i in range(256)]
+
+_UNSET = object()
+
+
+class DJIFrame:
+    """DJI ESC Protocol Frame"""
+    SYNC = 0x55
+
+    __slots__ = ('_buf', '_start', '_end', '_flags', '_cmd_id', '_reserved',
+                 '_sequence', '_payload', '_telemetry', '_a021', 'status')
+
+    def __init__(self, cmd_id: int, reserved: int, sequence: int, payload: bytes):
+        self._buf = None
+        self._start = 0
+        self._end = 0
+        self._flags = 0x00
+        self._cmd_id = cmd_id
+        self._reserved = reserved
+        self._sequence = sequence
+        self._payload = payload
+        self._telemetry = _UNSET
+        self._a021 = _UNSET
+        self.status: Optional[str] = None  # crc16.OK / BAD_CRC / ... when validated
+
+    @classmethod
+    def from_buffer(cls, buf, start: int = 0, end: Optional[int] = None) -> 'DJIFrame':
+        """
+        Frame referencing buf[start:end] without copying.
+
+        buf must stay unchanged for the lifetime of the frame (a bytes
+        capture, an mmap, ...). Fields are decoded on first access.
+        """
+        frame = cls.__new__(cls)
+        frame._buf = buf
+        frame._start = start
+        frame._end = len(buf) if end is None else end
+        frame._flags = None
+        frame._payload = None
+        frame._telemetry = _UNSET
+        frame._a021 = _UNSET
+        frame.status = None
+        return frame
+
+    def _decode_header(self):
+        _, _, flags, cmd_id, reserved, sequence = framing.HEADER.unpack_from(self._buf, self._start)
+        self._flags = flags
+        self._cmd_id = cmd_id
+        self._reserved = reserved
+        self._sequence = sequence
+
+    def _detach(self):
+        """Copy lazily-held fields out of the buffer before a field is modified."""
+        if self._buf is not None:
+            if self._flags is None:
+                self._decode_header()
+            self._payload = bytes(self.payload)
+            self._buf = None
+        self._telemetry = _UNSET
+        self._a021 = _UNSET
+
+    # ---- Header fields -------------------------------------------------
+
+    @property
+    def flags(self) -> int:
+        if self._flags is None:
+            self._decode_header()
+        return self._flags
+
+    @flags.setter
+    def flags(self, value: int):
+        self._detach()
+        self._flags = value
+
+    @property
+    def cmd_id(self) -> int:
+        if self._flags is None:
+            self._decode_header()
+        return self._cmd_id
+
+    @cmd_id.setter
+    def cmd_id(self, value: int):
+        self._detach()
+        self._cmd_id = value
+
+    @property
+    def reserved(self) -> int:
+        if self._flags is None:
+            self._decode_header()
+        return self._reserved
+
+    @reserved.setter
+    def reserved(self, value: int):
+        self._detach()
+        self._reserved = value
+
+    @property
+    def sequence(self) -> int:
+        if self._flags is None:
+            self._decode_header()
+        return self._sequence
+
+    @sequence.setter
+    def sequence(self, value: int):
+        self._detach()
+        self._sequence = value
+
+    @property
+    def length(self) -> int:
+        """Length byte (whole frame, including header and checksum)."""
+        if self._buf is not None:
+            return self._buf[self._start + 1]
+        return framing.HEADER_SIZE + len(self._payload) + 2
+
+    @property
+    def payload(self):
+        """Payload bytes (a memoryview for buffer-backed frames)."""
+        if self._payload is None:
+            start = self._start + framing.HEADER_SIZE
+            self._payload = memoryview(self._buf)[start:self._checksum_offset()]
+        return self._payload
+
+    @payload.setter
+    def payload(self, value):
+        self._detach()
+        self._payload = value
+
+    @property
+    def checksum(self) -> Optional[int]:
+        """Checksum carried in the frame (None for frames not yet encoded)."""
+        if self._buf is None:
+            return None
+        return framing.CHECKSUM.unpack_from(self._buf, self._checksum_offset())[0]
+
+    def _checksum_offset(self):
+        """Offset of the checksum in the buffer (length byte, clipped to the span)."""
+        end = min(self._start + self._buf[self._start + 1], self._end) - 2
+        return max(end, self._start + framing.HEADER_SIZE)
+
+    @property
+    def crc_ok(self) -> Optional[bool]:
+        """True/False once validated, None otherwise."""
+        if self.status is None:
+            return None
+        return self.status == crc.OK
+
+    @property
+    def raw(self):
+        """The encoded frame bytes (a memoryview for buffer-backed frames)."""
+        if self._buf is not None:
+            return memoryview(self._buf)[self._start:self._end]
+        return self.encode()
+
+    # ---- Payload decoders ----------------------------------------------
+
+    @property
+    def telemetry(self) -> Optional[tuple]:
+        """0xA0D0 ESC telemetry: eight u16 words, or None for other frames."""
+        if self._telemetry is _UNSET:
+            payload = self.payload
+            if self.cmd_id == CMD_ESC_TELEMETRY and len(payload) >= A0D0_WORDS.size:
+                self._telemetry = A0D0_WORDS.unpack_from(payload)
+            else:
+                self._telemetry = None
+        return self._telemetry
+
+    @property
+    def a021(self) -> Optional[A021Fields]:
+        """0xA021 FC command fields, or None for other frames."""
+        if self._a021 is _UNSET:
+            payload = self.payload
+            if self.cmd_id == CMD_FC_COMMAND and len(payload) >= A021_SIZE:
+                self._a021 = A021Fields._make(A021_PAYLOAD.unpack_from(payload))
+            else:
+                self._a021 = None
+        return self._a021
+
+    # ---- Encode / decode -----------------------------------------------
+
+    def encode(self) -> bytes:
+        """Encode frame to bytes (buffer-backed frames return their bytes unchanged)"""
+        if self._buf is not None:
+            return bytes(memoryview(self._buf)[self._start:self._end])
+
+        length = 8 + len(self._payload) + 2  # header(8) + payload + checksum(2)
+
+        frame = bytearray()
+        frame.append(self.SYNC)
+        frame.append(length)
+        frame.append(self._flags)
+        frame.extend(struct.pack('<H', self._cmd_id))      # LE 16-bit
+        frame.extend(struct.pack('<H', self._reserved))    # LE 16-bit
+        frame.append(self._sequence)
+        frame.extend(self._payload)
+
+        # CRC-16 (seed 0x3692), same as DJIThrottleController.build_frame
+        frame.extend(struct.pack('<H', crc.crc16(frame)))
+
+        return bytes(frame)
+
+    @classmethod
+    def decode(cls, data, validate: Optional[str] = None,
+               stats: Optional[crc.FrameStats] = None) -> Optional['DJIFrame']:
+        """
+        Decode frame from bytes (no copy: the frame references data)
+
+        Args:
+            data: complete frame bytes
+            validate: None (no CRC check), 'flag' (set status/crc_ok) or 'drop'
+                      (return None for frames that fail validation)
+            stats: optional FrameStats that counts the validation result
+        """
+        status = None
+        if validate or stats is not None:
+            status = crc.verify_frame(data)
+            if stats is not None:
+                stats.record(crc.frame_cmd_id(data), status)
+            if validate == 'drop' and status != crc.OK:
+                return None
+
+        if len(data) < crc.MIN_FRAME or data[0] != cls.SYNC:
+            return None
+
+        frame = cls.from_buffer(data)
+        frame.status = status
+        return frame
+
+    @classmethod
+    def iter_buffer(cls, data, validate: bool = False,
+                    stats: Optional[crc.FrameStats] = None) -> Iterator['DJIFrame']:
+        """Yield frames found in a complete capture buffer, all sharing that buffer."""
+        parser = framing.FrameParser.over(data, validate=validate, stats=stats)
+        buf = parser.buffer
+        for start, end in parser._scan_spans():
+            yield cls.from_buffer(buf, start, end)
+
+    def __repr__(self):
+        return (f"DJIFrame(cmd=0x{self.cmd_id:04X}, reserved=0x{self.reserved:04X}, "
+                f"seq={self.sequence}, payload={len(self.payload)}B)")
+
+
+class A021Template:
+    """
+    Reusable 0xA021 command frame backed by one preallocated buffer.
+
+    update() patches the throttle / arm / counter / state fields in place
+    with a precompiled Struct and resumes the CRC from the cached CRC of
+    the bytes that never change, so the control loop builds no new frames.
+    tx_line() patches the matching interface.ino "TX:..." line the same way.
+    Both buffers are reused: write them out before the next update().
+    """
+
+    __slots__ = ('buf', 'line', 'counter', 'unknown_b', '_prefix_crc', '_tail')
+
+    def __init__(self, unknown_a: int = 5454, unknown_b: int = 152,
+                 unknown_c: bytes = b'\x00\x00\x00', reserved: int = 0x0001, sequence: int = 0):
+        self.buf = bytearray(A021_FRAME_SIZE)
+        self.counter = 0
+        self.unknown_b = unknown_b
+        framing.HEADER.pack_into(self.buf, 0, DJIFrame.SYNC, A021_FRAME_SIZE, 0x00,
+                                 CMD_FC_COMMAND, reserved, sequence)
+        A021_PAYLOAD.pack_into(self.buf, framing.HEADER_SIZE, unknown_a, 0, unknown_b,
+                               0, 0, 0, 0x00, 0, 0x40, unknown_c)
+
+        live = framing.HEADER_SIZE + A021_LIVE_OFFSET
+        view = memoryview(self.buf)
+        self._prefix_crc = crc.crc16(view[:live])
+        self._tail = view[live:-2]  # Re-checksummed on every update
+
+        self.line = bytearray(b'TX:' + b' '.join(_HEX_PAIRS[b] for b in self.buf) + b'\n')
+        self.update(False, 0, 0, 0, 0)
+        self.counter = 0
+
+    def update(self, armed: bool, throttle1: int, throttle2: int, throttle3: int,
+               throttle4: int, state_byte: int = 0x40) -> bytearray:
+        """Patch the live fields, advance the counter and refresh the CRC; returns the buffer."""
+        buf = self.buf
+        A021_LIVE.pack_into(buf, framing.HEADER_SIZE + A021_LIVE_OFFSET,
+                            throttle1, self.unknown_b, throttle2, throttle3, throttle4,
+                            0x80 if armed else 0x00, self.counter, state_byte)
+        self.counter = (self.counter + 1) & 0xFFFF
+        framing.CHECKSUM.pack_into(buf, A021_FRAME_SIZE - 2, crc.crc16(self._tail, self._prefix_crc))
+        return buf
+
+    def tx_line(self) -> bytearray:
+        """The current frame as an ASCII-link "TX:55 24 ...\\n" line (patched in place)."""
+        line = self.line
+        buf = self.buf
+        hex_pairs = _HEX_PAIRS
+        # Header and unknown_a never change; 3 characters per byte after "TX:"
+        for i in range(framing.HEADER_SIZE + A021_LIVE_OFFSET, A021_FRAME_SIZE):
+            j = 3 + 3 * i
+            line[j:j + 2] = hex_pairs[buf[i]]
+        return line
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Streaming frame parser for the DJI ESC RS-485 protocol.
+
+One resynchronizing state machine shared by every tool that has to find
+frames in a byte stream (parse_hex_log.py, decode.py, buslog.py,
+interface.py). Bytes are fed in arbitrary chunks into a fixed ring buffer
+and frames come back as memoryviews into that buffer, so payloads are
+never copied.
+
+Frame layout:
+    [0] sync 0x55  [1] length (whole frame)  [2] flags
+    [3:5] cmd_id LE  [5:7] reserved LE  [7] sequence
+    [8:length-2] payload  [length-2:length] CRC-16 LE
+"""
+
+import struct
+import sys
+
+import crc16 as crc
+
+SYNC = 0x55
+SYNC_BYTE = bytes([SYNC])
+HEADER_SIZE = 8
+MIN_LENGTH = crc.MIN_FRAME
+MAX_LENGTH = 64  # MAX_FRAME_SIZE in busprint.ino / interface.ino
+
+# sync, length, flags, cmd_id, reserved, sequence
+HEADER = struct.Struct('<BBBHHB')
+CHECKSUM = struct.Struct('<H')
+
+
+def split_frame(frame):
+    """
+    Split a frame into its fields without copying.
+
+    Returns (length, flags, cmd_id, reserved, sequence, payload, checksum)
+    where payload is a memoryview, or None if the frame is shorter than
+    a header. Uses the length byte when the data is long enough, so
+    trailing junk after the frame is ignored.
+    """
+    n = len(frame)
+    if n < MIN_LENGTH:
+        return None
+    view = frame if isinstance(frame, memoryview) else memoryview(frame)
+    _, length, flags, cmd_id, reserved, sequence = HEADER.unpack_from(view)
+    end = max(min(length, n) - 2, HEADER_SIZE)
+    checksum = CHECKSUM.unpack_from(view, end)[0]
+    return length, flags, cmd_id, reserved, sequence, view[HEADER_SIZE:end], checksum
+
+
+class FrameParser:
+    """
+    Incremental frame parser over a ring buffer.
+
+    Usage:
+        parser = FrameParser()
+        for chunk in chunks:
+            for frame in parser.feed(chunk):
+                handle(frame)      # memoryview, valid until the next feed()
+
+    Frames are located by sync byte + length field. A length outside
+    MIN_LENGTH..MAX_LENGTH (or a CRC failure when validating) makes the
+    parser jump straight to the next sync byte instead of stepping one
+    byte at a time.
+    """
+
+    def __init__(self, capacity=4096, validate=False, stats=None, max_length=MAX_LENGTH):
+        self.validate = validate
+        self.stats = stats
+        self.max_length = max_length
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+
+        # Counters
+        self.frames = 0
+        self.resyncs = 0
+        self.skipped_bytes = 0
+
+    @classmethod
+    def over(cls, data, **kwargs):
+        """Parser that scans an existing complete buffer (bytes, bytearray, mmap) in place."""
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        parser = cls(capacity=0, **kwargs)
+        parser._buf = data
+        parser._view = memoryview(data)
+        parser._end = len(data)
+        return parser
+
+    @property
+    def pending(self):
+        """Number of buffered bytes not yet consumed."""
+        return self._end - self._start
+
+    def feed(self, data):
+        """Append a chunk of bytes and return an iterator over complete frames."""
+        self._append(data)
+        return self._scan()
+
+    def feed_spans(self, data):
+        """Like feed(), but yield (start, end) offsets into self.buffer."""
+        self._append(data)
+        return self._scan_spans()
+
+    @property
+    def buffer(self):
+        """The buffer that frame views and spans currently refer to."""
+        return self._buf
+
+    def _append(self, data):
+        n = len(data)
+        if not n:
+            return
+        if self._end + n > len(self._buf):
+            pending = self._end - self._start
+            if pending + n <= len(self._buf):
+                # Compact in place (same-size move keeps the buffer exportable)
+                self._buf[0:pending] = self._buf[self._start:self._end]
+            else:
+                # Grow into a fresh buffer; views handed out earlier keep the old one
+                buf = bytearray(max(2 * len(self._buf), pending + n))
+                buf[0:pending] = self._buf[self._start:self._end]
+                self._buf = buf
+                self._view = memoryview(buf)
+            self._start = 0
+            self._end = pending
+        self._buf[self._end:self._end + n] = data
+        self._end += n
+
+    def _resync(self, pos, status=None):
+        """Drop the candidate frame at pos and continue from the next byte."""
+        self.resyncs += 1
+        self.skipped_bytes += 1
+        if status is not None and self.stats is not None:
+            self.stats.record(crc.frame_cmd_id(self._view[pos:pos + 5]), status)
+        return pos + 1
+
+    def _scan(self):
+        view = self._view
+        for start, end in self._scan_spans():
+            yield view[start:end]
+
+    def _scan_spans(self):
+        buf = self._buf
+        view = self._view
+        end = self._end
+        pos = self._start
+        min_len = MIN_LENGTH
+        max_len = self.max_length
+        validate = self.validate
+        stats = self.stats
+
+        while True:
+            sync = buf.find(SYNC_BYTE, pos, end)
+            if sync < 0:
+                self.skipped_bytes += end - pos
+                self._start = end
+                return
+            self.skipped_bytes += sync - pos
+
+            if end - sync < 2:
+                self._start = sync
+                return
+
+            length = buf[sync + 1]
+            if length < min_len or length > max_len:
+                pos = self._resync(sync)
+                continue
+
+            if end - sync < length:
+                self._start = sync
+                return
+
+            if validate:
+                frame = view[sync:sync + length]
+                if crc.crc16(frame[:-2]) != crc.frame_crc(frame):
+                    pos = self._resync(sync, crc.BAD_CRC)
+                    continue
+
+            if stats is not None:
+                stats.record(buf[sync + 3] | (buf[sync + 4] << 8), crc.OK)
+            self.frames += 1
+            pos = sync + length
+            self._start = pos
+            yield sync, pos
+
+
+def iter_frames(data, validate=False, stats=None):
+    """Yield frames (memoryviews into data) from a complete in-memory buffer."""
+    return FrameParser.over(data, validate=validate, stats=stats)._scan()
+
+
+def iter_spans(data, validate=False, stats=None):
+    """Yield (start, end) offsets of frames in a complete in-memory buffer."""
+    return FrameParser.over(data, validate=validate, stats=stats)._scan_spans()
+
+
+def main():
+    """Count frames in a raw binary byte dump."""
+    if len(sys.argv) < 2:
+        print("Usage: python3 framing.py <raw_bytes.bin>")
+        return 1
+
+    counts = {}
+    parser = FrameParser()
+    with open(sys.argv[1], 'rb') as f:
+        while True:
+            chunk = f.read(65536)
+            if not chunk:
+                break
+            for frame in parser.feed(chunk):
+                cmd_id = frame[3] | (frame[4] << 8)
+                counts[cmd_id] = counts.get(cmd_id, 0) + 1
+
+    for cmd_id, count in sorted(counts.items()):
+        print(f"  0x{cmd_id:04X}: {count} frames")
+    print(f"{parser.frames} frames, {parser.resyncs} resyncs, "
+          f"{parser.skipped_bytes} bytes skipped")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+USB host link to interface.ino / busprint.ino.
+
+The firmware boots in ASCII mode (hex lines, easy to read in a serial
+monitor). The binary mode carries the same traffic as COBS packets in
+about 40% of the bytes, with no hex formatting or parsing on the
+SAMD21 (firmware side: mcu/hostlink.h):
+
+    [type] [len] [payload: len bytes] [CRC-16 LE over type+len+payload]
+
+COBS-encoded and terminated by 0x00. FRAME, TX_DONE and PARTIAL payloads
+start with a u32 LE millis() stamp followed by the bus bytes. busprint.ino
+sends FRAME_US / PARTIAL_US instead: u32 millis(), then u32 micros() of
+the first and of the last byte of the frame, then the bus bytes. In
+ASCII mode the two micros() stamps are appended to the FRAME / ERROR
+line. micros() wraps every 71.6 minutes; it is unwrapped against the
+millis() stamp sent with it (unwrap_micros), so no state is needed.
+
+Negotiation: the host sends the ASCII line "MODE BIN" and the device
+answers "MODE,BIN" before switching; a TEXT packet "MODE ASCII" switches
+back. Firmware without binary support never answers and the host stays
+in ASCII mode.
+
+Both modes are parsed into the same Packet tuples, so callers handle
+received traffic once.
+"""
+
+import struct
+import sys
+import time
+from collections import namedtuple
+
+import crc16 as crc
+
+ASCII = 'ascii'
+BINARY = 'binary'
+LINK_MODES = (ASCII, BINARY)
+
+# Packet types
+FRAME = 0x01     # device->host: stamp + frame received on the bus
+TX = 0x02        # host->device: bytes to transmit on the bus
+TX_DONE = 0x03   # device->host: stamp + bytes transmitted
+PARTIAL = 0x04   # device->host: stamp + partial frame (RX timeout)
+TEXT = 0x05      # both: ASCII status line or command
+FRAME_US = 0x06    # device->host: FRAME with micros() start/end stamps
+PARTIAL_US = 0x07  # device->host: PARTIAL with micros() start/end stamps
+
+STAMPED = (FRAME, TX_DONE, PARTIAL)
+STAMPED_US = {FRAME_US: FRAME, PARTIAL_US: PARTIAL}
+STAMP = struct.Struct('<I')
+STAMP_US = struct.Struct('<III')  # millis(), micros() first byte, micros() last byte
+MAX_PAYLOAD = 128  # HOSTLINK_MAX_PAYLOAD in mcu/hostlink.h
+MAX_BODY = MAX_PAYLOAD + 4
+MAX_ENCODED = MAX_BODY + MAX_BODY // 254 + 1  # Longest COBS block of a valid packet
+DELIMITER = b'\x00'
+
+# type, timestamp (ms, None if not carried), data (bytes; str for TEXT),
+# start_us / end_us (unwrapped device micros() of the first / last byte, or None)
+Packet = namedtuple('Packet', ['type', 'timestamp', 'data', 'start_us', 'end_us'],
+                    defaults=(None, None))
+
+WRAP_US = 1 << 32
+
+
+def unwrap_micros(ms, us):
+    """
+    Full microsecond time for a 32-bit micros() stamp taken with millis() = ms.
+
+    Both clocks count from boot, so the right wrap of us is the one
+    nearest ms * 1000. Exact as long as the two were read within 35 min.
+    """
+    return us + ((ms * 1000 - us + (WRAP_US >> 1)) // WRAP_US) * WRAP_US
+
+
+def cobs_encode(data):
+    """Consistent Overhead Byte Stuffing: encode data so it contains no 0x00."""
+    out = bytearray()
+    for block in bytes(data).split(DELIMITER):
+        while len(block) >= 0xFE:
+            out.append(0xFF)
+            out += block[:0xFE]
+            block = block[0xFE:]
+        out.append(len(block) + 1)
+        out += block
+    return bytes(out)
+
+
+def cobs_decode(data):
+    """Decode one COBS block (without the 0x00 delimiter); ValueError if malformed."""
+    out = bytearray()
+    i = 0
+    n = len(data)
+    while i < n:
+        code = data[i]
+        if code == 0 or i + code > n:
+            raise ValueError("malformed COBS data")
+        out += data[i + 1:i + code]
+        i += code
+        if code < 0xFF and i < n:
+            out.append(0)
+    return bytes(out)
+
+
+def encode_packet(ptype, data=b'', timestamp=None, micros=None):
+    """Build a delimited binary packet (micros: (start_us, end_us) for FRAME_US/PARTIAL_US)."""
+    if isinstance(data, str):
+        data = data.encode('ascii')
+    if micros is not None:
+        ptype = {FRAME: FRAME_US, PARTIAL: PARTIAL_US}.get(ptype, ptype)
+        payload = STAMP_US.pack(timestamp & 0xFFFFFFFF, micros[0] & 0xFFFFFFFF,
+                                micros[1] & 0xFFFFFFFF) + bytes(data)
+    elif timestamp is None:
+        payload = data
+    else:
+        payload = STAMP.pack(timestamp & 0xFFFFFFFF) + bytes(data)
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"payload too long ({len(payload)} > {MAX_PAYLOAD})")
+    body = bytearray((ptype, len(payload)))
+    body += payload
+    crc.append_crc(body)
+    return cobs_encode(body) + DELIMITER
+
+
+def decode_body(body):
+    """Turn a decoded packet body into a Packet; ValueError on bad length/CRC."""
+    if len(body) < 4 or body[1] != len(body) - 4:
+        raise ValueError("bad packet length")
+    if not crc.check_frame(body):
+        raise ValueError("bad packet CRC")
+    ptype = body[0]
+    payload = body[2:-2]
+    if ptype in STAMPED_US:
+        if len(payload) < STAMP_US.size:
+            raise ValueError("stamped packet too short")
+        ms, start_us, end_us = STAMP_US.unpack_from(payload)
+        return Packet(STAMPED_US[ptype], ms, payload[STAMP_US.size:],
+                      unwrap_micros(ms, start_us), unwrap_micros(ms, end_us))
+    if ptype in STAMPED:
+        if len(payload) < STAMP.size:
+            raise ValueError("stamped packet too short")
+        return Packet(ptype, STAMP.unpack_from(payload)[0], payload[STAMP.size:])
+    if ptype == TEXT:
+        return Packet(ptype, None, payload.decode('ascii', errors='replace'))
+    return Packet(ptype, None, payload)
+
+
+class PacketDecoder:
+    """Incremental binary packet decoder: feed() USB chunks, get Packets back"""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._overflow = False  # Discarding an over-long block up to its delimiter
+        self.packets = 0
+        self.errors = 0
+
+    def feed(self, data):
+        """
+        Append a chunk and yield every complete, valid packet.
+
+        A block longer than any packet (ASCII text on a binary link, line
+        noise without 0x00) is counted as one error and dropped instead of
+        being buffered until a delimiter turns up.
+        """
+        buf = self._buf
+        buf += data
+        start = 0
+        while True:
+            end = buf.find(DELIMITER, start)
+            if end < 0:
+                break
+            block = bytes(buf[start:end])
+            start = end + 1
+            if self._overflow:
+                self._overflow = False
+                continue  # Rest of a block already counted
+            if not block:
+                continue  # Idle delimiter
+            if len(block) > MAX_ENCODED:
+                self.errors += 1
+                continue
+            try:
+                packet = decode_body(cobs_decode(block))
+            except ValueError:
+                self.errors += 1
+                continue
+            self.packets += 1
+            yield packet
+        del buf[:start]
+        if len(buf) > MAX_ENCODED:
+            if not self._overflow:
+                self.errors += 1
+                self._overflow = True
+            del buf[:]
+
+
+class LineDecoder:
+    """Incremental ASCII-mode decoder with the same feed() interface as PacketDecoder"""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self.packets = 0
+        self.errors = 0
+
+    def lines(self, data):
+        """Append a chunk and return its complete lines (unstripped, may be empty)."""
+        buf = self._buf
+        buf += data
+        end = buf.rfind(b'\n')
+        if end < 0:
+            return []
+        text = buf[:end].decode('utf-8', errors='ignore')
+        del buf[:end + 1]
+        return text.split('\n')
+
+    def feed(self, data):
+        """Append a chunk and yield a Packet per complete non-empty line."""
+        for line in self.lines(data):
+            line = line.strip()
+            if line:
+                self.packets += 1
+                yield parse_ascii_line(line)
+
+
+def make_decoder(mode):
+    """PacketDecoder or LineDecoder for a link mode."""
+    return PacketDecoder() if mode == BINARY else LineDecoder()
+
+
+def parse_ascii_line(line):
+    """
+    Parse one ASCII-mode line from either firmware into a Packet.
+
+    interface.ino: "[RX<-485] 55 1A ...", "[TX->485] ...", "[RX TIMEOUT] Partial: ..."
+    busprint.ino:  "FRAME,<ms>,55 1A ...[,<start_us>,<end_us>]",
+                   "ERROR,<ms>,TIMEOUT,55 ...[,<start_us>,<end_us>]"
+    Anything else is returned as TEXT.
+    """
+    try:
+        if line.startswith('FRAME,'):
+            _, ts, rest = line.split(',', 2)
+            return _stamped(FRAME, int(ts), rest)
+        if line.startswith('ERROR,') and ',TIMEOUT,' in line:
+            _, ts, _, rest = line.split(',', 3)
+            return _stamped(PARTIAL, int(ts), rest)
+        if line.startswith('[RX<-485]'):
+            return Packet(FRAME, None, bytes.fromhex(line[9:]))
+        if line.startswith('[TX->485]'):
+            return Packet(TX_DONE, None, bytes.fromhex(line[9:]))
+        if line.startswith('[RX TIMEOUT] Partial:'):
+            return Packet(PARTIAL, None, bytes.fromhex(line[21:]))
+    except ValueError:
+        pass
+    return Packet(TEXT, None, line)
+
+
+def split_micros(rest):
+    """Split "<hex>[,<start_us>,<end_us>]" into (hex, start_us, end_us) (raw u32 stamps or None)."""
+    comma = rest.find(',')
+    if comma < 0:
+        return rest, None, None
+    start, end = rest[comma + 1:].split(',')
+    return rest[:comma], int(start), int(end)
+
+
+def _stamped(ptype, ms, rest):
+    hex_str, start_us, end_us = split_micros(rest)
+    if start_us is None:
+        return Packet(ptype, ms, bytes.fromhex(hex_str))
+    return Packet(ptype, ms, bytes.fromhex(hex_str),
+                  unwrap_micros(ms, start_us), unwrap_micros(ms, end_us))
+
+
+def format_packet(packet):
+    """Render a Packet as the equivalent ASCII-mode line (for logs and monitors)."""
+    if packet.type == TEXT:
+        return packet.data
+    hex_str = packet.data.hex(' ').upper()
+    if packet.timestamp is None:  # interface.ino ASCII style
+        if packet.type == FRAME:
+            return f"[RX<-485] {hex_str}"
+        if packet.type == PARTIAL:
+            return f"[RX TIMEOUT] Partial: {hex_str}"
+    if packet.start_us is not None:
+        hex_str += f",{packet.start_us & 0xFFFFFFFF},{packet.end_us & 0xFFFFFFFF}"
+    if packet.type == FRAME:
+        return f"FRAME,{packet.timestamp},{hex_str}"
+    if packet.type == PARTIAL:
+        return f"ERROR,{packet.timestamp},TIMEOUT,{hex_str}"
+    if packet.type == TX_DONE:
+        return f"[TX->485] {hex_str}"
+    return f"PACKET,0x{packet.type:02X},{hex_str}"
+
+
+def tx_command(data, mode):
+    """Bytes to send for transmitting data on the bus in the given link mode."""
+    if mode == BINARY:
+        return encode_packet(TX, data)
+    return f"TX:{bytes(data).hex(' ').upper()}\n".encode('ascii')
+
+
+def text_command(text, mode):
+    """Bytes to send for a text command (STATS, MODE ASCII, ...) in the given mode."""
+    if mode == BINARY:
+        return encode_packet(TEXT, text)
+    return (text + '\n').encode('ascii')
+
+
+def negotiate(ser, mode, timeout=1.0):
+    """
+    Switch the device to mode; returns the mode actually in use.
+
+    Lines that arrive before the acknowledgement are returned through
+    the second element so callers can still log them.
+    """
+    skipped = []
+    if mode != BINARY:
+        return ASCII, skipped
+
+    ser.write(b'MODE BIN\n')
+    ser.flush()
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        line = ser.readline().decode('utf-8', errors='ignore').strip()
+        if line == 'MODE,BIN':
+            return BINARY, skipped
+        if line:
+            skipped.append(line)
+    return ASCII, skipped
+
+
+def request(ser, command, mode, match, timeout=1.0):
+    """
+    Send a text command and return the first device text line for which
+    match(line) is true, or None after timeout.
+
+    Reads the port directly, so call it while no reader thread is
+    running; other traffic received while waiting is discarded.
+    """
+    ser.write(text_command(command, mode))
+    ser.flush()
+    decoder = make_decoder(mode)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        for packet in decoder.feed(ser.read(ser.in_waiting or 1)):
+            if packet.type == TEXT and match(packet.data.strip()):
+                return packet.data.strip()
+    return None
+
+
+def main():
+    """Decode a raw dump of binary-mode USB traffic into ASCII-mode lines."""
+    if len(sys.argv) < 2:
+        print("Usage: python3 hostlink.py <usb_dump.bin>")
+        return 1
+
+    decoder = PacketDecoder()
+    with open(sys.argv[1], 'rb') as f:
+        while True:
+            chunk = f.read(65536)
+            if not chunk:
+                break
+            for packet in decoder.feed(chunk):
+                print(format_packet(packet))
+
+    print(f"{decoder.packets} packets, {decoder.errors} bad", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,82 +4,39 @@ DJI ESC RS-485 Interface via SAMD21 + MAX485
 Communicates with Arduino over USB serial to send/receive RS-485 frames
 """
 
+import queue
 import serial
 import serial.tools.list_ports
-import struct
 import time
 import sys
-from typing import List, Optional
+from typing import Callable, Iterable, List, Optional, Union
 
-
-class DJIFrame:
-    """DJI ESC Protocol Frame"""
-    SYNC = 0x55
-
-    def __init__(self, cmd_id: int, reserved: int, sequence: int, payload: bytes):
-        self.cmd_id = cmd_id
-        self.reserved = reserved
-        self.sequence = sequence
-        self.payload = payload
-        self.flags = 0x00
-
-    def encode(self) -> bytes:
-        """Encode frame to bytes"""
-        length = 6 + len(self.payload) + 2  # header(6) + payload + checksum(2)
-
-        frame = bytearray()
-        frame.append(self.SYNC)
-        frame.append(length)
-        frame.append(self.flags)
-        frame.extend(struct.pack('<H', self.cmd_id))      # LE 16-bit
-        frame.extend(struct.pack('<H', self.reserved))    # LE 16-bit
-        frame.append(self.sequence)
-        frame.extend(self.payload)
-
-        # Calculate checksum (placeholder - replace with actual DJI algorithm)
-        checksum = sum(frame) & 0xFFFF
-        frame.extend(struct.pack('<H', checksum))
-
-        return bytes(frame)
-
-    @classmethod
-    def decode(cls, data: bytes) -> Optional['DJIFrame']:
-        """Decode frame from bytes"""
-        if len(data) < 10:  # Min frame size
-            return None
-
-        if data[0] != cls.SYNC:
-            return None
-
-        length = data[1]
-        flags = data[2]
-        cmd_id = struct.unpack('<H', data[3:5])[0]
-        reserved = struct.unpack('<H', data[5:7])[0]
-        sequence = data[7]
-
-        payload_end = length + 2 - 2  # +2 for sync+length, -2 for checksum
-        payload = data[8:payload_end]
-
-        # Checksum validation (not used currently, but extracted for future use)
-        # checksum = struct.unpack('<H', data[payload_end:payload_end+2])[0]
-
-        frame = cls(cmd_id, reserved, sequence, payload)
-        frame.flags = flags
-        return frame
-
-    def __repr__(self):
-        return (f"DJIFrame(cmd=0x{self.cmd_id:04X}, reserved=0x{self.reserved:04X}, "
-                f"seq={self.sequence}, payload={len(self.payload)}B)")
+import busfilter
+import dashboard
+import crc16 as crc
+import hostlink
+import metrics
+from busreader import BusReader
+from frame import DJIFrame
 
 
 class RS485Interface:
     """Interface to SAMD21+MAX485 over USB serial"""
 
-    def __init__(self, port: Optional[str] = None, baudrate: int = 115200):
+    def __init__(self, port: Optional[str] = None, baudrate: int = 115200,
+                 link: str = hostlink.ASCII):
         self.port: Optional[str] = port
         self.baudrate = baudrate
         self.ser: Optional[serial.Serial] = None
         self.verbose = True
+        self.validate: Optional[str] = None  # None, 'flag' or 'drop'
+        self.stats = crc.FrameStats()
+        self.link = link  # Requested host link mode; set to the negotiated one on connect
+        self.decoder = hostlink.make_decoder(link)
+        self.reader: Optional[BusReader] = None  # Background reader (start_reader)
+        self.filter = busfilter.FrameFilter()    # Device-side filter (off at power-up)
+        self._monitoring = False
+        self._dashboard: Optional[dashboard.BusState] = None  # While monitor() draws a dashboard
 
     def find_device(self) -> Optional[str]:
         """Auto-detect SAMD21 device"""
@@ -117,7 +74,16 @@ class RS485Interface:
                 if self.verbose:
                     print(f"[DEVICE] {line.strip()}")
 
-            print(f"Connected to {self.port}")
+            requested = self.link
+            self.link, skipped = hostlink.negotiate(self.ser, requested)
+            for line in skipped:
+                if self.verbose:
+                    print(f"[DEVICE] {line}")
+            if self.link != requested:
+                print(f"Warning: device did not accept {requested} mode, using {self.link}")
+            self.decoder = hostlink.make_decoder(self.link)
+
+            print(f"Connected to {self.port} ({self.link} link)")
             return True
 
         except serial.SerialException as e:
@@ -126,6 +92,7 @@ class RS485Interface:
 
     def disconnect(self):
         """Close serial connection"""
+        self.stop_reader()
         if self.ser and self.ser.is_open:
             self.ser.close()
             print("Disconnected")
@@ -137,22 +104,17 @@ class RS485Interface:
             return False
 
         data = frame.encode()
-        hex_str = ' '.join(f'{b:02X}' for b in data)
-        cmd = f"TX:{hex_str}\n"
 
         if self.verbose:
             print(f"[SEND] {frame}")
-            print(f"       {hex_str}")
+            print(f"       {' '.join(f'{b:02X}' for b in data)}")
 
-        self.ser.write(cmd.encode('utf-8'))
-        self.ser.flush()
+        self._write_tx(data)
 
-        # Read response
-        time.sleep(0.1)
-        while self.ser.in_waiting:
-            line = self.ser.readline().decode('utf-8', errors='ignore')
-            if self.verbose:
-                print(f"[DEVICE] {line.strip()}")
+        # Read response (the reader thread prints it when running)
+        if not self.reader:
+            time.sleep(0.1)
+            self._print_device_output()
 
         return True
 
@@ -162,23 +124,123 @@ class RS485Interface:
             print("Error: Not connected")
             return False
 
-        hex_str = ' '.join(f'{b:02X}' for b in data)
-        cmd = f"TX:{hex_str}\n"
-
         if self.verbose:
-            print(f"[SEND RAW] {hex_str}")
+            print(f"[SEND RAW] {' '.join(f'{b:02X}' for b in data)}")
 
-        self.ser.write(cmd.encode('utf-8'))
-        self.ser.flush()
+        self._write_tx(data)
 
-        time.sleep(0.1)
-        while self.ser.in_waiting:
-            line = self.ser.readline().decode('utf-8', errors='ignore')
-            if self.verbose:
-                print(f"[DEVICE] {line.strip()}")
+        if not self.reader:
+            time.sleep(0.1)
+            self._print_device_output()
+
+        return True
+
+    def _write_tx(self, data: bytes):
+        """Write one TX command to the device, counted in metrics"""
+        t = time.perf_counter()
+        self.ser.write(hostlink.tx_command(data, self.link))
+        self.ser.flush()
+        cmd_id = data[3] | (data[4] << 8) if len(data) >= 5 else 0
+        metrics.count_command(cmd_id, time.perf_counter() - t)
+
+    def set_filter(self, frame_filter: Union[busfilter.FrameFilter, str, None],
+                   timeout: float = 1.0) -> bool:
+        """
+        Set the device-side cmd_id filter / decimation (see busfilter.py).
+
+        frame_filter is a FrameFilter, a spec such as "ALLOW A021 A0D0/10",
+        or None for off. Works with or without the reader thread running.
+        Returns False if the device rejected the filter or did not answer.
+        """
+        if not self.ser or not self.ser.is_open:
+            print("Error: Not connected")
+            return False
+        try:
+            if not isinstance(frame_filter, busfilter.FrameFilter):
+                frame_filter = busfilter.FrameFilter.parse(frame_filter or busfilter.OFF)
+            if self.reader is None:
+                reported = busfilter.configure(self.ser, self.link, frame_filter, timeout)
+            else:
+                reported = self._filter_via_reader(frame_filter, timeout)
+        except ValueError as e:
+            print(f"Error: {e}: {frame_filter}")
+            return False
 
+        if reported is None:
+            print("Warning: device did not answer FILTER (firmware without filtering)")
+            return False
+        self.filter = reported
+        if self.verbose:
+            print(f"Device filter: {self.filter}")
         return True
 
+    def _filter_via_reader(self, frame_filter: busfilter.FrameFilter,
+                           timeout: float) -> Optional[busfilter.FrameFilter]:
+        """Send FILTER and wait for the reply on the reader thread"""
+        replies: queue.Queue = queue.Queue()
+        token = self.reader.subscribe(lambda frame, packet: replies.put(packet),
+                                      cmd_ids=(), packets=True)
+        try:
+            self.ser.write(hostlink.text_command(frame_filter.command(), self.link))
+            self.ser.flush()
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                try:
+                    packet = replies.get(timeout=remaining)
+                except queue.Empty:
+                    return None
+                reply = busfilter.parse_reply(packet.data) if packet.type == hostlink.TEXT else None
+                if reply is not None:
+                    return reply
+        finally:
+            self.reader.unsubscribe(token)
+
+    def read_packets(self) -> List[hostlink.Packet]:
+        """Read whatever the device has sent, as hostlink Packets (without the reader thread)"""
+        data = self.ser.read(self.ser.in_waiting)
+        return list(self.decoder.feed(data)) if data else []
+
+    def _print_device_output(self):
+        for packet in self.read_packets():
+            if self.verbose:
+                print(f"[DEVICE] {hostlink.format_packet(packet)}")
+
+    # ---- Background reader ---------------------------------------------
+
+    def start_reader(self) -> BusReader:
+        """Start the reader thread (idempotent); frames then arrive via queue/callbacks"""
+        if self.reader is None:
+            self.reader = BusReader(self.ser, self.link, self.validate,
+                                    self.stats if self.validate else None)
+            self.reader.subscribe(self._print_packet, packets=True)
+            self.reader.start()
+        return self.reader
+
+    def stop_reader(self):
+        if self.reader is not None:
+            self.reader.stop()
+            self.reader = None
+
+    def subscribe(self, callback: Callable, cmd_ids: Optional[Iterable[int]] = None) -> int:
+        """Call callback(frame, packet) from the reader thread for frames with these cmd_ids"""
+        return self.start_reader().subscribe(callback, cmd_ids)
+
+    def unsubscribe(self, token: int):
+        if self.reader is not None:
+            self.reader.unsubscribe(token)
+
+    def _print_packet(self, frame: Optional[DJIFrame], packet: hostlink.Packet):
+        """Reader callback: device output (and every frame while monitoring)"""
+        if self._dashboard is not None:
+            return  # The dashboard shows it; printing would break the screen
+        if self._monitoring:
+            print(f"[{time.strftime('%H:%M:%S')}] {hostlink.format_packet(packet)}")
+        elif frame is None and self.verbose:
+            print(f"[DEVICE] {hostlink.format_packet(packet)}")
+
     def receive(self, timeout: float = 5.0) -> List[DJIFrame]:
         """Receive frames from RS-485 bus"""
         if not self.ser or not self.ser.is_open:
@@ -186,57 +248,65 @@ class RS485Interface:
             return []
 
         frames = []
-        start_time = time.time()
+        reader = self.start_reader()
+        reader.drain()
+        deadline = time.monotonic() + timeout
 
         print(f"Listening for {timeout}s...")
 
-        while time.time() - start_time < timeout:
-            if self.ser.in_waiting:
-                line = self.ser.readline().decode('utf-8', errors='ignore').strip()
-
-                if line.startswith('[RX<-485]'):
-                    # Parse received frame
-                    hex_data = line.split(']')[1].strip().replace(' ', '')
-                    try:
-                        data = bytes.fromhex(hex_data)
-                        frame = DJIFrame.decode(data)
-                        if frame:
-                            frames.append(frame)
-                            if self.verbose:
-                                print(f"[RECV] {frame}")
-                    except ValueError:
-                        pass
-
-                elif self.verbose and line:
-                    print(f"[DEVICE] {line}")
-
-            time.sleep(0.01)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            frame = reader.get(remaining)
+            if frame is None:
+                continue
+            frames.append(frame)
+            if self.verbose:
+                print(f"[RECV] {frame}")
 
         return frames
 
-    def monitor(self, duration: Optional[float] = None):
-        """Monitor RS-485 bus indefinitely or for duration"""
+    def monitor(self, duration: Optional[float] = None, show_dashboard: bool = False):
+        """
+        Monitor RS-485 bus indefinitely or for duration
+
+        Prints every frame, or with show_dashboard draws the latest state
+        (dashboard.py) at a fixed rate on its own thread instead.
+        """
         if not self.ser or not self.ser.is_open:
             print("Error: Not connected")
             return
 
         print("Monitoring RS-485 bus... (Ctrl+C to stop)")
-        start_time = time.time()
+        reader = self.start_reader()
+        view = None
+        if show_dashboard:
+            state = dashboard.BusState()
+            token = reader.subscribe(state.on_packet, packets=True)
+            view = dashboard.Dashboard(state, title=f"{self.port} ({self.link} link)")
+            self._dashboard = state
+            view.start()
+        else:
+            self._monitoring = True
 
         try:
-            while True:
-                if duration and (time.time() - start_time > duration):
-                    break
-
-                if self.ser.in_waiting:
-                    line = self.ser.readline().decode('utf-8', errors='ignore').strip()
-                    if line:
-                        print(f"[{time.strftime('%H:%M:%S')}] {line}")
-
-                time.sleep(0.01)
-
+            reader.wait(duration)
         except KeyboardInterrupt:
-            print("\nMonitoring stopped")
+            if view is None:
+                print("\nMonitoring stopped")
+        finally:
+            self._monitoring = False
+            if view is not None:
+                view.stop()
+                reader.unsubscribe(token)
+                self._dashboard = None
+                snap = state.snapshot()
+                print(view.summary(snap, view.rates(snap)))
+                print("Monitoring stopped")
+
+        if reader.error:
+            print(f"Error: serial read failed: {reader.error}")
 
 
 def main():
@@ -247,26 +317,49 @@ def main():
     parser.add_argument('-p', '--port', help='Serial port (auto-detect if not specified)')
     parser.add_argument('-b', '--baud', type=int, default=115200, help='Baud rate')
     parser.add_argument('-m', '--monitor', action='store_true', help='Monitor mode')
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help='Serve Prometheus metrics on http://127.0.0.1:PORT/metrics (see metrics.py)')
+    parser.add_argument('--dashboard', action='store_true',
+                        help='Monitor with a live dashboard instead of printing every frame')
     parser.add_argument('-q', '--quiet', action='store_true', help='Quiet mode')
+    parser.add_argument('--validate', choices=crc.VALIDATE_MODES,
+                        help='Check frame CRCs: flag bad frames or drop them')
+    parser.add_argument('--link', choices=hostlink.LINK_MODES, default=hostlink.ASCII,
+                        help='USB host link: ASCII hex lines or binary packets')
+    parser.add_argument('--filter', metavar='SPEC',
+                        help='Device-side cmd_id filter, e.g. "ALLOW A021 A0D0/10" (see busfilter.py)')
 
     args = parser.parse_args()
+    if args.filter:
+        try:
+            busfilter.FrameFilter.parse(args.filter)
+        except ValueError as e:
+            parser.error(f"--filter: {e}")
 
-    interface = RS485Interface(port=args.port, baudrate=args.baud)
+    interface = RS485Interface(port=args.port, baudrate=args.baud, link=args.link)
     interface.verbose = not args.quiet
+    interface.validate = args.validate
 
     if not interface.connect():
         return 1
 
+    metrics.serve_or_warn(args.metrics_port)
+
     try:
-        if args.monitor:
-            interface.monitor()
+        if args.filter:
+            interface.set_filter(args.filter)
+
+        if args.monitor or args.dashboard:
+            interface.monitor(show_dashboard=args.dashboard)
         else:
             # Interactive mode
             print("\nInteractive mode. Commands:")
             print("  send <cmd_id> <seq> <payload_hex>  - Send frame")
             print("  recv [timeout]                      - Receive frames")
             print("  raw <hex_bytes>                     - Send raw bytes")
+            print("  filter [ALLOW|DENY ids... | off]    - Device-side cmd_id filter")
             print("  monitor                             - Monitor bus")
+            print("  dashboard                           - Monitor bus with a live dashboard")
             print("  quit                                - Exit")
             print()
 
@@ -295,15 +388,26 @@ def main():
                         timeout = float(parts[1]) if len(parts) > 1 else 5.0
                         frames = interface.receive(timeout)
                         print(f"Received {len(frames)} frame(s)")
+                        if interface.validate:
+                            print("\n".join(interface.stats.report()))
 
                     elif parts[0] == 'raw' and len(parts) > 1:
                         hex_data = ' '.join(parts[1:]).replace(' ', '')
                         data = bytes.fromhex(hex_data)
                         interface.send_raw(data)
 
+                    elif parts[0] == 'filter':
+                        if len(parts) > 1:
+                            interface.set_filter(' '.join(parts[1:]))
+                        else:
+                            print(f"Device filter: {interface.filter}")
+
                     elif parts[0] == 'monitor':
                         interface.monitor()
 
+                    elif parts[0] == 'dashboard':
+                        interface.monitor(show_dashboard=True)
+
                     else:
                         print("Unknown command")
 
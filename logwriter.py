@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Background writer stage for the frame logger.
+
+The serial reader thread only queues records; a writer thread takes
+them off the queue in batches, formats and writes them, and flushes
+the files on a size/time policy (every flush_records records or
+flush_interval seconds, whichever comes first). A slow disk then delays
+the files instead of the USB reads.
+
+    writer = BatchWriter(flush=files.flush)
+    writer.start()
+    writer.put(write_line, "text\\n")   # write_line("text\\n") runs on the writer thread
+    writer.flush()                      # wait until everything queued is written and flushed
+    writer.close()                      # final drain (survives Ctrl+C)
+
+The queue is bounded: when it is full, put() blocks the reader, and
+that time is counted as backpressure in stats()/report().
+"""
+
+import queue
+import threading
+import time
+
+import metrics
+
+BATCH_SIZE = 500        # Records taken off the queue per write
+FLUSH_RECORDS = 2000    # Flush after this many records...
+FLUSH_INTERVAL = 0.5    # ...or this many seconds, whichever comes first
+MAX_QUEUE = 200000      # Records buffered before put() blocks the reader
+
+
+class _Barrier:
+    """Queue marker: flush, then wake up whoever is waiting"""
+
+    def __init__(self, stop=False):
+        self.done = threading.Event()
+        self.stop = stop
+
+
+class BatchWriter:
+    """Runs queued write calls on a background thread, in order"""
+
+    def __init__(self, flush=None, batch_size=BATCH_SIZE, flush_records=FLUSH_RECORDS,
+                 flush_interval=FLUSH_INTERVAL, max_queue=MAX_QUEUE):
+        self._flush = flush
+        self.batch_size = batch_size
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self.error = None  # First exception raised on the writer thread
+
+        self.queued = 0
+        self.written = 0
+        self.batches = 0
+        self.flushes = 0
+        self.max_depth = 0
+        self.blocked = 0         # put() calls that found the queue full
+        self.blocked_time = 0.0  # Seconds the reader spent waiting on a full queue
+        self.max_write_time = 0.0
+
+    # ---- Producer side -------------------------------------------------
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='BatchWriter', daemon=True)
+            self._thread.start()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def put(self, fn, *args):
+        """Queue fn(*args) to run on the writer thread."""
+        if self.error is not None:
+            raise self.error
+        item = (fn, args)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            t = time.monotonic()
+            self.blocked += 1
+            self._queue.put(item)
+            waited = time.monotonic() - t
+            self.blocked_time += waited
+            metrics.LOG_BACKPRESSURE.inc(waited)
+        self.queued += 1
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is written and flushed."""
+        if not self.running:
+            return True
+        barrier = _Barrier()
+        self._queue.put(barrier)
+        return barrier.done.wait(timeout)
+
+    def close(self):
+        """Drain the queue, flush and stop the thread (keeps draining through Ctrl+C)."""
+        if self._thread is None:
+            return
+        barrier = _Barrier(stop=True)
+        queued = False
+        while self._thread.is_alive():
+            try:
+                if not queued:
+                    self._queue.put(barrier)
+                    queued = True
+                self._thread.join()
+            except KeyboardInterrupt:
+                print(f"! Writing {self._queue.qsize()} queued records before exit...")
+        self._thread = None
+
+    # ---- Writer thread -------------------------------------------------
+
+    def _run(self):
+        pending = 0
+        last_flush = time.monotonic()
+
+        while True:
+            timeout = None
+            if pending:
+                timeout = max(0.0, last_flush + self.flush_interval - time.monotonic())
+            try:
+                batch = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            barriers = []
+            t = time.monotonic()
+            for item in batch:
+                if isinstance(item, _Barrier):
+                    barriers.append(item)
+                    continue
+                fn, args = item
+                try:
+                    fn(*args)
+                except Exception as e:
+                    if self.error is None:
+                        self.error = e
+                self.written += 1
+                pending += 1
+            if len(batch) > len(barriers):
+                self.batches += 1
+                metrics.LOG_RECORDS.inc(len(batch) - len(barriers))
+                metrics.LOG_BATCH_SECONDS.observe(time.monotonic() - t)
+            metrics.LOG_QUEUE_DEPTH.set(self._queue.qsize())
+
+            now = time.monotonic()
+            if barriers or pending >= self.flush_records or \
+                    (pending and now - last_flush >= self.flush_interval):
+                self._do_flush()
+                pending = 0
+                last_flush = time.monotonic()
+            self.max_write_time = max(self.max_write_time, time.monotonic() - t)
+
+            for barrier in barriers:
+                barrier.done.set()
+            if any(b.stop for b in barriers):
+                return
+
+    def _do_flush(self):
+        if self._flush is None:
+            return
+        try:
+            self._flush()
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+        self.flushes += 1
+
+    # ---- Statistics ----------------------------------------------------
+
+    def stats(self):
+        return {
+            'queued': self.queued,
+            'written': self.written,
+            'depth': self._queue.qsize(),
+            'max_depth': self.max_depth,
+            'batches': self.batches,
+            'flushes': self.flushes,
+            'blocked': self.blocked,
+            'blocked_s': self.blocked_time,
+            'max_write_ms': self.max_write_time * 1000,
+        }
+
+    def report(self):
+        """Return summary lines."""
+        s = self.stats()
+        lines = [
+            f"  Writer: {s['written']}/{s['queued']} records in {s['batches']} batches, "
+            f"{s['flushes']} flushes",
+            f"  Queue: max depth {s['max_depth']}, slowest batch {s['max_write_ms']:.1f}ms",
+        ]
+        if s['blocked']:
+            lines.append(f"  Backpressure: reader blocked {s['blocked']} times "
+                         f"({s['blocked_s']:.2f}s) on a full queue")
+        if self.error is not None:
+            lines.append(f"  Write error: {self.error}")
+        return lines
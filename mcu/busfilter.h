@@ -0,0 +1,144 @@
+// On-device cmd_id filter and decimation shared by busprint.ino and
+// interface.ino (Python side: busfilter.py)
+//
+//   FILTER OFF                  forward every frame (power-up default)
+//   FILTER ALLOW A021 A0D0/10   only these IDs; 0xA0D0 every 10th frame
+//   FILTER DENY A0D0 0303/C     all but 0xA0D0; 0x0303 only on payload change
+//   FILTER                      report the active filter
+//
+// A bare ID is forwarded in ALLOW mode and dropped in DENY mode. /N
+// forwards every Nth frame of that ID and /C only frames whose payload
+// (bytes 8..len-2) changed since the last one forwarded, in either mode.
+// Unlisted IDs are dropped in ALLOW mode and forwarded in DENY mode.
+// Payload changes are detected through a CRC-16 of the payload, so no
+// copy of the last payload is kept per ID.
+//
+// Include after hostlink.h (uses hostlinkCrc16).
+
+#ifndef BUSFILTER_H
+#define BUSFILTER_H
+
+#define MAX_FILTER_RULES 16
+#define FILTER_HEADER_SIZE 8
+
+#define FILTER_OFF   0
+#define FILTER_ALLOW 1
+#define FILTER_DENY  2
+
+#define FILTER_BARE    0       // every value: listed without a rate
+#define FILTER_CHANGED 0xFFFF  // every value: forward on payload change
+
+struct FilterRule {
+  uint16_t cmdId;
+  uint16_t every;    // FILTER_BARE, FILTER_CHANGED or N
+  uint16_t count;    // Position in the current group of N (every N)
+  uint16_t lastCrc;  // CRC-16 of the last forwarded payload (FILTER_CHANGED)
+  bool seen;
+};
+
+struct BusFilter {
+  uint8_t mode;
+  uint8_t nrules;
+  FilterRule rules[MAX_FILTER_RULES];
+  unsigned long filtered;  // Frames dropped since the filter was set
+};
+
+// Parse "ALLOW A021 A0D0/10" (the text after FILTER) into f; false on
+// bad input, leaving f unchanged. "OFF" clears the filter.
+static bool busFilterSet(BusFilter& f, const char* args) {
+  char buf[128];
+  strncpy(buf, args, sizeof(buf) - 1);
+  buf[sizeof(buf) - 1] = 0;
+
+  BusFilter next;
+  next.mode = FILTER_OFF;
+  next.nrules = 0;
+  next.filtered = 0;
+
+  char* word = strtok(buf, " ,");
+  if (word != NULL && strcasecmp(word, "OFF") != 0) {
+    if (strcasecmp(word, "ALLOW") == 0) next.mode = FILTER_ALLOW;
+    else if (strcasecmp(word, "DENY") == 0) next.mode = FILTER_DENY;
+    else return false;
+
+    while ((word = strtok(NULL, " ,")) != NULL) {
+      if (next.nrules >= MAX_FILTER_RULES) return false;
+      char* end;
+      long cmdId = strtol(word, &end, 16);
+      if (end == word || cmdId < 0 || cmdId > 0xFFFF) return false;
+
+      uint16_t every = FILTER_BARE;
+      if (*end == '/') {
+        char* rate = end + 1;
+        if (*rate == 'C' || *rate == 'c') {
+          every = FILTER_CHANGED;
+          end = rate + 1;
+        } else {
+          long n = strtol(rate, &end, 10);
+          if (end == rate || n < 1 || n >= FILTER_CHANGED) return false;
+          every = n;
+        }
+      }
+      if (*end != 0) return false;
+
+      FilterRule& r = next.rules[next.nrules++];
+      r.cmdId = cmdId;
+      r.every = every;
+      r.count = 0;
+      r.lastCrc = 0;
+      r.seen = false;
+    }
+  }
+  f = next;
+  return true;
+}
+
+// Active filter as "ALLOW A021 A0D0/10" or "OFF" (the FILTER reply)
+static String busFilterDescribe(const BusFilter& f) {
+  if (f.mode == FILTER_OFF) return String("OFF");
+  String s = f.mode == FILTER_ALLOW ? "ALLOW" : "DENY";
+  for (uint8_t i = 0; i < f.nrules; i++) {
+    char entry[12];
+    const FilterRule& r = f.rules[i];
+    if (r.every == FILTER_BARE) snprintf(entry, sizeof(entry), " %04X", r.cmdId);
+    else if (r.every == FILTER_CHANGED) snprintf(entry, sizeof(entry), " %04X/C", r.cmdId);
+    else snprintf(entry, sizeof(entry), " %04X/%u", r.cmdId, r.every);
+    s += entry;
+  }
+  return s;
+}
+
+// True if a complete frame should be sent to the host
+static bool busFilterAccept(BusFilter& f, const uint8_t* frame, uint8_t len) {
+  if (f.mode == FILTER_OFF || len < FILTER_HEADER_SIZE) return true;
+
+  uint16_t cmdId = frame[3] | (frame[4] << 8);
+  FilterRule* r = NULL;
+  for (uint8_t i = 0; i < f.nrules; i++) {
+    if (f.rules[i].cmdId == cmdId) {
+      r = &f.rules[i];
+      break;
+    }
+  }
+
+  bool pass;
+  if (r == NULL) {
+    pass = f.mode == FILTER_DENY;
+  } else if (r->every == FILTER_BARE) {
+    pass = f.mode == FILTER_ALLOW;
+  } else if (r->every == FILTER_CHANGED) {
+    uint8_t n = len > FILTER_HEADER_SIZE + 2 ? len - FILTER_HEADER_SIZE - 2 : 0;
+    uint16_t crc = hostlinkCrc16(frame + FILTER_HEADER_SIZE, n);
+    pass = !r->seen || crc != r->lastCrc;
+    r->seen = true;
+    r->lastCrc = crc;
+  } else {
+    pass = r->count == 0;  // First of every N
+    if (++r->count >= r->every) r->count = 0;
+  }
+
+  if (!pass) f.filtered++;
+  return pass;
+}
+
+#endif
@@ -11,19 +11,63 @@
 #define RS485_RX_PIN 7   // Informational only
 #define RE_DE_PIN 2      // Connect MAX485 RE+DE together and tie here
 
+#include "hostlink.h"    // Binary host protocol (MODE BIN)
+#include "busfilter.h"   // cmd_id filter / decimation (FILTER)
+
 // Try different baud rates if 115200 doesn't work
 #define RS485_BAUD 115200  // Common: 9600, 19200, 38400, 57600, 115200
 
 #define FRAME_SYNC 0x55
 #define MAX_FRAME_SIZE 64
+#define MIN_FRAME_SIZE 10  // Header (8) + CRC (2)
+
+// Idle gap that ends an incomplete frame: 3.5 character times (10 bits
+// each), as in Modbus RTU. Measured from when loop() read the last byte
+// out of the UART buffer, so the line has been silent at least this long
+// when a partial is reported. A sender that pauses this long inside a
+// frame gets it reported as a partial too.
+#define IDLE_GAP_US (35000000UL / RS485_BAUD)
 
 // Frame buffer
 uint8_t frameBuffer[MAX_FRAME_SIZE];
 uint8_t frameIndex = 0;
 bool inFrame = false;
-unsigned long frameStartTime = 0;
+unsigned long frameStartTime = 0;   // millis() at the first byte
+uint32_t frameStartUs = 0;          // micros() at the first byte
+uint32_t lastByteUs = 0;            // micros() at the latest byte (end of frame)
 unsigned long frameCount = 0;
 
+// Host link: ASCII lines (default) or binary COBS packets
+bool binaryMode = false;
+HostlinkRx hostRx;
+
+// Frames dropped before the USB link (FILTER command), off at power-up
+BusFilter filter = {FILTER_OFF, 0};
+
+// Periodic bus statistics (STATS <ms>, see busstats.py): per cmd_id
+// counts of everything seen on the bus, before the filter. IDs past the
+// table, and partials too short to carry an ID, go to the '*' entry.
+#define MAX_STAT_IDS 16
+#define MIN_STATS_INTERVAL_MS 100
+
+struct BusStat {
+  uint16_t cmdId;
+  uint32_t frames;
+  uint32_t bytes;
+  uint32_t badCrc;
+  uint32_t truncated;
+  uint32_t overLength;
+  uint32_t minGapUs;     // Start-to-start, 0 = fewer than two frames
+  uint32_t maxGapUs;
+  uint32_t lastStartUs;  // Kept across intervals
+  bool started;
+};
+
+BusStat busStats[MAX_STAT_IDS + 1];  // Last entry: '*'
+uint8_t statIds = 0;
+unsigned long statsIntervalMs = 0;   // 0 = off (power-up default)
+unsigned long statsStartMs = 0;
+
 void setup() {
   pinMode(RE_DE_PIN, OUTPUT);
   digitalWrite(RE_DE_PIN, LOW);       // Receive-only mode
@@ -37,97 +81,274 @@ void setup() {
   Serial1.begin(RS485_BAUD);          // RS-485 bus UART
 }
 
-void printFrame() {
-  // Output format: FRAME,<timestamp_ms>,<hex_bytes>
-  Serial.print("FRAME,");
-  Serial.print(frameStartTime);
-  Serial.print(",");
+// Length byte of the frame being received can still be valid
+bool plausibleLength() {
+  return frameIndex < 2 || (frameBuffer[1] >= MIN_FRAME_SIZE && frameBuffer[1] <= MAX_FRAME_SIZE);
+}
+
+// Status line to the host in the active mode
+void sendLine(const char* line) {
+  if (binaryMode) {
+    hostlinkSendText(line);
+  } else {
+    Serial.println(line);
+    Serial.flush();
+  }
+}
 
+// Hex bytes followed by the micros() stamps of the first and last byte
+void printHexAndMicros() {
   for (uint8_t i = 0; i < frameIndex; i++) {
     if (frameBuffer[i] < 0x10) Serial.print("0");
     Serial.print(frameBuffer[i], HEX);
     if (i < frameIndex - 1) Serial.print(" ");
   }
-  Serial.println();
-  Serial.flush();
+  Serial.print(",");
+  Serial.print(frameStartUs);
+  Serial.print(",");
+  Serial.println(lastByteUs);
+}
+
+void clearStat(BusStat& st) {
+  st.frames = st.bytes = st.badCrc = st.truncated = st.overLength = 0;
+  st.minGapUs = st.maxGapUs = 0;
+}
+
+void resetStats() {
+  statIds = 0;
+  clearStat(busStats[MAX_STAT_IDS]);
+  busStats[MAX_STAT_IDS].started = false;
+}
+
+// Counters for the frame in frameBuffer
+BusStat& statFor() {
+  BusStat& other = busStats[MAX_STAT_IDS];
+  if (frameIndex < 5) return other;
+  uint16_t cmdId = frameBuffer[3] | (frameBuffer[4] << 8);
+  for (uint8_t i = 0; i < statIds; i++) {
+    if (busStats[i].cmdId == cmdId) return busStats[i];
+  }
+  if (statIds >= MAX_STAT_IDS) return other;
+  BusStat& st = busStats[statIds++];
+  st.cmdId = cmdId;
+  st.started = false;
+  clearStat(st);
+  return st;
+}
+
+void countFrame() {
+  BusStat& st = statFor();
+  st.frames++;
+  st.bytes += frameIndex;
+  uint16_t crc = frameBuffer[frameIndex - 2] | (frameBuffer[frameIndex - 1] << 8);
+  if (hostlinkCrc16(frameBuffer, frameIndex - 2) != crc) st.badCrc++;
+  if (st.started) {
+    uint32_t gap = frameStartUs - st.lastStartUs;
+    if (st.minGapUs == 0 || gap < st.minGapUs) st.minGapUs = gap;
+    if (gap > st.maxGapUs) st.maxGapUs = gap;
+  }
+  st.lastStartUs = frameStartUs;
+  st.started = true;
+}
+
+// Frame cut off by the idle gap, or abandoned for an impossible length byte
+void countPartial() {
+  BusStat& st = statFor();
+  st.bytes += frameIndex;
+  if (plausibleLength()) st.truncated++;
+  else st.overLength++;
+}
+
+void sendStat(const BusStat& st, bool other, unsigned long now) {
+  char line[128];
+  char cmd[5] = "*";
+  if (!other) snprintf(cmd, sizeof(cmd), "%04X", st.cmdId);
+  snprintf(line, sizeof(line), "STATUS,%lu,BUS,%lu,%s,%lu,%lu,%lu,%lu,%lu,%lu,%lu",
+           now, statsIntervalMs, cmd,
+           (unsigned long)st.frames, (unsigned long)st.bytes, (unsigned long)st.badCrc,
+           (unsigned long)st.truncated, (unsigned long)st.overLength,
+           (unsigned long)st.minGapUs, (unsigned long)st.maxGapUs);
+  sendLine(line);
+}
+
+// One line per active ID, then '*' (ends the interval), and start the next
+void sendStats(unsigned long now) {
+  for (uint8_t i = 0; i < statIds; i++) {
+    if (busStats[i].frames || busStats[i].bytes) {
+      sendStat(busStats[i], false, now);
+      clearStat(busStats[i]);
+    }
+  }
+  sendStat(busStats[MAX_STAT_IDS], true, now);
+  clearStat(busStats[MAX_STAT_IDS]);
+}
+
+void printFrame() {
+  countFrame();
+  if (!busFilterAccept(filter, frameBuffer, frameIndex)) return;
+
+  if (binaryMode) {
+    // One packet, no flush: the USB stack batches packets at full bus rate
+    hostlinkSendUs(PKT_FRAME_US, frameBuffer, frameIndex, frameStartTime, frameStartUs, lastByteUs);
+    frameCount++;
+    return;
+  }
+
+  // Output format: FRAME,<timestamp_ms>,<hex_bytes>,<start_us>,<end_us>
+  Serial.print("FRAME,");
+  Serial.print(frameStartTime);
+  Serial.print(",");
+  printHexAndMicros();  // No flush: waiting for the USB host delays the next stamps
 
   frameCount++;
 }
 
+void printPartial() {
+  countPartial();
+  if (binaryMode) {
+    hostlinkSendUs(PKT_PARTIAL_US, frameBuffer, frameIndex, frameStartTime, frameStartUs, lastByteUs);
+    return;
+  }
+
+  // Output format: ERROR,<timestamp_ms>,TIMEOUT,<hex_bytes>,<start_us>,<end_us>
+  Serial.print("ERROR,");
+  Serial.print(frameStartTime);
+  Serial.print(",TIMEOUT,");
+  printHexAndMicros();
+}
+
+// Commands from the host (either mode); replies match the active mode
+void handleCommand(String cmd, unsigned long now) {
+  cmd.trim();
+  cmd.toUpperCase();
+
+  if (cmd == "STATS") {
+    String status = "STATUS,";
+    status += now;
+    status += ",FRAMES=";
+    status += frameCount;
+    status += ",UPTIME=";
+    status += now / 1000;
+    status += "s";
+    status += ",FILTERED=";
+    status += filter.filtered;
+    sendLine(status.c_str());
+  }
+  else if (cmd.startsWith("STATS ")) {
+    // STATS <ms>: bus statistics records every <ms>, 0 stops them
+    long ms = cmd.substring(6).toInt();
+    if (ms < 0) ms = 0;
+    if (ms > 0 && ms < MIN_STATS_INTERVAL_MS) ms = MIN_STATS_INTERVAL_MS;
+    statsIntervalMs = ms;
+    statsStartMs = now;
+    resetStats();
+    String reply = "STATUS,";
+    reply += now;
+    reply += ",STATS_INTERVAL=";
+    reply += statsIntervalMs;
+    sendLine(reply.c_str());
+  }
+  else if (cmd == "RESET") {
+    frameCount = 0;
+    filter.filtered = 0;
+    sendLine("STATUS,RESET");
+  }
+  else if (cmd == "FILTER" || cmd.startsWith("FILTER ")) {
+    // FILTER alone reports the active filter; see busfilter.h
+    if (cmd.length() > 6 && !busFilterSet(filter, cmd.c_str() + 7)) {
+      sendLine("ERROR,BAD_FILTER");
+      return;
+    }
+    String reply = "FILTER,";
+    reply += busFilterDescribe(filter);
+    sendLine(reply.c_str());
+  }
+  else if (cmd == "MODE BIN") {
+    sendLine("MODE,BIN");
+    Serial.flush();
+    binaryMode = true;
+    hostRx.len = 0;
+    hostRx.overflow = false;
+  }
+  else if (cmd == "MODE ASCII") {
+    sendLine("MODE,ASCII");
+    Serial.flush();
+    binaryMode = false;
+  }
+}
+
 void loop() {
   unsigned long now = millis();
 
-  // Read and buffer bytes into frames
+  // Host closed the port: fall back to ASCII and no filter for the next session
+  if ((binaryMode || filter.mode != FILTER_OFF || statsIntervalMs) && !Serial) {
+    binaryMode = false;
+    busFilterSet(filter, "OFF");
+    statsIntervalMs = 0;
+  }
+
+  // Read and buffer bytes into frames. A frame ends at its length byte;
+  // a sync byte inside a frame does not restart it unless the length
+  // byte already read is impossible.
   while (Serial1.available() > 0) {
     uint8_t b = Serial1.read();
+    uint32_t us = micros();
 
-    // Detect frame start (0x55 sync byte)
-    if (b == FRAME_SYNC) {
-      // If we were already in a frame, output the previous one
-      if (inFrame && frameIndex > 0) {
-        printFrame();
-      }
-
+    if (b == FRAME_SYNC && (!inFrame || !plausibleLength())) {
+      if (inFrame) countPartial();  // Abandoned for its length byte
       // Start new frame
       frameIndex = 0;
       frameBuffer[frameIndex++] = b;
-      frameStartTime = now;
+      frameStartTime = millis();
+      frameStartUs = us;
+      lastByteUs = us;
       inFrame = true;
     }
     else if (inFrame && frameIndex < MAX_FRAME_SIZE) {
       frameBuffer[frameIndex++] = b;
+      lastByteUs = us;
 
-      // Check if frame is complete (have length field?)
-      if (frameIndex >= 2) {
-        uint8_t expectedLen = frameBuffer[1] + 2; // length + sync + length byte
-
-        if (frameIndex >= expectedLen && expectedLen <= MAX_FRAME_SIZE) {
-          printFrame();
-          inFrame = false;
-          frameIndex = 0;
-        }
+      // Complete once the length byte (total frame size) is reached
+      if (frameIndex >= 2 && frameIndex >= frameBuffer[1]) {
+        printFrame();
+        inFrame = false;
+        frameIndex = 0;
       }
     }
   }
 
-  // Timeout for incomplete frames (100ms)
-  if (inFrame && frameIndex > 0 && (now - frameStartTime > 100)) {
-    // Output partial frame with ERROR marker
-    Serial.print("ERROR,");
-    Serial.print(frameStartTime);
-    Serial.print(",TIMEOUT,");
-    for (uint8_t i = 0; i < frameIndex; i++) {
-      if (frameBuffer[i] < 0x10) Serial.print("0");
-      Serial.print(frameBuffer[i], HEX);
-      if (i < frameIndex - 1) Serial.print(" ");
-    }
-    Serial.println();
-    Serial.flush();
-
+  // Idle gap: the RX buffer is empty and the line has been silent for
+  // IDLE_GAP_US since the last byte, so the frame is not going to finish.
+  // Only checked with nothing buffered, so a slow loop (USB writes) does
+  // not look like a gap. Unsigned subtraction handles the micros() wrap.
+  if (inFrame && frameIndex > 0 && (uint32_t)(micros() - lastByteUs) > IDLE_GAP_US) {
+    printPartial();
     inFrame = false;
     frameIndex = 0;
   }
 
-  // Handle commands from Serial Monitor
-  if (Serial.available()) {
-    String cmd = Serial.readStringUntil('\n');
-    cmd.trim();
-    cmd.toUpperCase();
-
-    if (cmd == "STATS") {
-      Serial.print("STATUS,");
-      Serial.print(now);
-      Serial.print(",FRAMES=");
-      Serial.print(frameCount);
-      Serial.print(",UPTIME=");
-      Serial.print(now / 1000);
-      Serial.println("s");
-      Serial.flush();
-    }
-    else if (cmd == "RESET") {
-      frameCount = 0;
-      Serial.println("STATUS,RESET");
-      Serial.flush();
+  if (statsIntervalMs && now - statsStartMs >= statsIntervalMs) {
+    statsStartMs += statsIntervalMs;
+    if (now - statsStartMs >= statsIntervalMs) statsStartMs = now;  // Fell behind
+    sendStats(now);
+  }
+
+  // Handle commands from Serial Monitor / host
+  if (binaryMode) {
+    uint8_t type;
+    uint8_t payload[HOSTLINK_MAX_PAYLOAD + 1];
+    while (binaryMode && Serial.available() > 0) {
+      int16_t n = hostlinkFeed(hostRx, Serial.read(), &type, payload);
+      if (n < 0) {
+        hostlinkSendText("ERROR,BAD_PACKET");
+      }
+      else if (n > 0 && type == PKT_TEXT) {
+        payload[n] = 0;
+        handleCommand(String((char*)payload), now);
+      }
     }
   }
+  else if (Serial.available()) {
+    handleCommand(Serial.readStringUntil('\n'), now);
+  }
 }
@@ -0,0 +1,198 @@
+// Binary host protocol shared by interface.ino and busprint.ino
+// (Python side: hostlink.py)
+//
+// Packet before COBS encoding:
+//   [type] [len] [payload: len bytes] [CRC-16 LE over type+len+payload]
+// COBS-encoded so the packet contains no 0x00, then terminated by 0x00.
+// CRC-16 is the DJI bus CRC (seed 0x3692). FRAME, TX_DONE and PARTIAL
+// payloads start with a u32 LE millis() stamp followed by the bus bytes.
+// FRAME_US and PARTIAL_US start with u32 millis(), u32 micros() of the
+// first byte and u32 micros() of the last byte (host unwraps micros()
+// against millis()).
+//
+// The device boots in ASCII mode. The host switches with the ASCII line
+// "MODE BIN" (answered by "MODE,BIN") and back with a TEXT packet
+// "MODE ASCII". Closing the USB port (DTR low) also returns to ASCII.
+
+#ifndef HOSTLINK_H
+#define HOSTLINK_H
+
+#define PKT_FRAME   0x01  // device->host: stamp + frame received on the bus
+#define PKT_TX      0x02  // host->device: bytes to transmit on the bus
+#define PKT_TX_DONE 0x03  // device->host: stamp + bytes transmitted
+#define PKT_PARTIAL 0x04  // device->host: stamp + partial frame (RX timeout)
+#define PKT_TEXT    0x05  // both: ASCII status line or command
+#define PKT_FRAME_US   0x06  // device->host: millis + micros start/end + frame
+#define PKT_PARTIAL_US 0x07  // device->host: millis + micros start/end + partial frame
+
+#define HOSTLINK_SEED 0x3692
+#define HOSTLINK_MAX_PAYLOAD 128
+#define HOSTLINK_MAX_BODY (HOSTLINK_MAX_PAYLOAD + 4)
+#define HOSTLINK_MAX_ENCODED (HOSTLINK_MAX_BODY + HOSTLINK_MAX_BODY / 254 + 1)
+
+static const uint16_t HOSTLINK_CRC_TABLE[256] = {
+  0x0000, 0x9705, 0x2E01, 0xB904, 0x5C02, 0xCB07, 0x7203, 0xE506,
+  0xB804, 0x2F01, 0x9605, 0x0100, 0xE406, 0x7303, 0xCA07, 0x5D02,
+  0x7003, 0xE706, 0x5E02, 0xC907, 0x2C01, 0xBB04, 0x0200, 0x9505,
+  0xC807, 0x5F02, 0xE606, 0x7103, 0x9405, 0x0300, 0xBA04, 0x2D01,
+  0xE006, 0x7703, 0xCE07, 0x5902, 0xBC04, 0x2B01, 0x9205, 0x0500,
+  0x5802, 0xCF07, 0x7603, 0xE106, 0x0400, 0x9305, 0x2A01, 0xBD04,
+  0x9005, 0x0700, 0xBE04, 0x2901, 0xCC07, 0x5B02, 0xE206, 0x7503,
+  0x2801, 0xBF04, 0x0600, 0x9105, 0x7403, 0xE306, 0x5A02, 0xCD07,
+  0xC007, 0x5702, 0xEE06, 0x7903, 0x9C05, 0x0B00, 0xB204, 0x2501,
+  0x7803, 0xEF06, 0x5602, 0xC107, 0x2401, 0xB304, 0x0A00, 0x9D05,
+  0xB004, 0x2701, 0x9E05, 0x0900, 0xEC06, 0x7B03, 0xC207, 0x5502,
+  0x0800, 0x9F05, 0x2601, 0xB104, 0x5402, 0xC307, 0x7A03, 0xED06,
+  0x2001, 0xB704, 0x0E00, 0x9905, 0x7C03, 0xEB06, 0x5202, 0xC507,
+  0x9805, 0x0F00, 0xB604, 0x2101, 0xC407, 0x5302, 0xEA06, 0x7D03,
+  0x5002, 0xC707, 0x7E03, 0xE906, 0x0C00, 0x9B05, 0x2201, 0xB504,
+  0xE806, 0x7F03, 0xC607, 0x5102, 0xB404, 0x2301, 0x9A05, 0x0D00,
+  0x8005, 0x1700, 0xAE04, 0x3901, 0xDC07, 0x4B02, 0xF206, 0x6503,
+  0x3801, 0xAF04, 0x1600, 0x8105, 0x6403, 0xF306, 0x4A02, 0xDD07,
+  0xF006, 0x6703, 0xDE07, 0x4902, 0xAC04, 0x3B01, 0x8205, 0x1500,
+  0x4802, 0xDF07, 0x6603, 0xF106, 0x1400, 0x8305, 0x3A01, 0xAD04,
+  0x6003, 0xF706, 0x4E02, 0xD907, 0x3C01, 0xAB04, 0x1200, 0x8505,
+  0xD807, 0x4F02, 0xF606, 0x6103, 0x8405, 0x1300, 0xAA04, 0x3D01,
+  0x1000, 0x8705, 0x3E01, 0xA904, 0x4C02, 0xDB07, 0x6203, 0xF506,
+  0xA804, 0x3F01, 0x8605, 0x1100, 0xF406, 0x6303, 0xDA07, 0x4D02,
+  0x4002, 0xD707, 0x6E03, 0xF906, 0x1C00, 0x8B05, 0x3201, 0xA504,
+  0xF806, 0x6F03, 0xD607, 0x4102, 0xA404, 0x3301, 0x8A05, 0x1D00,
+  0x3001, 0xA704, 0x1E00, 0x8905, 0x6C03, 0xFB06, 0x4202, 0xD507,
+  0x8805, 0x1F00, 0xA604, 0x3101, 0xD407, 0x4302, 0xFA06, 0x6D03,
+  0xA004, 0x3701, 0x8E05, 0x1900, 0xFC06, 0x6B03, 0xD207, 0x4502,
+  0x1800, 0x8F05, 0x3601, 0xA104, 0x4402, 0xD307, 0x6A03, 0xFD06,
+  0xD007, 0x4702, 0xFE06, 0x6903, 0x8C05, 0x1B00, 0xA204, 0x3501,
+  0x6803, 0xFF06, 0x4602, 0xD107, 0x3401, 0xA304, 0x1A00, 0x8D05
+};
+
+static inline uint16_t hostlinkCrc16(const uint8_t* data, uint16_t len, uint16_t crc = HOSTLINK_SEED) {
+  for (uint16_t i = 0; i < len; i++) {
+    crc = HOSTLINK_CRC_TABLE[(crc ^ data[i]) & 0xFF] ^ (crc >> 8);
+  }
+  return crc;
+}
+
+// COBS-encode src into dst; returns the encoded length (no 0x00 delimiter)
+static uint16_t cobsEncode(const uint8_t* src, uint16_t len, uint8_t* dst) {
+  uint16_t codeIdx = 0;
+  uint16_t out = 1;
+  uint8_t code = 1;
+
+  for (uint16_t i = 0; i < len; i++) {
+    if (src[i] == 0) {
+      dst[codeIdx] = code;
+      codeIdx = out++;
+      code = 1;
+    } else {
+      dst[out++] = src[i];
+      if (++code == 0xFF) {
+        dst[codeIdx] = code;
+        codeIdx = out++;
+        code = 1;
+      }
+    }
+  }
+  dst[codeIdx] = code;
+  return out;
+}
+
+// COBS-decode src into dst; returns the decoded length or -1 if malformed
+static int16_t cobsDecode(const uint8_t* src, uint16_t len, uint8_t* dst) {
+  uint16_t in = 0;
+  uint16_t out = 0;
+
+  while (in < len) {
+    uint8_t code = src[in++];
+    if (code == 0 || in + code - 1 > len) return -1;
+    for (uint8_t k = 1; k < code; k++) dst[out++] = src[in++];
+    if (code < 0xFF && in < len) dst[out++] = 0;
+  }
+  return out;
+}
+
+static inline uint16_t hostlinkPutU32(uint8_t* dst, uint32_t v) {
+  dst[0] = v & 0xFF;
+  dst[1] = (v >> 8) & 0xFF;
+  dst[2] = (v >> 16) & 0xFF;
+  dst[3] = (v >> 24) & 0xFF;
+  return 4;
+}
+
+// Send one packet to the host with a single USB write: up to three u32
+// stamps (nstamps) in front of the data
+static void hostlinkSendStamps(uint8_t type, const uint8_t* data, uint8_t len,
+                               uint8_t nstamps, const uint32_t* stamps) {
+  uint8_t body[HOSTLINK_MAX_BODY];
+  uint8_t out[HOSTLINK_MAX_ENCODED + 1];
+  uint8_t extra = nstamps * 4;
+  if (len > HOSTLINK_MAX_PAYLOAD - extra) len = HOSTLINK_MAX_PAYLOAD - extra;
+
+  uint16_t n = 0;
+  body[n++] = type;
+  body[n++] = len + extra;
+  for (uint8_t i = 0; i < nstamps; i++) n += hostlinkPutU32(body + n, stamps[i]);
+  memcpy(body + n, data, len);
+  n += len;
+
+  uint16_t crc = hostlinkCrc16(body, n);
+  body[n++] = crc & 0xFF;
+  body[n++] = crc >> 8;
+
+  uint16_t m = cobsEncode(body, n, out);
+  out[m++] = 0x00;
+  Serial.write(out, m);
+}
+
+static inline void hostlinkSend(uint8_t type, const uint8_t* data, uint8_t len,
+                                bool stamped = false, uint32_t stamp = 0) {
+  hostlinkSendStamps(type, data, len, stamped ? 1 : 0, &stamp);
+}
+
+// FRAME_US / PARTIAL_US: millis() plus micros() of the first and last byte
+static inline void hostlinkSendUs(uint8_t type, const uint8_t* data, uint8_t len,
+                                  uint32_t ms, uint32_t startUs, uint32_t endUs) {
+  uint32_t stamps[3] = {ms, startUs, endUs};
+  hostlinkSendStamps(type, data, len, 3, stamps);
+}
+
+static inline void hostlinkSendText(const char* text) {
+  hostlinkSend(PKT_TEXT, (const uint8_t*)text, strlen(text));
+}
+
+// Receive state for packets coming from the host
+struct HostlinkRx {
+  uint8_t buf[HOSTLINK_MAX_ENCODED];
+  uint16_t len;
+  bool overflow;
+};
+
+// Feed one byte from the host. Returns the payload length once a valid
+// packet is complete (type in *type, payload copied to payload), 0 while
+// waiting (or for an empty packet) and -1 for bad framing, length or CRC.
+static int16_t hostlinkFeed(HostlinkRx& rx, uint8_t b, uint8_t* type, uint8_t* payload) {
+  if (b != 0x00) {
+    if (rx.len < sizeof(rx.buf)) rx.buf[rx.len++] = b;
+    else rx.overflow = true;
+    return 0;
+  }
+
+  uint16_t len = rx.len;
+  bool overflow = rx.overflow;
+  rx.len = 0;
+  rx.overflow = false;
+  if (len == 0) return 0;  // Idle delimiter
+  if (overflow) return -1;
+
+  uint8_t body[HOSTLINK_MAX_ENCODED];
+  int16_t n = cobsDecode(rx.buf, len, body);
+  if (n < 4 || body[1] != n - 4) return -1;
+
+  uint16_t crc = body[n - 2] | (body[n - 1] << 8);
+  if (hostlinkCrc16(body, n - 2) != crc) return -1;
+
+  *type = body[0];
+  memcpy(payload, body + 2, body[1]);
+  return body[1];
+}
+
+#endif
@@ -11,6 +11,9 @@
 #define RS485_RX_PIN 7   // XIAO RX (informational)
 #define RE_DE_PIN 2      // Connect MAX485 RE and DE together to this GPIO
 
+#include "hostlink.h"    // Binary host protocol (MODE BIN)
+#include "busfilter.h"   // cmd_id filter / decimation (FILTER)
+
 // Frame constants
 #define FRAME_SYNC 0x55
 #define MAX_FRAME_SIZE 64
@@ -22,6 +25,13 @@ uint8_t rxIndex = 0;
 unsigned long lastRxTime = 0;
 bool inFrame = false;
 
+// Host link: ASCII hex lines (default) or binary COBS packets
+bool binaryMode = false;
+HostlinkRx hostRx;
+
+// Received frames dropped before the USB link (FILTER command)
+BusFilter filter = {FILTER_OFF, 0};
+
 void setup() {
   pinMode(RE_DE_PIN, OUTPUT);
   digitalWrite(RE_DE_PIN, LOW);      // Receive mode by default
@@ -34,6 +44,7 @@ void setup() {
   Serial.println("DJI ESC RS-485 Interface Ready");
   Serial.println("Commands: TX:HHHHH... (hex bytes), RX (receive mode)");
   Serial.println("Format: 55 1A 00 D0 A0 ...");
+  Serial.println("MODE BIN switches to the binary host protocol");
 }
 
 // Calculate simple 16-bit checksum (placeholder - replace with actual DJI algorithm)
@@ -56,6 +67,11 @@ void send485Frame(uint8_t* frame, uint8_t len) {
   delayMicroseconds(50);              // Turnaround guard
   digitalWrite(RE_DE_PIN, LOW);       // Back to receive
 
+  if (binaryMode) {
+    hostlinkSend(PKT_TX_DONE, frame, len, true, millis());
+    return;
+  }
+
   // Log to console
   Serial.print("[TX->485] ");
   for (uint8_t i = 0; i < len; i++) {
@@ -69,6 +85,12 @@ void send485Frame(uint8_t* frame, uint8_t len) {
 // Process received frame
 void processRxFrame(uint8_t* frame, uint8_t len) {
   if (len < 8) return; // Too short
+  if (!busFilterAccept(filter, frame, len)) return;
+
+  if (binaryMode) {
+    hostlinkSend(PKT_FRAME, frame, len, true, lastRxTime);
+    return;
+  }
 
   Serial.print("[RX<-485] ");
   for (uint8_t i = 0; i < len; i++) {
@@ -119,9 +141,98 @@ bool parseHexCommand(String cmd, uint8_t* buffer, uint8_t* outLen) {
   return len > 0;
 }
 
+// Status line to the host in the active mode
+void sendLine(const char* line) {
+  if (binaryMode) hostlinkSendText(line);
+  else Serial.println(line);
+}
+
+// FILTER [ALLOW|DENY ids... | OFF]: set and/or report the frame filter
+void handleFilterCommand(String cmd) {
+  if (cmd.length() > 6 && !busFilterSet(filter, cmd.c_str() + 7)) {
+    sendLine("ERROR,BAD_FILTER");
+    return;
+  }
+  String reply = "FILTER,";
+  reply += busFilterDescribe(filter);
+  sendLine(reply.c_str());
+}
+
+// Text commands shared by both host modes (TX: only in ASCII mode)
+void handleTextCommand(String cmd) {
+  if (cmd == "MODE BIN") {
+    Serial.println("MODE,BIN");
+    Serial.flush();
+    binaryMode = true;
+    hostRx.len = 0;
+    hostRx.overflow = false;
+  }
+  else if (cmd == "MODE ASCII") {
+    if (binaryMode) hostlinkSendText("MODE,ASCII");
+    else Serial.println("MODE,ASCII");
+    Serial.flush();
+    binaryMode = false;
+  }
+  else if (cmd == "FILTER" || cmd.startsWith("FILTER ")) {
+    handleFilterCommand(cmd);
+  }
+  else if (cmd == "RX") {
+    Serial.println("Receive mode active (always listening)");
+  }
+  else if (cmd == "HELP") {
+    Serial.println("Commands:");
+    Serial.println("  TX:HHHHH...  - Send hex bytes on 485 bus");
+    Serial.println("  RX           - Status (always receiving)");
+    Serial.println("  MODE BIN     - Switch to binary host protocol");
+    Serial.println("  FILTER ...   - Forward only some command IDs (FILTER ALLOW A021 A0D0/10)");
+    Serial.println("Example: TX:55 1A 00 D0 A0 00 00 01 AC 03 AC 03 AC 03 AC 03 AC 03 AC 03 AC 03 AC 03 00 00");
+  }
+  else {
+    Serial.println("Unknown command. Type HELP");
+  }
+}
+
+// Binary mode: decode packets from the host
+void handleHostPackets() {
+  uint8_t type;
+  uint8_t payload[HOSTLINK_MAX_PAYLOAD];
+
+  while (binaryMode && Serial.available() > 0) {
+    int16_t n = hostlinkFeed(hostRx, Serial.read(), &type, payload);
+    if (n < 0) {
+      hostlinkSendText("ERROR,BAD_PACKET");
+    }
+    else if (n > 0 && type == PKT_TX) {
+      if (n <= MAX_FRAME_SIZE) send485Frame(payload, n);
+      else hostlinkSendText("ERROR,TOO_LONG");
+    }
+    else if (n > 0 && type == PKT_TEXT) {
+      char text[HOSTLINK_MAX_PAYLOAD + 1];
+      memcpy(text, payload, n);
+      text[n] = 0;
+      String cmd(text);
+      cmd.trim();
+      if (cmd == "MODE ASCII" || cmd.startsWith("FILTER")) {
+        handleTextCommand(cmd);
+      } else {
+        hostlinkSendText("ERROR,UNKNOWN_COMMAND");
+      }
+    }
+  }
+}
+
 void loop() {
+  // Host closed the port: fall back to ASCII and no filter for the next session
+  if ((binaryMode || filter.mode != FILTER_OFF) && !Serial) {
+    binaryMode = false;
+    busFilterSet(filter, "OFF");
+  }
+
   // Handle USB commands
-  if (Serial.available()) {
+  if (binaryMode) {
+    handleHostPackets();
+  }
+  else if (Serial.available()) {
     String cmd = Serial.readStringUntil('\n');
     cmd.trim();
 
@@ -137,17 +248,8 @@ void loop() {
         Serial.println("Error: Invalid hex format");
       }
     }
-    else if (cmd == "RX") {
-      Serial.println("Receive mode active (always listening)");
-    }
-    else if (cmd == "HELP") {
-      Serial.println("Commands:");
-      Serial.println("  TX:HHHHH...  - Send hex bytes on 485 bus");
-      Serial.println("  RX           - Status (always receiving)");
-      Serial.println("Example: TX:55 1A 00 D0 A0 00 00 01 AC 03 AC 03 AC 03 AC 03 AC 03 AC 03 AC 03 AC 03 00 00");
-    }
     else {
-      Serial.println("Unknown command. Type HELP");
+      handleTextCommand(cmd);
     }
   }
 
@@ -181,6 +283,13 @@ void loop() {
 
   // Timeout on partial frame
   if (inFrame && (now - lastRxTime > RX_TIMEOUT_MS)) {
+    if (binaryMode) {
+      hostlinkSend(PKT_PARTIAL, rxBuffer, rxIndex, true, lastRxTime);
+      inFrame = false;
+      rxIndex = 0;
+      return;
+    }
+
     Serial.print("[RX TIMEOUT] Partial: ");
     for (uint8_t i = 0; i < rxIndex; i++) {
       if (rxBuffer[i] < 0x10) Serial.print("0");
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Pipeline metrics in Prometheus text format.
+
+A small registry of counters, gauges and histograms (standard library
+only) that the capture and command tools update as they run:
+
+    frame read    djiesc_serial_reads_total, djiesc_serial_read_bytes_total,
+                  djiesc_serial_backlog_bytes (bytes waiting in the OS buffer)
+    decode        djiesc_frames_total{cmd_id}, djiesc_decode_failures_total{stage},
+                  djiesc_partial_frames_total
+    log write     djiesc_log_batch_seconds, djiesc_log_flush_seconds,
+                  djiesc_log_queue_depth, djiesc_log_backpressure_seconds_total
+    command send  djiesc_commands_sent_total{cmd_id}, djiesc_command_send_seconds,
+                  djiesc_command_jitter_seconds, djiesc_commands_missed_total
+
+Frames/s per cmd_id is rate(djiesc_frames_total[1m]) on the Prometheus
+side. buslog.py and interface.py take --metrics-port, and test_throttle.py
+takes a fourth argument. Each serves the registry on
+http://127.0.0.1:<port>/metrics for the bench rig's Prometheus to scrape:
+
+    python3 buslog.py --metrics-port 9105
+    curl -s localhost:9105/metrics | grep djiesc_frames_total
+
+Updates take a lock and a few additions, so they are cheap enough for
+every frame. Rendering happens on the HTTP server thread.
+"""
+
+import bisect
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = 'djiesc_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_HOST = '127.0.0.1'
+
+# Seconds; from 50 us (a serial write) up to 1 s (a stalled disk)
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class _Metric:
+    """A named metric with zero or more label names; one child per label set"""
+
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, *values):
+        """Child for these label values (created on first use)."""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _only(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} needs labels {self.labelnames}")
+        return self._children[()]
+
+    def _label_text(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines += self._render_child(values, child)
+        return lines
+
+
+class _Value:
+    __slots__ = ('value', 'lock', 'function')
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+        self.function = None
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def set_function(self, function):
+        """Read the value from function() at every scrape instead."""
+        self.function = function
+
+    def get(self):
+        return self.function() if self.function is not None else self.value
+
+
+class Counter(_Metric):
+    """Monotonic count (name should end in _total)"""
+
+    kind = 'counter'
+    _new_child = staticmethod(_Value)
+
+    def inc(self, amount=1):
+        self._only().inc(amount)
+
+    def get(self):
+        return self._only().get()
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{self._label_text(values)} {_format_value(child.get())}"]
+
+
+class Gauge(Counter):
+    """Value that goes up and down (queue depth, backlog)"""
+
+    kind = 'gauge'
+
+    def set(self, value):
+        self._only().set(value)
+
+    def dec(self, amount=1):
+        self._only().dec(amount)
+
+    def set_function(self, function):
+        self._only().set_function(function)
+
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum', 'lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # Last: above every bound
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager observing the seconds its block takes."""
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ('target', 'start')
+
+    def __init__(self, target):
+        self.target = target
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.target.observe(time.perf_counter() - self.start)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labels)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._only().observe(value)
+
+    def time(self):
+        return self._only().time()
+
+    def _render_child(self, values, child):
+        with child.lock:
+            counts = list(child.counts)
+            total = child.sum
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + (math.inf,), counts):
+            cumulative += n
+            le = (('le', _format_value(float(bound))),)
+            lines.append(f"{self.name}_bucket{self._label_text(values, le)} {cumulative}")
+        labels = self._label_text(values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Metrics by name; the factories return the existing metric on repeated calls"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already a {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, labels, buckets)
+
+    def render(self):
+        """Every metric in Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# ---- Pipeline metrics ------------------------------------------------------
+
+SERIAL_READS = REGISTRY.counter(PREFIX + 'serial_reads_total', 'Bulk reads from the USB serial port')
+SERIAL_BYTES = REGISTRY.counter(PREFIX + 'serial_read_bytes_total', 'Bytes read from the USB serial port')
+SERIAL_BACKLOG = REGISTRY.gauge(
+    PREFIX + 'serial_backlog_bytes', 'Bytes waiting in the serial input buffer at the last read')
+USB_ERRORS = REGISTRY.counter(PREFIX + 'usb_packet_errors_total',
+                              'Corrupt binary-link packets dropped')
+
+FRAMES = REGISTRY.counter(PREFIX + 'frames_total', 'Frames decoded, by command ID', ('cmd_id',))
+DECODE_FAILURES = REGISTRY.counter(
+    PREFIX + 'decode_failures_total',
+    'Frames that could not be decoded (hex) or failed validation (frame)', ('stage',))
+PARTIALS = REGISTRY.counter(PREFIX + 'partial_frames_total',
+                            'Incomplete frames reported by the device')
+
+LOG_BATCH_SECONDS = REGISTRY.histogram(PREFIX + 'log_batch_seconds',
+                                       'Time to write one batch of log records')
+LOG_FLUSH_SECONDS = REGISTRY.histogram(PREFIX + 'log_flush_seconds', 'Time to flush the log files')
+LOG_RECORDS = REGISTRY.counter(PREFIX + 'log_records_total', 'Records written to the log files')
+LOG_QUEUE_DEPTH = REGISTRY.gauge(PREFIX + 'log_queue_depth', 'Records waiting for the writer thread')
+LOG_BACKPRESSURE = REGISTRY.counter(PREFIX + 'log_backpressure_seconds_total',
+                                    'Time the reader waited on a full writer queue')
+
+COMMANDS_SENT = REGISTRY.counter(PREFIX + 'commands_sent_total', 'Frames sent to the bus, by command ID',
+                                 ('cmd_id',))
+COMMAND_SEND_SECONDS = REGISTRY.histogram(PREFIX + 'command_send_seconds',
+                                          'Time to write and flush one command to the serial port')
+COMMAND_JITTER = REGISTRY.histogram(PREFIX + 'command_jitter_seconds',
+                                    'How late each streamed command was sent after its deadline')
+COMMANDS_MISSED = REGISTRY.counter(PREFIX + 'commands_missed_total',
+                                   'Streamed command ticks skipped after falling behind')
+
+_frame_counters = {}
+_command_counters = {}
+
+
+def _cmd_label(cmd_id):
+    return f"0x{cmd_id:04X}"
+
+
+def count_frame(cmd_id, n=1):
+    """Count a decoded frame (per-cmd_id child cached, so this is cheap per frame)."""
+    child = _frame_counters.get(cmd_id)
+    if child is None:
+        child = _frame_counters[cmd_id] = FRAMES.labels(_cmd_label(cmd_id))
+    child.inc(n)
+
+
+def count_command(cmd_id, seconds):
+    """Count a command written to the serial port and how long the write took."""
+    child = _command_counters.get(cmd_id)
+    if child is None:
+        child = _command_counters[cmd_id] = COMMANDS_SENT.labels(_cmd_label(cmd_id))
+    child.inc()
+    COMMAND_SEND_SECONDS.observe(seconds)
+
+
+def read_done(nbytes, backlog):
+    """Record one bulk serial read (backlog: in_waiting when it started)."""
+    SERIAL_READS.inc()
+    SERIAL_BYTES.inc(nbytes)
+    SERIAL_BACKLOG.set(backlog)
+
+
+# ---- HTTP endpoint ---------------------------------------------------------
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # No per-scrape console lines
+
+
+def serve(port, host=DEFAULT_HOST, registry=REGISTRY):
+    """
+    Serve registry on http://host:port/metrics from a daemon thread.
+
+    Returns the server (server.shutdown() stops it). Port 0 picks a free
+    port, found in server.server_address.
+    """
+    handler = type('Handler', (_Handler,), {'registry': registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='Metrics', daemon=True)
+    thread.start()
+    return server
+
+
+def serve_or_warn(port, host=DEFAULT_HOST, registry=REGISTRY):
+    """
+    serve() for the tools' --metrics-port: prints the URL, or a warning if
+    the port cannot be bound. Returns the server, or None (also for port None).
+    """
+    if port is None:
+        return None
+    try:
+        server = serve(port, host, registry)
+    except OSError as e:
+        print(f"! Cannot serve metrics on port {port}: {e}")
+        return None
+    print(f"✓ Metrics on http://{host}:{server.server_address[1]}/metrics")
+    return server
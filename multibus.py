@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Drive all eight T40 motors over several RS-485 buses from one command clock.
+
+Each bus is one SAMD21 + MAX485 adapter (an RS485Interface) carrying one
+0xA021 frame with 4 throttle slots; which motor sits in which slot is set
+per bus (T40_ARCHITECTURE.md, hypothesis 1: motors 1-4 on bus A, 5-8 on
+bus B). A single CommandStreamer tick patches every bus's frame first and
+then writes them back to back, so the skew between buses is one USB write,
+not a scheduler period. The per-bus 0xA0D0 telemetry is merged into one
+stream ordered by (aligned) time:
+
+    rig = MultiBusController([Bus('/dev/cu.usbmodem1101', (1, 2, 3, 4)),
+                              Bus('/dev/cu.usbmodem1201', (5, 6, 7, 8))], rate_hz=100)
+    rig.connect()
+    rig.arm()
+    rig.set_throttles({1: 1200, 5: 1200})
+    record = rig.telemetry.get(timeout=1.0)   # Telemetry(time, bus, tick, frame)
+    rig.disconnect()
+
+WARNING: DO NOT RUN WITH PROPELLERS ATTACHED!
+"""
+
+import heapq
+import itertools
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+from typing import Dict, List, Optional, Sequence
+
+import hostlink
+import streamer
+from frame import A021Template, A021_FRAME_SIZE, CMD_ESC_TELEMETRY, DISARMED, IDLE, DJIFrame
+from interface import RS485Interface
+
+MOTORS = 8
+SLOTS = 4
+MAX_SKEW = 0.002       # Seconds between the first and last bus write of a tick
+ALIGN_WINDOW = 0.02    # Telemetry is held this long so later-arriving buses sort in
+SKEW_WINDOW = 1000     # Recent ticks kept for percentile skew
+
+# port, and the motor number (1-8) in each of the 4 throttle slots (None = unused)
+Bus = namedtuple('Bus', ['port', 'motors'])
+
+# time: host monotonic seconds (device stamp mapped onto it when the link has one)
+# bus: index into MultiBusController.buses, tick: commands sent when it arrived
+Telemetry = namedtuple('Telemetry', ['time', 'bus', 'tick', 'frame'])
+
+
+def default_motors(index: int) -> tuple:
+    """Motors 1-4 on the first bus, 5-8 on the second; later buses get none."""
+    return tuple(index * SLOTS + s + 1 if index * SLOTS + s < MOTORS else None
+                 for s in range(SLOTS))
+
+
+class TelemetryMerger:
+    """Re-orders records from several reader threads into one time-ordered stream"""
+
+    def __init__(self, window: float = ALIGN_WINDOW, maxlen: int = 10000):
+        self.window = window
+        self.maxlen = maxlen
+        self._heap = []
+        self._order = itertools.count()  # Tie-break for equal times
+        self._cond = threading.Condition()
+        self._last_out = float('-inf')
+
+        # Counters
+        self.received = 0
+        self.dropped = 0   # Oldest records discarded because nobody was reading
+        self.late = 0      # Records released out of order (arrived after the window)
+
+    def push(self, record: Telemetry):
+        with self._cond:
+            if len(self._heap) >= self.maxlen:
+                heapq.heappop(self._heap)
+                self.dropped += 1
+            heapq.heappush(self._heap, (record.time, next(self._order), record))
+            self.received += 1
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Telemetry]:
+        """Oldest record once it has aged past the window, or None after timeout."""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._heap:
+                    release = self._heap[0][0] + self.window
+                    if release <= now:
+                        record = heapq.heappop(self._heap)[2]
+                        if record.time < self._last_out:
+                            self.late += 1
+                        self._last_out = max(self._last_out, record.time)
+                        return record
+                    wait = release - now
+                else:
+                    wait = None
+                if end is not None:
+                    if now >= end:
+                        return None
+                    wait = end - now if wait is None else min(wait, end - now)
+                self._cond.wait(wait)
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class MultiBusController:
+    """One 0xA021 frame per bus, all sent from a single scheduler tick"""
+
+    def __init__(self, buses: Sequence[Bus], baudrate: int = 115200, rate_hz: float = 12.5,
+                 catch_up: str = streamer.SKIP, link: str = hostlink.ASCII,
+                 max_skew: float = MAX_SKEW):
+        self.buses = list(buses)
+        assigned = [m for bus in self.buses for m in bus.motors if m is not None]
+        if len(assigned) != len(set(assigned)):
+            raise ValueError("a motor is assigned to more than one bus slot")
+
+        self.interfaces = [RS485Interface(bus.port, baudrate, link) for bus in self.buses]
+        for iface in self.interfaces:
+            iface.verbose = False
+        self.templates = [A021Template() for _ in self.buses]
+        self.telemetry = TelemetryMerger()
+        self.max_skew = max_skew
+        self.streamer = streamer.CommandStreamer(
+            self._send_tick, rate_hz=rate_hz, catch_up=catch_up,
+            max_rate=streamer.bus_rate_limit(baudrate, A021_FRAME_SIZE))
+
+        self._tokens: List[int] = []
+        self._offsets: List[Optional[float]] = [None] * len(self.buses)
+        self._lines: List[Optional[bytes]] = [None] * len(self.buses)
+
+        # Skew stats
+        self.skew_max = 0.0
+        self.skew_over = 0    # Ticks whose skew exceeded max_skew
+        self.write_errors = 0
+        self._skew = deque(maxlen=SKEW_WINDOW)
+
+    # ---- Connection ----------------------------------------------------
+
+    def connect(self) -> bool:
+        for i, iface in enumerate(self.interfaces):
+            if not iface.connect():
+                self.disconnect()
+                return False
+            self._tokens.append(iface.subscribe(self._on_telemetry(i), cmd_ids={CMD_ESC_TELEMETRY}))
+        return True
+
+    def disconnect(self):
+        self.stop_stream()
+        for iface, token in zip(self.interfaces, self._tokens):
+            iface.unsubscribe(token)
+        self._tokens = []
+        for iface in self.interfaces:
+            iface.disconnect()
+
+    # ---- Commands ------------------------------------------------------
+
+    def setpoints(self, throttles: Dict[int, int], armed: bool = True,
+                  state_byte: int = 0x40) -> tuple:
+        """Per-bus Setpoints for {motor: throttle}; unset slots keep their idle value."""
+        idle = IDLE[1:5]
+        result = []
+        for bus in self.buses:
+            slots = [throttles.get(m, idle[s]) if m is not None else idle[s]
+                     for s, m in enumerate(bus.motors)]
+            slots += idle[len(slots):]
+            result.append(IDLE._make((armed, *slots[:SLOTS], state_byte)))
+        return tuple(result)
+
+    def stream(self, setpoints: tuple, ticks: Optional[int] = None):
+        """Make setpoints (one per bus) the streamed commands; optionally wait for ticks sends."""
+        self.streamer.set(setpoints)
+        if not self.streamer.running:
+            self.streamer.start()
+        if ticks:
+            self.streamer.wait_ticks(ticks, timeout=ticks * self.streamer.period + 1.0)
+
+    def stop_stream(self):
+        if self.streamer.running:
+            self.streamer.stop()
+
+    def arm(self):
+        self.stream(tuple(IDLE for _ in self.buses), ticks=5)
+
+    def disarm(self):
+        self.stream(tuple(DISARMED for _ in self.buses), ticks=5)
+
+    def set_throttles(self, throttles: Dict[int, int], state_byte: int = 0x40):
+        """Set motor throttles (motor number 1-8 -> value); other motors idle."""
+        self.stream(self.setpoints(throttles, True, state_byte))
+
+    def _send_tick(self, setpoints: tuple):
+        """Streamer tick: patch every bus frame, then write them back to back."""
+        lines = self._lines
+        for i, (template, setpoint) in enumerate(zip(self.templates, setpoints)):
+            template.update(*setpoint)
+            link = self.interfaces[i].link
+            lines[i] = template.tx_line() if link == hostlink.ASCII else \
+                hostlink.tx_command(template.buf, link)
+
+        first = time.monotonic()
+        for iface, line in zip(self.interfaces, lines):
+            try:
+                iface.ser.write(line)
+            except Exception:
+                self.write_errors += 1
+        skew = time.monotonic() - first
+
+        self._skew.append(skew)
+        if skew > self.skew_max:
+            self.skew_max = skew
+        if skew > self.max_skew:
+            self.skew_over += 1
+
+    # ---- Telemetry -----------------------------------------------------
+
+    def _on_telemetry(self, bus: int):
+        def callback(frame: DJIFrame, packet: hostlink.Packet):
+            now = time.monotonic()
+            t = now
+            if packet.timestamp is not None:
+                # Map the adapter's millis() onto the host clock; the smallest
+                # host-minus-device offset seen is the one with the least USB delay
+                device = packet.timestamp / 1000.0
+                if packet.start_us is not None:  # Firmware with micros() stamps
+                    device = packet.start_us / 1e6
+                offset = self._offsets[bus]
+                if offset is None or now - device < offset:
+                    offset = self._offsets[bus] = now - device
+                t = device + offset
+            self.telemetry.push(Telemetry(t, bus, self.streamer.sent, frame))
+        return callback
+
+    # ---- Statistics ----------------------------------------------------
+
+    def report(self) -> List[str]:
+        skews = sorted(self._skew)
+        p99 = skews[min(len(skews) - 1, int(len(skews) * 0.99))] if skews else 0.0
+        lines = ["Command stream:"] + self.streamer.report()
+        lines.append(f"  Bus skew: p99 {p99 * 1000:.3f}ms  max {self.skew_max * 1000:.3f}ms  "
+                     f"over {self.max_skew * 1000:.1f}ms: {self.skew_over}  "
+                     f"write errors: {self.write_errors}")
+        t = self.telemetry
+        lines.append(f"Telemetry: {t.received} merged, {t.late} late, {t.dropped} dropped")
+        for i, (bus, iface) in enumerate(zip(self.buses, self.interfaces)):
+            motors = ','.join('-' if m is None else str(m) for m in bus.motors)
+            frames = iface.reader.frame_count if iface.reader else 0
+            lines.append(f"  Bus {i} {bus.port} (motors {motors}): {frames} frames")
+        return lines
+
+
+def parse_bus(text: str, index: int) -> Bus:
+    """"PORT" or "PORT:m1,m2,m3,m4" (use - for an unused slot)."""
+    port, _, motors = text.partition(':')
+    if not motors:
+        return Bus(port, default_motors(index))
+    slots = tuple(None if m in ('-', '') else int(m) for m in motors.split(','))
+    if len(slots) > SLOTS or any(m is not None and not 1 <= m <= MOTORS for m in slots):
+        raise ValueError(f"bad motor list {motors!r}")
+    return Bus(port, slots)
+
+
+def main():
+    """Arm every bus, hold idle (or a test throttle) and print merged telemetry."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Drive several DJI ESC buses from one command clock')
+    parser.add_argument('buses', nargs='+', metavar='PORT[:m1,m2,m3,m4]',
+                        help='Serial port per bus, optionally with the motor in each slot')
+    parser.add_argument('-b', '--baud', type=int, default=115200, help='Baud rate')
+    parser.add_argument('--link', choices=hostlink.LINK_MODES, default=hostlink.ASCII,
+                        help='USB host link: ASCII hex lines or binary packets')
+    parser.add_argument('-r', '--rate', type=float, default=12.5, help='Commands per second per bus')
+    parser.add_argument('-d', '--duration', type=float, default=5.0, help='Seconds to hold')
+    parser.add_argument('-t', '--throttle', action='append', default=[], metavar='MOTOR=VALUE',
+                        help='Throttle for one motor while holding (repeatable)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only print the summary')
+    args = parser.parse_args()
+
+    try:
+        buses = [parse_bus(text, i) for i, text in enumerate(args.buses)]
+        throttles = {int(m): int(v) for m, v in (t.split('=') for t in args.throttle)}
+        rig = MultiBusController(buses, args.baud, args.rate, link=args.link)
+    except ValueError as e:
+        parser.error(str(e))
+
+    print("WARNING: DO NOT RUN WITH PROPELLERS ATTACHED!")
+    if not rig.connect():
+        return 1
+
+    try:
+        print(f"Arming {len(buses)} bus(es)...")
+        rig.arm()
+        if throttles:
+            print(f"Throttles: {throttles}")
+            rig.set_throttles(throttles)
+
+        end = time.monotonic() + args.duration
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            record = rig.telemetry.get(timeout=remaining)
+            if record is not None and not args.quiet:
+                print(f"{record.time:.4f} bus{record.bus} tick {record.tick}: "
+                      f"{record.frame.telemetry}")
+    except KeyboardInterrupt:
+        print()
+    finally:
+        print("Disarming...")
+        rig.disarm()
+        rig.stop_stream()
+        print("\n".join(rig.report()))
+        rig.disconnect()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
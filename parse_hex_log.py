@@ -8,98 +8,58 @@ import sys
 import re
 import struct
 
+import crc16 as crc
+import framing
+from frame import DJIFrame
+
+# 0xA021 fields shown: u32 at [0:4], u16 at [4:6], u16 at [8:10]
+FC_QUERY = struct.Struct('<IH2xH')
+
 def parse_hex_log(log_file):
     """Extract bytes from busprint.ino hex output"""
-    bytes_list = []
-
     with open(log_file, 'r') as f:
-        for line in f:
-            # Match lines with hex bytes like: "[123] 0x55 0x1A 0x00 ..."
-            hex_matches = re.findall(r'0x([0-9A-Fa-f]{2})', line)
-            for hex_byte in hex_matches:
-                bytes_list.append(int(hex_byte, 16))
+        # Match hex bytes like: "[123] 0x55 0x1A 0x00 ..."
+        hex_matches = re.findall(r'0x([0-9A-Fa-f]{2})', f.read())
 
-    return bytes_list
+    return bytes.fromhex(''.join(hex_matches))
 
 def extract_frames(data):
-    """Extract frames starting with 0x55 sync byte"""
-    frames = []
-    i = 0
-
-    while i < len(data):
-        # Look for sync byte
-        if data[i] == 0x55:
-            if i + 1 < len(data):
-                length = data[i + 1]
-                frame_size = length + 2  # +2 for sync and length byte
-
-                if i + frame_size <= len(data):
-                    frame = data[i:i+frame_size]
-                    frames.append(frame)
-                    i += frame_size
-                else:
-                    i += 1
-            else:
-                i += 1
-        else:
-            i += 1
-
-    return frames
-
-def decode_frame(frame):
-    """Decode DJI ESC frame"""
-    if len(frame) < 10:
-        return None
-
-    sync = frame[0]
-    length = frame[1]
-    flags = frame[2]
-    cmd_id = struct.unpack('<H', bytes(frame[3:5]))[0]
-    reserved = struct.unpack('<H', bytes(frame[5:7]))[0]
-    sequence = frame[7]
-    payload = frame[8:-2]
-    checksum = struct.unpack('<H', bytes(frame[-2:]))[0]
-
-    result = {
-        'sync': sync,
-        'length': length,
-        'flags': flags,
-        'cmd_id': cmd_id,
-        'reserved': reserved,
-        'sequence': sequence,
-        'payload': payload,
-        'checksum': checksum,
-        'raw': frame
-    }
-
-    return result
-
-def analyze_frame(frame_data):
+    """Extract frames starting with 0x55 sync byte (memoryviews into data)"""
+    if not isinstance(data, (bytes, bytearray)):
+        data = bytes(data)
+    return list(framing.iter_frames(data))
+
+def decode_frame(frame, validate=None, stats=None):
+    """
+    Decode DJI ESC frame into a DJIFrame referencing the capture bytes
+
+    validate: None, 'flag' (sets status/crc_ok) or 'drop' (bad frames -> None)
+    stats: optional crc.FrameStats counting validation results
+    """
+    return DJIFrame.decode(frame, validate, stats)
+
+def analyze_frame(frame):
     """Analyze and print frame details"""
-    cmd_id = frame_data['cmd_id']
+    cmd_id = frame.cmd_id
 
     if cmd_id == 0xA0D0:
         # ESC Telemetry
-        payload = frame_data['payload']
-        values = []
-        for i in range(0, len(payload), 2):
-            if i+1 < len(payload):
-                val = struct.unpack('<H', bytes(payload[i:i+2]))[0]
-                values.append(val)
-
-        print(f"  ESC Telemetry (0xA0D0) SEQ:{frame_data['sequence']}")
+        values = frame.telemetry
+        if values is None:  # Short payload: decode the words that are there
+            payload = frame.payload
+            values = [v for (v,) in struct.iter_unpack('<H', payload[:len(payload) & ~1])]
+
+        print(f"  ESC Telemetry (0xA0D0) SEQ:{frame.sequence}")
         if values:
             voltage = values[0] * 0.051
             print(f"    Voltage: {voltage:.2f}V (raw:{values[0]})")
-            print(f"    Values: {values}")
+            print(f"    Values: {list(values)}")
 
     elif cmd_id == 0xA021:
         # FC Query
-        payload = frame_data['payload']
+        payload = frame.payload
         if len(payload) >= 10:
-            timestamp = struct.unpack('<I', bytes(payload[0:4]))[0]
-            val_u16 = struct.unpack('<H', bytes(payload[4:6]))[0]
-            voltage_raw = struct.unpack('<H', bytes(payload[8:10]))[0]
+            timestamp, val_u16, voltage_raw = FC_QUERY.unpack_from(payload)
             voltage = voltage_raw * 0.051
 
             print(f"  FC Query (0xA021)")
@@ -111,14 +71,19 @@ def analyze_frame(frame_data):
         print(f"  Unknown CMD: 0x{cmd_id:04X}")
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python3 parse_hex_log.py <hex_log.txt>")
-        print()
-        print("Copy output from Arduino Serial Monitor to a text file,")
-        print("then run this script to parse and decode the frames.")
-        return 1
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Parse and decode busprint.ino hex output',
+        epilog='Copy output from Arduino Serial Monitor to a text file, '
+               'then run this script to parse and decode the frames.')
+    parser.add_argument('log_file', help='hex log text file')
+    parser.add_argument('--validate', choices=crc.VALIDATE_MODES,
+                        help='Check frame CRCs: flag bad frames or drop them')
+    args = parser.parse_args()
 
-    log_file = sys.argv[1]
+    log_file = args.log_file
+    stats = crc.FrameStats() if args.validate else None
 
     print(f"Parsing {log_file}...")
     data = parse_hex_log(log_file)
@@ -128,10 +93,14 @@ def main():
     print(f"Extracted {len(frames)} frames\n")
 
     # Analyze frames
+    decoded_frames = []
     for i, frame in enumerate(frames):
-        decoded = decode_frame(frame)
+        decoded = decode_frame(frame, args.validate, stats)
         if decoded:
+            decoded_frames.append(decoded)
             print(f"Frame {i+1}: {len(frame)} bytes")
+            if decoded.crc_ok is False:
+                print(f"  !! {decoded.status.upper()}")
             analyze_frame(decoded)
 
             # Print raw hex
@@ -141,11 +110,9 @@ def main():
 
     # Statistics
     cmd_counts = {}
-    for frame in frames:
-        decoded = decode_frame(frame)
-        if decoded:
-            cmd_id = decoded['cmd_id']
-            cmd_counts[cmd_id] = cmd_counts.get(cmd_id, 0) + 1
+    for decoded in decoded_frames:
+        cmd_id = decoded.cmd_id
+        cmd_counts[cmd_id] = cmd_counts.get(cmd_id, 0) + 1
 
     print("=" * 60)
     print("Statistics:")
@@ -153,6 +120,10 @@ def main():
         cmd_name = "ESC Telemetry" if cmd_id == 0xA0D0 else "FC Query" if cmd_id == 0xA021 else "Unknown"
         print(f"  0x{cmd_id:04X} ({cmd_name}): {count} frames")
 
+    if stats is not None:
+        print("\nFrame validation:")
+        print("\n".join(stats.report()))
+
     return 0
 
 if __name__ == '__main__':
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Replay a recorded capture through the live host pipeline.
+
+Frames from a buslog .csv, a decode.py .csv or a .djicap capture (the .log
+files carry no frame bytes) are re-emitted as busprint.ino would send
+them, with their recorded timestamp_ms (and micros() stamps, if the
+capture has them), in ASCII or binary link mode:
+
+    real time     --speed 1 (default)
+    accelerated   --speed 10
+    max speed     --speed 0   (paced only by how fast the consumer reads)
+
+Output goes to a pty (any tool can open it like the real logger), or
+straight into an in-process FrameLogger or RS485Interface reader over a
+loopback serial object, which gives a regression and throughput check of
+the read/decode/log path against real traffic:
+
+    python3 replay.py captures/cap3.csv                  # prints the pty name
+    python3 buslog.py -p /dev/pts/N -o replayed          # replayed.csv == cap3.csv
+    python3 replay.py captures/cap3.csv -s 0 --to logger -o /tmp/replayed --link binary
+    python3 replay.py captures/cap3.csv -s 0 --to reader
+"""
+
+import sys
+import threading
+import time
+
+import numpy as np
+
+import capload
+import hostlink
+import simbus
+from buslog import FrameLogger
+from interface import RS485Interface
+
+START_DELAY = 3.0  # Seconds after the port opens before replay starts (buslog waits 2s)
+BATCH = 2000       # Frames emitted per device loop at max speed
+
+
+class Replayer:
+    """Paces the frames of a Capture by their recorded timestamp_ms"""
+
+    def __init__(self, cap, speed=1.0, start_ms=None, end_ms=None, loop=False):
+        if start_ms is not None or end_ms is not None:
+            rows = cap.select(-np.inf if start_ms is None else start_ms,
+                              np.inf if end_ms is None else end_ms)
+        else:
+            rows = np.arange(len(cap))
+        self.timestamp_ms = cap.timestamp_ms[rows]
+        self.start_us = cap.start_us[rows]
+        self.end_us = cap.end_us[rows]
+        self.raw = cap.raw[rows]
+        self.size = cap.size[rows]
+        self.speed = speed  # 0 = as fast as possible
+        self.loop = loop
+
+        # A looped capture continues after its last frame plus one median gap
+        span = 0
+        if len(rows):
+            gaps = np.diff(self.timestamp_ms)
+            span = int(self.timestamp_ms[-1] - self.timestamp_ms[0])
+            span += int(np.median(gaps)) if len(gaps) else 1
+        self.span_ms = span
+
+        self.pos = 0
+        self.laps = 0
+        self.emitted = 0
+        self.started = None
+        self.finished = None
+
+    def __len__(self):
+        return len(self.timestamp_ms)
+
+    @property
+    def done(self):
+        return self.pos >= len(self) and not self.loop
+
+    def start(self, now):
+        self.pos = 0
+        self.laps = 0
+        self.emitted = 0
+        self.started = now
+        self.finished = None
+
+    def _timestamp(self, i):
+        return int(self.timestamp_ms[i]) + self.laps * self.span_ms
+
+    def next_time(self):
+        """Wall-clock time (monotonic) the next frame is due, None when done."""
+        if self.started is None or not len(self) or self.done:
+            return None
+        if not self.speed:
+            return self.started
+        elapsed_ms = self._timestamp(self.pos) - int(self.timestamp_ms[0])
+        return self.started + elapsed_ms / 1000.0 / self.speed
+
+    def _micros(self, i):
+        """(start_us, end_us) of frame i, or (None, None) if the capture has none."""
+        start = int(self.start_us[i])
+        if start < 0:
+            return None, None
+        shift = self.laps * self.span_ms * 1000
+        return start + shift, max(int(self.end_us[i]), start) + shift  # .djicap: start only
+
+    def due(self, now, limit=BATCH):
+        """Yield (timestamp_ms, frame bytes, start_us, end_us) for every frame due by now."""
+        count = 0
+        while count < limit and not self.done:
+            due = self.next_time()
+            if due is None or due > now:
+                break
+            i = self.pos
+            yield (self._timestamp(i), self.raw[i, :self.size[i]].tobytes()) + self._micros(i)
+            count += 1
+            self.pos += 1
+            self.emitted += 1
+            if self.pos >= len(self) and self.loop:
+                self.pos = 0
+                self.laps += 1
+        if self.done and self.finished is None:
+            self.finished = now
+
+    def report(self):
+        if self.started is None:
+            return ["  Replay not started"]
+        end = self.finished if self.finished is not None else time.monotonic()
+        wall = max(end - self.started, 1e-9)
+        recorded = (self._timestamp(self.pos - 1) - int(self.timestamp_ms[0])) / 1000.0 \
+            if self.emitted else 0.0
+        return [
+            f"  Replayed {self.emitted} frames ({self.laps} loops) in {wall:.2f}s: "
+            f"{self.emitted / wall:.0f} frames/s",
+            f"  Recorded span {recorded:.2f}s -> {recorded / wall:.1f}x real time",
+        ]
+
+
+class ReplayDevice(simbus.SimDevice):
+    """busprint.ino whose bus traffic is a recorded capture"""
+
+    def __init__(self, replayer, transport=None, start_delay=START_DELAY):
+        super().__init__(simbus.BUSPRINT, transport, telemetry_hz=0, fc_hz=0)
+        self.replayer = replayer
+        self.start_delay = start_delay
+        self.lossless = True  # A replay is only useful if every frame arrives
+        self.finished = threading.Event()
+        self._start_at = None
+
+    def _on_connect(self, now):
+        super()._on_connect(now)
+        self._start_at = now + self.start_delay
+
+    def _command(self, cmd):
+        super()._command(cmd)
+        if cmd.strip().upper().startswith('MODE') and self._start_at is not None:
+            self._start_at = min(self._start_at, time.monotonic())  # Link set up: go
+
+    def _next_due(self, now):
+        if self.replayer.started is None:
+            return self._start_at if self._start_at is not None else now + 0.01
+        due = self.replayer.next_time()
+        return now + 0.01 if due is None else due
+
+    def _bus_tick(self, now):
+        replayer = self.replayer
+        if replayer.started is None:
+            if self._start_at is None or now < self._start_at:
+                return
+            replayer.start(now)
+        for ms, data, start_us, end_us in replayer.due(now):
+            self._on_frame(ms & 0xFFFFFFFF, data, start_us, end_us)
+        if replayer.done:
+            self.finished.set()
+
+
+def _replay_to_logger(device, args):
+    """Feed an in-process FrameLogger over the loopback port."""
+    logger = FrameLogger(validate=args.validate, link=args.link)
+    logger.ser = device.serial
+    device.start()
+    logger.negotiate_link()
+    if not logger.open_log_files(args.output, binary=args.binary):
+        return 1
+
+    def stop_when_done():
+        device.finished.wait()
+        logger.stop()
+
+    threading.Thread(target=stop_when_done, daemon=True).start()
+    try:
+        logger.run()
+    finally:
+        logger.close()
+    return 0
+
+
+def _replay_to_reader(device, args):
+    """Feed an in-process RS485Interface reader thread over the loopback port."""
+    iface = RS485Interface(link=args.link)
+    iface.verbose = False
+    iface.validate = args.validate
+    iface.ser = device.serial
+    device.start()
+    iface.link, _ = hostlink.negotiate(iface.ser, args.link)
+
+    received = [0]
+
+    def on_frame(frame, packet):
+        received[0] += 1
+
+    iface.subscribe(on_frame)
+    device.finished.wait()
+    while iface.ser.in_waiting:  # Let the reader catch up
+        time.sleep(0.01)
+    time.sleep(0.1)
+    iface.stop_reader()
+    print(f"  Reader: {received[0]} frames ({iface.link} link)")
+    if args.validate:
+        print("\n".join(iface.stats.report()))
+    return 0
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Replay a capture through the host pipeline')
+    parser.add_argument('capture', help='Capture file (.csv or .djicap)')
+    parser.add_argument('-s', '--speed', type=float, default=1.0,
+                        help='Playback speed (1 = real time, 0 = as fast as possible)')
+    parser.add_argument('--start', type=float, help='First timestamp_ms to replay')
+    parser.add_argument('--end', type=float, help='Replay up to this timestamp_ms')
+    parser.add_argument('--loop', action='store_true', help='Repeat the capture (Ctrl+C to stop)')
+    parser.add_argument('--to', choices=('pty', 'logger', 'reader'), default='pty',
+                        help='pty: virtual serial port; logger/reader: in-process consumer')
+    parser.add_argument('--link', choices=hostlink.LINK_MODES, default=hostlink.ASCII,
+                        help='USB link for in-process consumers (a pty client negotiates its own)')
+    parser.add_argument('--validate', choices=('flag', 'drop'),
+                        help='Check frame CRCs in the consumer')
+    parser.add_argument('-o', '--output', help='Output base name for --to logger')
+    parser.add_argument('--binary', action='store_true', help='--to logger: write a .djicap')
+    args = parser.parse_args()
+
+    try:
+        cap = capload.load_capture(args.capture)
+    except (OSError, KeyError, ValueError) as e:
+        parser.error(f"cannot load {args.capture}: {e}")
+    if args.loop and args.to != 'pty':
+        parser.error("--loop only works with --to pty")
+
+    replayer = Replayer(cap, args.speed, args.start, args.end, args.loop)
+    speed = f"{args.speed:g}x" if args.speed else "max speed"
+    print(f"{args.capture}: {len(replayer)} frames at {speed}")
+
+    if args.to == 'pty':
+        device = ReplayDevice(replayer)
+        print(f"Replaying on {device.port} once it is opened (Ctrl+C to stop)", flush=True)
+        device.start()
+        try:
+            while not device.finished.wait(0.5):
+                pass
+            print("Replay finished; Ctrl+C to close the port")
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print()
+        finally:
+            device.close()
+        status = 0
+    else:
+        device = ReplayDevice(replayer, simbus.LoopbackTransport(), start_delay=0.2)
+        try:
+            if args.to == 'logger':
+                status = _replay_to_logger(device, args)
+            else:
+                status = _replay_to_reader(device, args)
+        except KeyboardInterrupt:
+            print()
+            status = 0
+        finally:
+            device.close()
+
+    print("\n".join(replayer.report()))
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
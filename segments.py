@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Rotating, compressed capture segments for long buslog.py sessions.
+
+A session is written as numbered segments instead of one unbounded
+.log/.csv pair. A new segment is started once the current one reaches
+max_bytes on disk or max_seconds of wall time:
+
+    soak.0001.log.gz  soak.0001.csv.gz
+    soak.0002.log.gz  soak.0002.csv.gz
+    ...
+    soak.manifest.json
+
+Text files are compressed as they are written (gzip, or zstd with the
+optional zstandard package). In buslog.py that happens on the logger's
+writer thread, not the serial reader. Binary-mode .djicap segments stay
+uncompressed so CaptureReader can still memory-map them; only their .log
+is compressed.
+
+The manifest lists every segment with its first/last timestamp_ms and
+frame count. It is rewritten whenever a segment opens or closes and on
+every flush, so a reader can open only the segments that cover a time
+window, also while the session is still running:
+
+    python3 segments.py soak.manifest.json --start 3600000 --end 3660000
+    cap = capload.load_segments('soak.manifest.json', 3600000, 3660000)
+"""
+
+import gzip
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import capfile
+
+try:
+    import zstandard
+except ImportError:  # optional: only needed for zstd segments
+    zstandard = None
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+COMPRESSION = (GZIP, ZSTD)
+SUFFIXES = {GZIP: '.gz', ZSTD: '.zst'}
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+MANIFEST_SUFFIX = '.manifest.json'
+CHECK_EVERY = 100  # Frames between rotation checks
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise RuntimeError("zstd compression requires zstandard (pip install zstandard)")
+
+
+def open_text(path):
+    """Open a capture text file for reading, decompressing .gz / .zst by suffix."""
+    path = str(path)
+    if path.endswith(SUFFIXES[GZIP]):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    if path.endswith(SUFFIXES[ZSTD]):
+        _require_zstd()
+        return zstandard.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, newline='')
+
+
+class TextOutput:
+    """Text file, optionally compressed as it is written, that knows its size on disk"""
+
+    def __init__(self, path, compress=None):
+        self.path = Path(path)
+        self.raw = open(self.path, 'wb')
+        if compress == GZIP:
+            self.stream = gzip.GzipFile(filename=self.path.name[:-3], fileobj=self.raw,
+                                        mode='wb', compresslevel=GZIP_LEVEL)
+        elif compress == ZSTD:
+            _require_zstd()
+            self.stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(
+                self.raw, closefd=False)
+        else:
+            self.stream = None
+        self.text = io.TextIOWrapper(self.stream or self.raw, encoding='utf-8', newline='')
+
+    def write(self, s):
+        return self.text.write(s)
+
+    def flush(self):
+        """Flush through the compressor, so the file is readable up to here."""
+        self.text.flush()
+        if self.stream is not None:
+            self.stream.flush()
+        self.raw.flush()
+
+    @property
+    def disk_bytes(self):
+        return self.raw.tell()
+
+    def close(self):
+        if self.raw.closed:
+            return
+        self.text.close()  # Ends the compressed stream (leaves raw open)
+        self.raw.close()
+
+
+class SegmentWriter:
+    """Writes a session as numbered segments, rotated by size or time, plus a manifest"""
+
+    def __init__(self, base, csv_header=None, binary=False, compress=None,
+                 max_bytes=None, max_seconds=None, log_header=None):
+        if compress not in (None,) + COMPRESSION:
+            raise ValueError(f"compress must be one of {COMPRESSION}")
+        if compress == ZSTD:
+            _require_zstd()
+        self.base = Path(base)
+        self.csv_header = csv_header
+        self.log_header = log_header  # Written at the top of every segment's .log
+        self.binary = binary
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.manifest_path = Path(str(base) + MANIFEST_SUFFIX)
+        self.segments = []
+        self.log_file = None
+        self.csv_file = None
+        self.capture = None
+        self._opened = None
+        self.open_segment()
+
+    @property
+    def current(self):
+        return self.segments[-1]
+
+    def files(self):
+        """(log_file, csv_file, capture) of the current segment."""
+        return self.log_file, self.csv_file, self.capture
+
+    def _path(self, ext, compressed=True):
+        suffix = SUFFIXES[self.compress] if self.compress and compressed else ''
+        return Path(f"{self.base}.{len(self.segments) + 1:04d}{ext}{suffix}")
+
+    def open_segment(self):
+        entry = {
+            'index': len(self.segments) + 1,
+            'log': None,
+            'first_ms': None,
+            'last_ms': None,
+            'frames': 0,
+            'bytes': 0,
+            'opened': datetime.now().isoformat(timespec='seconds'),
+            'closed': None,
+        }
+        log_path = self._path('.log')
+        self.log_file = TextOutput(log_path, self.compress)
+        if self.log_header:
+            self.log_file.write(self.log_header)
+        entry['log'] = log_path.name
+        if self.binary:
+            cap_path = self._path(capfile.EXTENSION, compressed=False)
+            self.capture = capfile.CaptureWriter(cap_path, capfile.TICK_US)
+            entry['capture'] = cap_path.name
+        else:
+            csv_path = self._path('.csv')
+            self.csv_file = TextOutput(csv_path, self.compress)
+            if self.csv_header:
+                self.csv_file.write(self.csv_header)
+            entry['csv'] = csv_path.name
+        self.segments.append(entry)
+        self._opened = time.monotonic()
+        self.write_manifest()
+        return entry
+
+    def close_segment(self):
+        entry = self.current
+        paths = [self.log_file.path]
+        self.log_file.close()
+        if self.csv_file is not None:
+            self.csv_file.close()
+            paths.append(self.csv_file.path)
+        if self.capture is not None:
+            self.capture.close()
+            paths.append(self.capture.path)
+        entry['bytes'] = sum(os.path.getsize(p) for p in paths)
+        entry['closed'] = datetime.now().isoformat(timespec='seconds')
+        self.log_file = self.csv_file = self.capture = None
+
+    def disk_bytes(self):
+        total = self.log_file.disk_bytes
+        if self.csv_file is not None:
+            total += self.csv_file.disk_bytes
+        if self.capture is not None:
+            total += self.capture.offset
+        return total
+
+    def due(self):
+        """True when the current segment has reached its size or time limit."""
+        if self.max_seconds and time.monotonic() - self._opened >= self.max_seconds:
+            return True
+        return bool(self.max_bytes) and self.disk_bytes() >= self.max_bytes
+
+    def record(self, timestamp_ms):
+        """Note a frame written to the current segment; True if it rotated afterwards."""
+        entry = self.current
+        if entry['first_ms'] is None:
+            entry['first_ms'] = timestamp_ms
+        entry['last_ms'] = timestamp_ms
+        entry['frames'] += 1
+        if entry['frames'] % CHECK_EVERY == 0 and self.due():
+            self.rotate()
+            return True
+        return False
+
+    def rotate(self):
+        self.close_segment()
+        return self.open_segment()
+
+    def flush(self):
+        """Flush the open segment and bring its manifest entry up to date."""
+        for f in self.files():
+            if f is not None:
+                f.flush()
+        self.write_manifest()
+
+    def close(self):
+        if self.log_file is not None:
+            self.close_segment()
+            self.write_manifest()
+
+    def write_manifest(self):
+        """Atomically rewrite the manifest."""
+        manifest = {
+            'base': self.base.name,
+            'format': capfile.EXTENSION[1:] if self.binary else 'csv',
+            'compression': self.compress,
+            'max_bytes': self.max_bytes,
+            'max_seconds': self.max_seconds,
+            'segments': self.segments,
+        }
+        directory = self.manifest_path.parent
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp, self.manifest_path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+
+# ---- Reading -------------------------------------------------------------
+
+def load_manifest(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def covering(manifest, start_ms=None, end_ms=None):
+    """
+    Segments holding frames in [start_ms, end_ms) (either bound may be None).
+
+    The open segment of a running session may have more frames than its
+    entry says, so it counts as extending to the end of time.
+    """
+    found = []
+    for entry in manifest['segments']:
+        is_open = entry['closed'] is None
+        if entry['first_ms'] is None and not is_open:
+            continue  # No frames
+        if end_ms is not None and entry['first_ms'] is not None and entry['first_ms'] >= end_ms:
+            continue
+        if start_ms is not None and not is_open and entry['last_ms'] < start_ms:
+            continue
+        found.append(entry)
+    return found
+
+
+def segment_paths(manifest_path, entries):
+    """Frame file (.csv or .djicap) of each entry, resolved next to the manifest."""
+    directory = Path(manifest_path).parent
+    return [directory / (entry.get('capture') or entry['csv']) for entry in entries]
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='List the segments of a rotated capture')
+    parser.add_argument('manifest', help='<base>.manifest.json written by buslog.py')
+    parser.add_argument('--start', type=float, help='First timestamp_ms of the window')
+    parser.add_argument('--end', type=float, help='End of the window (exclusive)')
+    args = parser.parse_args()
+
+    manifest = load_manifest(args.manifest)
+    entries = covering(manifest, args.start, args.end)
+    total = manifest['segments']
+    print(f"{args.manifest}: {len(total)} segments, {sum(e['frames'] for e in total)} frames, "
+          f"{manifest['format']} ({manifest['compression'] or 'uncompressed'})")
+    for entry, path in zip(entries, segment_paths(args.manifest, entries)):
+        state = "" if entry['closed'] else "  (open)"
+        first, last = (('-' if ms is None else ms) for ms in (entry['first_ms'], entry['last_ms']))
+        print(f"  {entry['index']:4d}  {first:>10}..{last:<10} "
+              f"{entry['frames']:8d} frames {entry['bytes'] / 1e6:8.2f} MB  {path}{state}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,837 @@
+#!/usr/bin/env python3
+"""
+Simulated SAMD21 bridge with an ESC (and optionally an FC) on its bus.
+
+Presents a pty (or an in-process loopback serial object) that speaks what
+the host tools expect from the real firmware, in ASCII or binary link mode:
+
+    interface.ino  TX:<hex> in, [RX<-485] / [TX->485] / [RX TIMEOUT] out
+    busprint.ino   LOGGER_READY, FRAME,<ms>,<hex>,<start_us>,<end_us>,
+                   ERROR,<ms>,TIMEOUT,<hex>,<start_us>,<end_us>, STATS / RESET,
+                   STATS <ms> (periodic bus statistics, see busstats.py)
+    both           FILTER <ALLOW|DENY ids...|OFF> (see busfilter.py)
+
+The simulated ESC streams 0xA0D0 telemetry, follows 0xA021 arm/throttle
+commands as described in THROTTLE_PROTOCOL.md (battery voltage in every
+channel until armed and above idle, disarm after FAILSAFE_S without
+commands) and answers an 0xA0D0 request with the same sequence number.
+The optional FC script sends 0xA021 itself: disarmed, armed idle, then a
+throttle sweep. Line noise, CRC corruption and dropped frames can be
+injected at configurable rates, and --speed multiplies every bus rate for
+load testing the host stack.
+
+Bytes are framed like busprint.ino does: a frame ends at its length byte
+(a sync byte inside a frame does not restart it), and an incomplete frame
+is reported as a partial after an idle gap. The device clock can start at
+any uptime and run faster than real time (--uptime, --clock-rate), so
+long runs across micros() wraps take seconds:
+
+    python3 simbus.py --check-wrap      # logs 3 micros() wraps through buslog, checks the stamps
+
+Usage:
+    python3 simbus.py --firmware busprint --speed 10 --corrupt 0.01
+    python3 buslog.py -p /dev/pts/N --link binary
+
+    sim = SimDevice('interface', transport=LoopbackTransport())
+    sim.start()
+    reader = BusReader(sim.serial)      # or RS485Interface().ser = sim.serial
+"""
+
+import errno
+import math
+import os
+import random
+import select
+import sys
+import threading
+import time
+
+import busfilter
+import busstats
+import crc16 as crc
+import hostlink
+from frame import A021Template, CMD_ESC_TELEMETRY, CMD_FC_COMMAND, DISARMED, IDLE, DJIFrame
+
+INTERFACE = 'interface'
+BUSPRINT = 'busprint'
+FIRMWARES = (INTERFACE, BUSPRINT)
+
+SYNC = 0x55
+MAX_FRAME_SIZE = 64     # As in the .ino files
+BAUD = 115200
+BYTE_US = 10e6 / BAUD   # One 8N1 character on the bus
+IDLE_GAP_US = int(35e6 / BAUD)  # IDLE_GAP_US in busprint.ino (3.5 characters)
+WRAP_S = (1 << 32) / 1e6        # micros() wraps every 71.6 minutes
+TELEMETRY_HZ = 115.0
+FC_HZ = 12.5
+FAILSAFE_S = 0.5        # ESC disarms when armed and no 0xA021 for this long
+BATTERY = 940           # 0.051 V/count: 47.9 V
+IDLE_THRESHOLD = 1000   # Throttle above which a slot reports RPM instead of voltage
+MAX_CATCH_UP = 100      # Bus frames generated per loop before the schedule realigns
+
+BANNERS = {
+    INTERFACE: ["DJI ESC RS-485 Interface Ready",
+                "Commands: TX:HHHHH... (hex bytes), RX (receive mode)",
+                "Format: 55 1A 00 D0 A0 ...",
+                "MODE BIN switches to the binary host protocol"],
+    BUSPRINT: ["LOGGER_READY"],
+}
+
+
+class SimESC:
+    """ESC model: arm/throttle state from 0xA021 and the telemetry it reports"""
+
+    def __init__(self, rng, failsafe=FAILSAFE_S):
+        self.rng = rng
+        self.failsafe = failsafe
+        self.armed = False
+        self.throttles = (0, 0, 0, 0)
+        self.last_command = None
+        self.sequence = 0
+        self.commands = 0
+        self.failsafes = 0
+
+    def on_frame(self, data, now):
+        """A frame on the bus; returns the ESC's reply, if any."""
+        frame = DJIFrame.decode(bytes(data), 'drop')
+        if frame is None:
+            return None
+        if frame.cmd_id == CMD_FC_COMMAND and frame.a021 is not None:
+            fields = frame.a021
+            self.armed = fields.armed
+            self.throttles = fields.throttles
+            self.last_command = now
+            self.commands += 1
+        elif frame.cmd_id == CMD_ESC_TELEMETRY:
+            return self.telemetry(now, frame.sequence)
+        return None
+
+    def telemetry(self, now, sequence=None):
+        """One 0xA0D0 frame for the current state."""
+        if self.armed and self.last_command is not None and now - self.last_command > self.failsafe:
+            self.armed = False
+            self.failsafes += 1
+
+        words = []
+        for throttle in self.throttles:
+            if self.armed and throttle > IDLE_THRESHOLD:
+                value = min(0xFFFF, throttle * 6 + self.rng.randint(-20, 20))
+            else:
+                value = BATTERY + self.rng.choice((0, 0, 0, 1, -1))
+            words += (value, value)
+
+        if sequence is None:
+            sequence = self.sequence
+            self.sequence = (self.sequence + 1) & 0xFF
+        payload = b''.join(w.to_bytes(2, 'little') for w in words)
+        return DJIFrame(CMD_ESC_TELEMETRY, reserved=0x4000, sequence=sequence,
+                        payload=payload).encode()
+
+
+class SimFC:
+    """Flight controller script: disarmed, armed idle, then a throttle sweep"""
+
+    def __init__(self, arm_at=2.0, fly_at=5.0, sweep_s=10.0, peak=4000):
+        self.arm_at = arm_at
+        self.fly_at = fly_at
+        self.sweep_s = sweep_s
+        self.peak = peak
+        self.template = A021Template()
+
+    def command(self, t):
+        """The 0xA021 frame the FC sends t seconds after power-up."""
+        if t < self.arm_at:
+            setpoint = DISARMED
+        elif t < self.fly_at:
+            setpoint = IDLE
+        else:
+            level = 0.5 - 0.5 * math.cos(2 * math.pi * (t - self.fly_at) / self.sweep_s)
+            throttle = int(IDLE_THRESHOLD + level * (self.peak - IDLE_THRESHOLD))
+            setpoint = IDLE._replace(throttle1=throttle, throttle4=throttle)
+        return bytes(self.template.update(*setpoint))
+
+
+class Framer:
+    """Firmware-side RS-485 framing: sync byte, length byte, idle-gap timeout"""
+
+    def __init__(self, on_frame, on_partial, idle_gap_us=IDLE_GAP_US, on_discard=None):
+        self.on_frame = on_frame      # on_frame(data, start_us, end_us)
+        self.on_partial = on_partial  # on_partial(data, start_us, end_us)
+        self.on_discard = on_discard  # on_discard(data): abandoned for its length byte
+        self.idle_gap_us = idle_gap_us
+        self.buf = bytearray()
+        self.in_frame = False
+        self.start_us = 0
+        self.last_us = 0
+
+    def feed(self, data, us):
+        """Bytes sent back to back, the first one at device time us."""
+        self.check_timeout(us)
+        buf = self.buf
+        for i, b in enumerate(data):
+            t = us + int(i * BYTE_US)
+            if b == SYNC and (not self.in_frame or not self._plausible()):
+                # Start a frame (or abandon one whose length byte is impossible)
+                if self.in_frame and self.on_discard is not None:
+                    self.on_discard(bytes(buf))
+                buf[:] = b'\x55'
+                self.in_frame = True
+                self.start_us = self.last_us = t
+            elif self.in_frame and len(buf) < MAX_FRAME_SIZE:
+                buf.append(b)
+                self.last_us = t
+                if len(buf) >= 2 and len(buf) >= buf[1]:
+                    self.on_frame(bytes(buf), self.start_us, t)
+                    self.in_frame = False
+
+    def _plausible(self):
+        return len(self.buf) < 2 or crc.MIN_FRAME <= self.buf[1] <= MAX_FRAME_SIZE
+
+    def check_timeout(self, us):
+        if self.in_frame and us - self.last_us > self.idle_gap_us:
+            self.on_partial(bytes(self.buf), self.start_us, self.last_us)
+            self.in_frame = False
+
+
+# ---- Transports ------------------------------------------------------
+
+
+class LoopbackSerial:
+    """In-process stand-in for serial.Serial, connected to a SimDevice"""
+
+    def __init__(self, max_buffer=1 << 20):
+        self.timeout = 1.0
+        self.is_open = True
+        self.max_buffer = max_buffer
+        self._rx = bytearray()   # device -> host
+        self._tx = bytearray()   # host -> device
+        self._cond = threading.Condition()
+        self.overruns = 0        # Device bytes dropped because the host did not read
+
+    # Host side (pyserial API subset used by the tools)
+
+    @property
+    def in_waiting(self):
+        return len(self._rx)
+
+    def read(self, size=1):
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._rx) >= size or not self.is_open, self.timeout)
+            data = bytes(self._rx[:size])
+            del self._rx[:size]
+            self._cond.notify_all()
+            return data
+
+    def readline(self):
+        with self._cond:
+            self._cond.wait_for(lambda: b'\n' in self._rx or not self.is_open, self.timeout)
+            end = self._rx.find(b'\n') + 1 or len(self._rx)
+            data = bytes(self._rx[:end])
+            del self._rx[:end]
+            self._cond.notify_all()
+            return data
+
+    def write(self, data):
+        with self._cond:
+            self._tx += data
+            self._cond.notify_all()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        with self._cond:
+            self._rx.clear()
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.is_open = False
+            self._cond.notify_all()
+
+    # Device side
+
+    def _device_poll(self, timeout):
+        with self._cond:
+            if not self.is_open:
+                return None
+            if not self._tx:
+                self._cond.wait(timeout)
+            data = bytes(self._tx)
+            self._tx.clear()
+            return data
+
+    def _device_send(self, data, block=False):
+        with self._cond:
+            if block:
+                self._cond.wait_for(lambda: len(self._rx) < self.max_buffer or not self.is_open)
+            room = self.max_buffer - len(self._rx)
+            if len(data) > room and not block:
+                self.overruns += len(data) - max(room, 0)
+                data = data[:max(room, 0)]
+            self._rx += data
+            self._cond.notify_all()
+
+
+class LoopbackTransport:
+    """Host side is self.serial, usable wherever the tools take a serial port object"""
+
+    name = 'loopback'
+
+    def __init__(self):
+        self.serial = LoopbackSerial()
+
+    def poll(self, timeout):
+        """Host input (b'' if none), or None while the host is disconnected."""
+        return self.serial._device_poll(timeout)
+
+    def send(self, data, block=False):
+        """Queue data for the host; returns bytes dropped (0 when block is set)."""
+        before = self.serial.overruns
+        self.serial._device_send(data, block)
+        return self.serial.overruns - before
+
+    def close(self):
+        self.serial.close()
+
+
+class PtyTransport:
+    """Pseudo-terminal; the host opens self.name like a real serial port"""
+
+    def __init__(self):
+        import pty
+        import tty
+
+        self.master, slave = pty.openpty()
+        tty.setraw(slave)  # No echo or newline translation, like a USB CDC port
+        self.name = os.ttyname(slave)
+        os.close(slave)    # Reads on the master fail with EIO until the host opens it
+        os.set_blocking(self.master, False)
+
+    def poll(self, timeout):
+        ready, _, _ = select.select([self.master], [], [], timeout)
+        if not ready:
+            return b''
+        try:
+            return os.read(self.master, 65536)
+        except BlockingIOError:
+            return b''
+        except OSError as e:
+            if e.errno != errno.EIO:
+                raise
+            time.sleep(timeout)  # Nobody has the port open
+            return None
+
+    def send(self, data, block=False):
+        """
+        Write everything the host accepts within 0.1 s of stalling (5 s with
+        block); returns bytes dropped.
+        """
+        view = memoryview(data)
+        while view:
+            try:
+                n = os.write(self.master, view)
+                view = view[n:]
+            except BlockingIOError:
+                _, writable, _ = select.select([], [self.master], [], 5.0 if block else 0.1)
+                if not writable:
+                    return len(view)
+            except OSError:
+                return len(view)
+        return 0
+
+    def close(self):
+        os.close(self.master)
+
+
+# ---- Device ------------------------------------------------------------
+
+
+class SimDevice:
+    """interface.ino or busprint.ino, with a simulated bus behind it"""
+
+    def __init__(self, firmware=BUSPRINT, transport=None, speed=1.0,
+                 telemetry_hz=TELEMETRY_HZ, fc_hz=None, noise=0.0, corrupt=0.0,
+                 dropout=0.0, seed=None, uptime=0.0, clock_rate=1.0):
+        if firmware not in FIRMWARES:
+            raise ValueError(f"firmware must be one of {FIRMWARES}")
+        self.firmware = firmware
+        self.transport = transport if transport is not None else PtyTransport()
+        self.rng = random.Random(seed)
+        self.esc = SimESC(self.rng)
+        if fc_hz is None:
+            fc_hz = FC_HZ if firmware == BUSPRINT else 0.0  # interface.ino: the host is the FC
+        self.fc = SimFC() if fc_hz else None
+        self.telemetry_period = 1.0 / (telemetry_hz * speed) if telemetry_hz else None
+        self.fc_period = 1.0 / (fc_hz * speed) if fc_hz else None
+        self.noise = noise          # Probability of a burst of random bytes after a frame
+        self.corrupt = corrupt      # Probability of a flipped bit (bad CRC) per frame
+        self.dropout = dropout      # Probability a frame never reaches the bridge
+        self.lossless = False       # Block instead of dropping output the host does not read
+        self.uptime = uptime        # Device clock (s) when the host connects
+        self.clock_rate = clock_rate  # Device seconds per real second
+
+        self.binary = False
+        self.filter = busfilter.FrameFilter()  # Set by the host's FILTER command
+        self.counters = busstats.BusCounters()  # busprint.ino: STATS <ms> records
+        self.stats_interval = 0                 # ms, 0 = off
+        self._next_stats = None                 # Device us of the next record
+        self.connected = False
+        self._out = bytearray()
+        self._host_lines = bytearray()
+        self._packets = hostlink.PacketDecoder()
+        self._framer = self._new_framer()
+        self._stop = threading.Event()
+        self._thread = None
+        self._boot = time.monotonic()
+        self._epoch = self._boot
+        self._next_telemetry = self._next_fc = self._boot
+
+        self.stats = dict.fromkeys((
+            'telemetry', 'fc_commands', 'host_tx', 'replies', 'frames', 'partials', 'filtered',
+            'noise', 'corrupted', 'dropped', 'overruns', 'connects'), 0)
+
+    @property
+    def serial(self):
+        """Host-side serial object (loopback transport only)."""
+        return self.transport.serial
+
+    @property
+    def port(self):
+        return self.transport.name
+
+    # ---- Lifecycle -----------------------------------------------------
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='SimDevice', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        self.transport.close()
+
+    def device_us(self, now=None):
+        """Device time in microseconds since boot (not wrapped)."""
+        elapsed = (time.monotonic() if now is None else now) - self._epoch
+        return int((self.uptime + elapsed * self.clock_rate) * 1e6)
+
+    def millis(self, now=None):
+        return (self.device_us(now) // 1000) & 0xFFFFFFFF
+
+    def _on_connect(self, now):
+        """The host opened the port: behave like a freshly reset board."""
+        self.stats['connects'] += 1
+        self.binary = False
+        self.filter = busfilter.FrameFilter()
+        self.stats_interval = 0
+        self._host_lines.clear()
+        self._packets = hostlink.PacketDecoder()
+        self._framer = self._new_framer()
+        self._epoch = now
+        self._next_telemetry = self._next_fc = now
+        time.sleep(0.05)  # Let the host finish configuring the port
+        for line in BANNERS[self.firmware]:
+            self._text(line)
+
+    def _run(self):
+        transport = self.transport
+        while not self._stop.is_set():
+            now = time.monotonic()
+            data = transport.poll(max(0.0, min(self._next_due(now) - now, 0.01)))
+            if data is None:
+                self.connected = False
+                continue
+            if not self.connected:
+                self.connected = True
+                self._on_connect(time.monotonic())
+            if data:
+                self._from_host(data)
+            self._bus_tick(time.monotonic())
+            if self._out:
+                self.stats['overruns'] += transport.send(bytes(self._out), self.lossless)
+                self._out.clear()
+
+    # ---- Bus -----------------------------------------------------------
+
+    def _new_framer(self):
+        discard = self.counters.partial if self.firmware == BUSPRINT else None
+        return Framer(self._bus_frame, self._bus_partial, on_discard=discard)
+
+    def _next_due(self, now):
+        """When the bus next has something to send."""
+        due = now + 0.01
+        if self.telemetry_period:
+            due = min(due, self._next_telemetry)
+        if self.fc_period:
+            due = min(due, self._next_fc)
+        return due
+
+    def _bus_tick(self, now):
+        for _ in range(MAX_CATCH_UP):
+            t = min(self._next_telemetry if self.telemetry_period else math.inf,
+                    self._next_fc if self.fc_period else math.inf)
+            if t > now:
+                break
+            if self.fc_period and self._next_fc == t:
+                frame = self.fc.command(t - self._boot)
+                self.esc.on_frame(frame, t)
+                self.stats['fc_commands'] += 1
+                self._next_fc += self.fc_period
+            else:
+                frame = self.esc.telemetry(t)
+                self.stats['telemetry'] += 1
+                self._next_telemetry += self.telemetry_period
+            self._transmit(frame, self.device_us(t))
+        else:
+            self._next_telemetry = self._next_fc = now  # Too far behind: realign
+        us = self.device_us(now)
+        self._framer.check_timeout(us)
+        if self.stats_interval and us >= self._next_stats:
+            self._send_bus_stats(us)
+
+    def _send_bus_stats(self, us):
+        """busprint.ino: one record per active cmd_id, then '*'."""
+        period = self.stats_interval * 1000
+        self._next_stats += period
+        if us >= self._next_stats:
+            self._next_stats = us + period  # Fell behind
+        for rec in self.counters.records((us // 1000) & 0xFFFFFFFF, self.stats_interval):
+            self._text(busstats.format_record(rec))
+
+    def _transmit(self, frame, us):
+        """Put a frame on the bus through the configured impairments."""
+        rng = self.rng
+        if self.dropout and rng.random() < self.dropout:
+            self.stats['dropped'] += 1
+            return
+        if self.corrupt and rng.random() < self.corrupt:
+            frame = bytearray(frame)
+            frame[rng.randrange(2, len(frame))] ^= 1 << rng.randrange(8)
+            self.stats['corrupted'] += 1
+        self._framer.feed(frame, us)
+        if self.noise and rng.random() < self.noise:
+            noise = bytes(rng.randrange(256) for _ in range(rng.randint(1, 8)))
+            self._framer.feed(noise, us + int(len(frame) * BYTE_US))
+            self.stats['noise'] += 1
+
+    def _bus_frame(self, data, start_us, end_us):
+        """Framer output: busprint.ino sends micros() stamps, interface.ino does not."""
+        ms = (start_us // 1000) & 0xFFFFFFFF
+        if self.firmware == BUSPRINT:
+            self.counters.frame(data, start_us)
+            self._on_frame(ms, data, start_us, end_us)
+        else:
+            self._on_frame(ms, data)
+
+    def _bus_partial(self, data, start_us, end_us):
+        ms = (start_us // 1000) & 0xFFFFFFFF
+        if self.firmware == BUSPRINT:
+            self.counters.partial(data)
+            self._on_partial(ms, data, start_us, end_us)
+        else:
+            self._on_partial(ms, data)
+
+    def _on_frame(self, ms, data, start_us=None, end_us=None):
+        if self.firmware == INTERFACE and len(data) < 8:
+            return
+        if not self.filter.accept(data):
+            self.stats['filtered'] += 1
+            return
+        self.stats['frames'] += 1
+        micros = None if start_us is None else (start_us, end_us)
+        if self.binary:
+            self._out += hostlink.encode_packet(hostlink.FRAME, data, ms, micros)
+        elif self.firmware == BUSPRINT:
+            self._out += f"FRAME,{ms},{_hex_micros(data, micros)}\r\n".encode('ascii')
+        else:
+            cmd_id = data[3] | (data[4] << 8)
+            self._out += (f"[RX<-485] {_hex_spaced(data)}\r\n"
+                          f"  CMD:0x{cmd_id:X} SEQ:{data[7]} LEN:{len(data)}\r\n").encode('ascii')
+
+    def _on_partial(self, ms, data, start_us=None, end_us=None):
+        self.stats['partials'] += 1
+        micros = None if start_us is None else (start_us, end_us)
+        if self.binary:
+            self._out += hostlink.encode_packet(hostlink.PARTIAL, data, ms, micros)
+        elif self.firmware == BUSPRINT:
+            self._out += f"ERROR,{ms},TIMEOUT,{_hex_micros(data, micros)}\r\n".encode('ascii')
+        else:
+            self._out += f"[RX TIMEOUT] Partial: {_hex_spaced(data)}\r\n".encode('ascii')
+
+    # ---- Host ----------------------------------------------------------
+
+    def _text(self, line):
+        if self.binary:
+            self._out += hostlink.encode_packet(hostlink.TEXT, line)
+        else:
+            self._out += (line + '\r\n').encode('ascii')
+
+    def _from_host(self, data):
+        if self.binary:
+            errors = self._packets.errors
+            for packet in self._packets.feed(data):
+                self._host_packet(packet)
+            for _ in range(self._packets.errors - errors):
+                self._text("ERROR,BAD_PACKET")
+            return
+
+        lines = self._host_lines
+        lines += data
+        while not self.binary:
+            end = lines.find(b'\n')
+            if end < 0:
+                return
+            line = lines[:end].decode('ascii', errors='ignore').strip()
+            del lines[:end + 1]
+            self._host_line(line)
+        # Switched to binary mid-chunk: the rest is packets
+        rest = bytes(lines)
+        lines.clear()
+        if rest:
+            self._from_host(rest)
+
+    def _host_line(self, line):
+        if self.firmware == INTERFACE and line.startswith('TX:'):
+            try:
+                data = bytes.fromhex(line[3:])
+            except ValueError:
+                data = b''
+            if data and len(data) <= MAX_FRAME_SIZE:
+                self._host_tx(data)
+            else:
+                self._text("Error: Invalid hex format")
+        else:
+            self._command(line)
+
+    def _host_packet(self, packet):
+        if packet.type == hostlink.TX and self.firmware == INTERFACE:
+            if len(packet.data) <= MAX_FRAME_SIZE:
+                self._host_tx(packet.data)
+            else:
+                self._text("ERROR,TOO_LONG")
+        elif packet.type == hostlink.TEXT:
+            text = packet.data.strip()
+            if self.firmware == BUSPRINT or text == 'MODE ASCII' or text.startswith('FILTER'):
+                self._command(packet.data)
+            else:
+                self._text("ERROR,UNKNOWN_COMMAND")
+
+    def _host_tx(self, data):
+        """interface.ino: transmit host bytes on the bus and echo them."""
+        now = time.monotonic()
+        self.stats['host_tx'] += 1
+        if self.binary:
+            self._out += hostlink.encode_packet(hostlink.TX_DONE, data, self.millis(now))
+        else:
+            self._out += f"[TX->485] {_hex_spaced(data)}\r\n".encode('ascii')
+        reply = self.esc.on_frame(data, now)
+        if reply is not None:
+            self.stats['replies'] += 1
+            self._transmit(reply, self.device_us(now))
+
+    def _command(self, cmd):
+        cmd = cmd.strip()
+        if self.firmware == BUSPRINT:
+            cmd = cmd.upper()
+        if cmd == 'MODE BIN':
+            self._text("MODE,BIN")
+            self.binary = True
+            self._packets = hostlink.PacketDecoder()
+        elif cmd == 'MODE ASCII':
+            self._text("MODE,ASCII")
+            self.binary = False
+        elif cmd == 'FILTER' or cmd.startswith('FILTER '):
+            self._filter_command(cmd)
+        elif self.firmware == BUSPRINT:
+            if cmd == 'STATS':
+                now = self.millis()
+                self._text(f"STATUS,{now},FRAMES={self.stats['frames']},UPTIME={now // 1000}s,"
+                           f"FILTERED={self.stats['filtered']}")
+            elif cmd.startswith('STATS '):
+                self._stats_command(cmd[6:])
+            elif cmd == 'RESET':
+                self.stats['frames'] = self.stats['filtered'] = 0
+                self._text("STATUS,RESET")
+        elif cmd == 'RX':
+            self._text("Receive mode active (always listening)")
+        elif cmd == 'HELP':
+            self._text("Commands:")
+            self._text("  TX:HHHHH...  - Send hex bytes on 485 bus")
+            self._text("  RX           - Status (always receiving)")
+            self._text("  MODE BIN     - Switch to binary host protocol")
+            self._text("  FILTER ...   - Forward only some command IDs (FILTER ALLOW A021 A0D0/10)")
+        else:
+            self._text("Unknown command. Type HELP")
+
+    def _filter_command(self, cmd):
+        """FILTER alone reports the filter; with arguments it replaces it (busfilter.h)."""
+        if cmd != 'FILTER':
+            try:
+                self.filter = busfilter.FrameFilter.parse(cmd[7:])
+            except ValueError:
+                self._text("ERROR,BAD_FILTER")
+                return
+            self.stats['filtered'] = 0
+        self._text(f"FILTER,{self.filter}")
+
+    def _stats_command(self, arg):
+        """STATS <ms>: start (or with 0, stop) the periodic bus statistics records."""
+        try:
+            ms = max(0, int(arg))
+        except ValueError:
+            ms = 0  # String.toInt() on the device
+        if ms:
+            ms = max(ms, busstats.MIN_INTERVAL_MS)
+        us = self.device_us()
+        self.stats_interval = ms
+        self._next_stats = us + ms * 1000
+        self.counters = busstats.BusCounters()
+        self._framer.on_discard = self.counters.partial
+        self._text(f"STATUS,{(us // 1000) & 0xFFFFFFFF},STATS_INTERVAL={ms}")
+
+    # ---- Statistics ----------------------------------------------------
+
+    def report(self):
+        s = self.stats
+        return [
+            f"  Bus: {s['telemetry']} telemetry, {s['fc_commands']} FC commands, "
+            f"{s['host_tx']} host TX ({s['replies']} replies)",
+            f"  To host: {s['frames']} frames, {s['partials']} partials, "
+            f"{s['overruns']} bytes dropped (host not reading)",
+            f"  Filter: {self.filter} ({s['filtered']} frames filtered)",
+            f"  Bus statistics: {f'every {self.stats_interval} ms' if self.stats_interval else 'off'}",
+            f"  Injected: {s['noise']} noise bursts, {s['corrupted']} corrupted, {s['dropped']} dropped",
+            f"  ESC: {'armed' if self.esc.armed else 'disarmed'}, throttles {self.esc.throttles}, "
+            f"{self.esc.commands} commands, {self.esc.failsafes} failsafes",
+        ]
+
+
+def _hex_spaced(data):
+    """interface.ino hex dump: every byte followed by a space."""
+    return ''.join(f"{b:02X} " for b in data)
+
+
+def _hex_micros(data, micros):
+    """busprint.ino hex dump, followed by the wrapped micros() stamps if any."""
+    text = data.hex(' ').upper()
+    if micros is None:
+        return text
+    return f"{text},{micros[0] & 0xFFFFFFFF},{micros[1] & 0xFFFFFFFF}"
+
+
+def check_wrap(wraps=3, clock_rate=2000.0, telemetry_hz=200.0):
+    """
+    Log a simulated busprint.ino across micros() wraps through FrameLogger
+    (both link modes) and check the microsecond stamps in the CSV.
+
+    Returns a list of failures (empty when every check passed).
+    """
+    import contextlib
+    import io
+    import tempfile
+
+    import numpy as np
+
+    import capload
+    from buslog import FrameLogger
+
+    failures = []
+    duration = (wraps + 0.2) * WRAP_S / clock_rate
+    for link in hostlink.LINK_MODES:
+        sim = SimDevice(BUSPRINT, LoopbackTransport(), telemetry_hz=telemetry_hz, fc_hz=0,
+                        uptime=WRAP_S - 1.0, clock_rate=clock_rate, seed=1)
+        sim.lossless = True
+        with tempfile.TemporaryDirectory() as tmp:
+            logger = FrameLogger(link=link)
+            logger.ser = sim.serial
+            with contextlib.redirect_stdout(io.StringIO()):
+                sim.start()
+                logger.negotiate_link()
+                logger.open_log_files(os.path.join(tmp, 'wrap'))
+                logger.run(duration=duration)
+                logger.close()
+            sim.close()
+            cap = capload.load_csv(os.path.join(tmp, 'wrap.csv'))
+
+        start, end = cap.start_us, cap.end_us
+        raw_wraps = int((np.diff(start & 0xFFFFFFFF) < 0).sum()) if len(cap) else 0
+        checks = [
+            ("frames logged", len(cap) > 0),
+            ("every frame has micros() stamps", bool((start >= 0).all() and (end >= 0).all())),
+            ("start_us strictly increasing", bool((np.diff(start) > 0).all())),
+            ("end_us matches frame duration",
+             bool((end - start == ((cap.size - 1) * BYTE_US).astype(np.int64)).all())),
+            ("start_us agrees with timestamp_ms", bool((np.abs(start // 1000 - cap.timestamp_ms) <= 1).all())),
+            (f"{wraps} micros() wraps crossed", raw_wraps >= wraps),
+        ]
+        span_h = (start[-1] - start[0]) / 3.6e9 if len(cap) else 0.0
+        print(f"  {link:6s}: {len(cap)} frames over {span_h:.2f}h of device time, {raw_wraps} wraps")
+        for name, ok in checks:
+            print(f"    {'ok  ' if ok else 'FAIL'} {name}")
+            if not ok:
+                failures.append(f"{link}: {name}")
+    return failures
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Simulated SAMD21 bridge + DJI ESC on a pty')
+    parser.add_argument('-f', '--firmware', choices=FIRMWARES, default=BUSPRINT,
+                        help='Firmware to imitate (busprint: logger, interface: TX/RX bridge)')
+    parser.add_argument('-s', '--speed', type=float, default=1.0, help='Multiply all bus rates')
+    parser.add_argument('--telemetry-hz', type=float, default=TELEMETRY_HZ,
+                        help='ESC 0xA0D0 rate (0 = only reply to requests)')
+    parser.add_argument('--fc-hz', type=float,
+                        help=f'Simulated FC 0xA021 rate (default {FC_HZ} for busprint, 0 for interface)')
+    parser.add_argument('--noise', type=float, default=0.0, help='Noise bursts per frame (probability)')
+    parser.add_argument('--corrupt', type=float, default=0.0, help='Bad-CRC frames (probability)')
+    parser.add_argument('--dropout', type=float, default=0.0, help='Lost frames (probability)')
+    parser.add_argument('--seed', type=int, help='Random seed')
+    parser.add_argument('--uptime', type=float, default=0.0,
+                        help='Device clock (s) at connect, e.g. 4290 to cross a micros() wrap')
+    parser.add_argument('--clock-rate', type=float, default=1.0,
+                        help='Device clock speed relative to real time')
+    parser.add_argument('-d', '--duration', type=float, help='Seconds to run (default: until Ctrl+C)')
+    parser.add_argument('--check-wrap', action='store_true',
+                        help='Log 3 micros() wraps through buslog.py in both link modes and check the stamps')
+    args = parser.parse_args()
+
+    if args.check_wrap:
+        print("micros() wrap check:")
+        failures = check_wrap()
+        print("PASS" if not failures else f"FAIL: {', '.join(failures)}")
+        return 1 if failures else 0
+
+    sim = SimDevice(args.firmware, speed=args.speed, telemetry_hz=args.telemetry_hz,
+                    fc_hz=args.fc_hz, noise=args.noise, corrupt=args.corrupt,
+                    dropout=args.dropout, seed=args.seed, uptime=args.uptime,
+                    clock_rate=args.clock_rate)
+    print(f"Simulated {args.firmware}.ino on {sim.port} (Ctrl+C to stop)", flush=True)
+    sim.start()
+    try:
+        if args.duration:
+            time.sleep(args.duration)
+        else:
+            while True:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        print()
+    finally:
+        sim.close()
+
+    print("\n".join(sim.report()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
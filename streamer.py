@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Deadline-scheduled command streamer.
+
+Sends the current setpoint on absolute deadlines start + k * period
+(monotonic clock), so frame build and serial write time never add to
+the period and the rate does not drift. The caller swaps in a new
+setpoint at any time; it is a single reference assignment, picked up
+lock-free on the next tick.
+
+    streamer = CommandStreamer(send, rate_hz=100)
+    streamer.start(setpoint)
+    streamer.set(new_setpoint)      # any thread, takes effect next tick
+    ...
+    streamer.stop()
+    print("\\n".join(streamer.report()))
+
+send(setpoint) is called on the streamer thread for every tick.
+"""
+
+import sys
+import threading
+import time
+from collections import deque
+
+import metrics
+
+# What to do after falling more than one period behind
+SKIP = 'skip'     # Drop the missed ticks and realign to the next deadline
+BURST = 'burst'   # Send the missed ticks back to back (up to max_burst)
+CATCH_UP_POLICIES = (SKIP, BURST)
+
+SPIN_S = 0.0005      # Busy-wait the last 0.5ms before a deadline
+JITTER_WINDOW = 1000  # Recent ticks kept for percentile jitter
+
+
+def bus_rate_limit(baudrate, frame_bytes, duty=0.5):
+    """Highest command rate (Hz) that uses at most duty of an 8N1 bus."""
+    return duty * baudrate / (10.0 * frame_bytes)
+
+
+class CommandStreamer:
+    """Background thread that sends a setpoint on a fixed-rate deadline schedule"""
+
+    def __init__(self, send, rate_hz=12.5, catch_up=SKIP, max_burst=3, max_rate=None,
+                 spin=SPIN_S):
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"catch_up must be one of {CATCH_UP_POLICIES}")
+        if rate_hz <= 0 or (max_rate is not None and rate_hz > max_rate):
+            raise ValueError(f"rate {rate_hz} Hz outside 0..{max_rate} Hz")
+        self.send = send
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+        self.catch_up = catch_up
+        self.max_burst = max_burst
+        self.spin = spin
+        self._setpoint = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._tick_cond = threading.Condition()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.sent = 0
+        self.missed = 0        # Deadlines skipped by the catch-up policy
+        self.errors = 0        # send() raised
+        self.started_at = None
+        self.first_sent_at = None
+        self.last_sent_at = None
+        self.late_max = 0.0
+        self.late_sum = 0.0
+        self._late = deque(maxlen=JITTER_WINDOW)
+
+    # ---- Setpoint ------------------------------------------------------
+
+    @property
+    def setpoint(self):
+        return self._setpoint
+
+    def set(self, setpoint):
+        """Replace the setpoint; sent from the next tick on (no lock)."""
+        self._setpoint = setpoint
+
+    # ---- Lifecycle -----------------------------------------------------
+
+    def start(self, setpoint=None):
+        if setpoint is not None:
+            self._setpoint = setpoint
+        if self.running:
+            return
+        self._stop.clear()
+        self._reset_stats()
+        self._thread = threading.Thread(target=self._run, name='CommandStreamer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        with self._tick_cond:
+            self._tick_cond.notify_all()  # Wake wait_ticks() callers
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def wait_ticks(self, count, timeout=None):
+        """Block until count more setpoints have been sent; False on timeout or stop()."""
+        with self._tick_cond:
+            target = self.sent + count
+            return self._tick_cond.wait_for(
+                lambda: self.sent >= target or self._stop.is_set() or not self.running,
+                timeout) and self.sent >= target
+
+    # ---- Scheduler -----------------------------------------------------
+
+    def _sleep_until(self, deadline):
+        """Sleep (interruptibly) until shortly before deadline, then spin."""
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            if remaining > self.spin:
+                if self._stop.wait(remaining - self.spin):
+                    return False
+            elif self._stop.is_set():
+                return False
+
+    def _run(self):
+        period = self.period
+        start = time.monotonic()
+        self.started_at = start
+        tick = 0
+
+        while not self._stop.is_set():
+            deadline = start + tick * period
+            if not self._sleep_until(deadline):
+                break
+
+            now = time.monotonic()
+            behind = int((now - deadline) / period)
+            if behind >= 1:
+                if self.catch_up == SKIP:
+                    self.missed += behind
+                    metrics.COMMANDS_MISSED.inc(behind)
+                    tick += behind
+                    deadline = start + tick * period
+                else:
+                    over = behind - self.max_burst
+                    if over > 0:
+                        self.missed += over
+                        metrics.COMMANDS_MISSED.inc(over)
+                        tick += over
+                        deadline = start + tick * period
+
+            setpoint = self._setpoint  # One read per tick
+            if setpoint is not None:
+                sent_at = time.monotonic()
+                try:
+                    self.send(setpoint)
+                except Exception:
+                    self.errors += 1
+                else:
+                    if self.first_sent_at is None:
+                        self.first_sent_at = sent_at
+                    self.last_sent_at = sent_at
+                    late = sent_at - deadline
+                    self._late.append(late)
+                    metrics.COMMAND_JITTER.observe(late)
+                    self.late_sum += late
+                    if late > self.late_max:
+                        self.late_max = late
+                    with self._tick_cond:
+                        self.sent += 1
+                        self._tick_cond.notify_all()
+            tick += 1
+
+        with self._tick_cond:
+            self._tick_cond.notify_all()
+
+    # ---- Statistics ----------------------------------------------------
+
+    def stats(self):
+        """Achieved rate and send jitter (lateness vs. deadline) so far."""
+        # Rate over the intervals between the first and the last send
+        elapsed = 0.0
+        if self.sent > 1:
+            elapsed = self.last_sent_at - self.first_sent_at
+        late = sorted(self._late)
+        n = len(late)
+        return {
+            'target_hz': self.rate_hz,
+            'achieved_hz': (self.sent - 1) / elapsed if elapsed > 0 else 0.0,
+            'sent': self.sent,
+            'missed': self.missed,
+            'errors': self.errors,
+            'jitter_mean_ms': self.late_sum / self.sent * 1000 if self.sent else 0.0,
+            'jitter_p99_ms': late[min(n - 1, int(n * 0.99))] * 1000 if n else 0.0,
+            'jitter_max_ms': self.late_max * 1000,
+        }
+
+    def report(self):
+        """Return summary lines."""
+        s = self.stats()
+        return [
+            f"  Rate: {s['achieved_hz']:.2f} Hz achieved / {s['target_hz']:.2f} Hz target",
+            f"  Sent: {s['sent']}  missed: {s['missed']}  errors: {s['errors']}",
+            f"  Jitter: mean {s['jitter_mean_ms']:.3f}ms  p99 {s['jitter_p99_ms']:.3f}ms  "
+            f"max {s['jitter_max_ms']:.3f}ms",
+        ]
+
+
+def main():
+    """Run the scheduler against a no-op sender and print its timing."""
+    rate = float(sys.argv[1]) if len(sys.argv) > 1 else 100.0
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+
+    streamer = CommandStreamer(lambda setpoint: None, rate_hz=rate)
+    streamer.start(setpoint=0)
+    time.sleep(duration)
+    streamer.stop()
+    print(f"{rate:.1f} Hz for {duration:.1f}s:")
+    print("\n".join(streamer.report()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,12 +11,32 @@ import struct
 import time
 import sys
 
+import metrics
+import streamer
+from crc16 import crc16
+# Setpoint, IDLE and DISARMED live in frame.py; still importable from here
+from frame import A021Template, A021_FRAME_SIZE, CMD_FC_COMMAND, DISARMED, IDLE, Setpoint
+
 class DJIThrottleController:
-    def __init__(self, port, baudrate=115200):
+    def __init__(self, port, baudrate=115200, rate_hz=12.5, catch_up=streamer.SKIP):
         self.port = port
         self.baudrate = baudrate
         self.ser = None
-        self.counter = 0
+        self.template = A021Template()  # Patched in place for every command
+
+        # Commands are paced by a deadline scheduler, not sleeps
+        self.streamer = streamer.CommandStreamer(
+            self._send_setpoint, rate_hz=rate_hz, catch_up=catch_up,
+            max_rate=streamer.bus_rate_limit(baudrate, A021_FRAME_SIZE))
+
+    @property
+    def counter(self):
+        """0xA021 command counter (shared by send_command and build_a021_payload)."""
+        return self.template.counter
+
+    @counter.setter
+    def counter(self, value):
+        self.template.counter = value % 65536
 
     def connect(self):
         """Open serial connection to Arduino/MAX485 interface."""
@@ -31,21 +51,14 @@ class DJIThrottleController:
 
     def disconnect(self):
         """Close serial connection."""
+        self.stop_stream()
         if self.ser:
             self.ser.close()
             print("Disconnected")
 
     def calculate_crc16(self, data):
-        """Calculate CRC-16 for DJI protocol (same as in interface.py)."""
-        crc = 0x3692
-        for b in data:
-            crc ^= b
-            for _ in range(8):
-                if crc & 1:
-                    crc = (crc >> 1) ^ 0x8005
-                else:
-                    crc >>= 1
-        return crc & 0xFFFF
+        """Calculate CRC-16 for DJI protocol (table-driven, see crc16.py)."""
+        return crc16(data)
 
     def build_frame(self, cmd_id, reserved, sequence, payload):
         """Build complete DJI protocol frame."""
@@ -108,55 +121,95 @@ class DJIThrottleController:
             throttle1-4: Throttle values (default = idle values)
             state_byte: State indicator
         """
-        payload = self.build_a021_payload(armed, throttle1, throttle2, throttle3, throttle4, state_byte)
-        frame = self.build_frame(0xA021, 0x0001, 0x00, payload)
-
-        # Send via Arduino interface (using TX: prefix)
-        hex_str = ' '.join(f'{b:02X}' for b in frame)
-        cmd = f'TX:{hex_str}\n'
+        # Same bytes as build_frame(0xA021, 0x0001, 0, build_a021_payload(...)),
+        # patched into one preallocated frame and TX: line
+        self.template.update(armed, throttle1, throttle2, throttle3, throttle4, state_byte)
 
         if self.ser:
-            self.ser.write(cmd.encode())
+            t = time.perf_counter()
+            self.ser.write(self.template.tx_line())
             self.ser.flush()
+            metrics.count_command(CMD_FC_COMMAND, time.perf_counter() - t)
             return True
         return False
 
+    def _send_setpoint(self, setpoint):
+        """Streamer tick: send one command for the current setpoint."""
+        self.send_command(*setpoint)
+
+    def stream(self, setpoint, ticks=None):
+        """
+        Make setpoint the streamed command (starting the streamer if needed).
+
+        With ticks, wait until that many commands with it have been sent.
+        """
+        self.streamer.set(setpoint)
+        if not self.streamer.running:
+            self.streamer.start()
+        if ticks:
+            self.streamer.wait_ticks(ticks, timeout=ticks * self.streamer.period + 1.0)
+
+    def stop_stream(self):
+        """Stop streaming and print the achieved rate / jitter."""
+        if self.streamer.running:
+            self.streamer.stop()
+            print("Command stream:")
+            print("\n".join(self.streamer.report()))
+
     def arm(self):
-        """Arm the ESC (motors can spin)."""
+        """
+        Arm the ESC (motors can spin).
+
+        Leaves a continuous 0xA021 stream running at IDLE, so the ESC stays
+        armed until disarm() or disconnect() stops it.
+        """
         print("Arming ESC...")
-        for _ in range(5):  # Send 5 arming commands
-            self.send_command(armed=True, throttle1=7, throttle2=0, throttle3=944, throttle4=0)
-            time.sleep(0.08)  # 12.5 Hz
+        self.stream(IDLE, ticks=5)  # At least 5 arming commands, then keep streaming
         print("ESC armed! Listen for beep-beep-beep confirmation.")
 
     def disarm(self):
         """Disarm the ESC (motors cannot spin)."""
         print("Disarming ESC...")
-        for _ in range(5):  # Send 5 disarming commands
-            self.send_command(armed=False, throttle1=0, throttle2=0, throttle3=0, throttle4=0)
-            time.sleep(0.08)
+        self.stream(DISARMED, ticks=5)
         print("ESC disarmed.")
 
+    def _hold(self, throttle1, throttle2, throttle3, throttle4, duration):
+        self.stream(IDLE._replace(throttle1=throttle1, throttle2=throttle2,
+                                  throttle3=throttle3, throttle4=throttle4))
+        time.sleep(duration)  # Hold; the streamer keeps sending on schedule
+
+    def _restore(self, previous):
+        """Go back to the setpoint streamed before a throttle test (or stop streaming)."""
+        if previous is not None:
+            self.streamer.set(previous)
+        else:
+            self.stop_stream()
+
     def set_throttle(self, throttle1=7, throttle2=0, throttle3=944, throttle4=0, duration=1.0):
         """
         Set throttle values for specified duration.
 
+        Afterwards (also on Ctrl+C) the setpoint streamed before is restored,
+        e.g. IDLE after arm(); with nothing streamed before, the stream stops.
+
         Args:
             throttle1-4: Throttle values for 4 motors
             duration: How long to maintain throttle (seconds)
         """
         print(f"Setting throttle: M1={throttle1}, M2={throttle2}, M3={throttle3}, M4={throttle4}")
-        start_time = time.time()
-
-        while time.time() - start_time < duration:
-            self.send_command(armed=True, throttle1=throttle1, throttle2=throttle2,
-                            throttle3=throttle3, throttle4=throttle4)
-            time.sleep(0.08)  # 12.5 Hz
+        previous = self.streamer.setpoint if self.streamer.running else None
+        try:
+            self._hold(throttle1, throttle2, throttle3, throttle4, duration)
+        finally:
+            self._restore(previous)
 
     def ramp_test(self, motor_index, min_throttle=1000, max_throttle=3000, step=100, step_duration=0.5):
         """
         Slowly ramp up and down one motor for testing.
 
+        Like set_throttle(), the previous setpoint is restored at the end
+        (also on Ctrl+C).
+
         Args:
             motor_index: Which motor to test (1-4)
             min_throttle: Starting throttle value
@@ -173,22 +226,26 @@ class DJIThrottleController:
         print(f"{'='*60}\n")
 
         throttles = [7, 0, 944, 0]  # Default idle values
+        previous = self.streamer.setpoint if self.streamer.running else None
 
-        # Ramp up
-        for throttle in range(min_throttle, max_throttle + 1, step):
-            throttles[motor_index - 1] = throttle
-            print(f"Motor {motor_index} throttle: {throttle:5d}")
-            self.set_throttle(*throttles, duration=step_duration)
-
-        # Ramp down
-        for throttle in range(max_throttle, min_throttle - 1, -step):
-            throttles[motor_index - 1] = throttle
-            print(f"Motor {motor_index} throttle: {throttle:5d}")
-            self.set_throttle(*throttles, duration=step_duration)
-
-        # Return to idle
-        throttles[motor_index - 1] = 7 if motor_index == 1 else (944 if motor_index == 3 else 0)
-        self.set_throttle(*throttles, duration=1.0)
+        try:
+            # Ramp up
+            for throttle in range(min_throttle, max_throttle + 1, step):
+                throttles[motor_index - 1] = throttle
+                print(f"Motor {motor_index} throttle: {throttle:5d}")
+                self._hold(*throttles, duration=step_duration)
+
+            # Ramp down
+            for throttle in range(max_throttle, min_throttle - 1, -step):
+                throttles[motor_index - 1] = throttle
+                print(f"Motor {motor_index} throttle: {throttle:5d}")
+                self._hold(*throttles, duration=step_duration)
+
+            # Return to idle
+            throttles[motor_index - 1] = 7 if motor_index == 1 else (944 if motor_index == 3 else 0)
+            self._hold(*throttles, duration=1.0)
+        finally:
+            self._restore(previous)
         print(f"Motor {motor_index} returned to idle\n")
 
 
@@ -203,19 +260,28 @@ def main():
 
     # Check for serial port argument
     if len(sys.argv) < 2:
-        print("Usage: python3 test_throttle.py <serial_port>")
-        print("Example: python3 test_throttle.py /dev/cu.usbmodem14201")
+        print("Usage: python3 test_throttle.py <serial_port> [rate_hz] [skip|burst] [metrics_port]")
+        print("Example: python3 test_throttle.py /dev/cu.usbmodem14201 100")
         sys.exit(1)
 
     port = sys.argv[1]
+    rate_hz = float(sys.argv[2]) if len(sys.argv) > 2 else 12.5
+    catch_up = sys.argv[3] if len(sys.argv) > 3 else streamer.SKIP
+    metrics_port = int(sys.argv[4]) if len(sys.argv) > 4 else None
 
     # Create controller
-    controller = DJIThrottleController(port)
+    try:
+        controller = DJIThrottleController(port, rate_hz=rate_hz, catch_up=catch_up)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
     if not controller.connect():
         print("Failed to connect. Exiting.")
         sys.exit(1)
 
+    metrics.serve_or_warn(metrics_port)
+
     try:
         print("\nTest Menu:")
         print("1. Arm ESC")